@@ -0,0 +1,131 @@
+import importlib.util
+import time
+import traceback
+
+from flask import Blueprint, Response, jsonify, request
+
+from utils import DATE_DECODER, search_commit
+from utils.commits import normalize_prefix
+from utils.export import (
+    EXPORT_FIELDS,
+    EXPORT_FORMATS,
+    acquire_export_slot,
+    arrow_chunks,
+    gzip_chunks,
+    ndjson_chunks,
+    open_export,
+    release_export_slot,
+)
+from utils.lifecycle import health, readiness
+from utils.metrics import CONTENT_TYPE, render
+from utils.resilience import is_outage
+
+api = Blueprint("api", __name__, url_prefix="/api")
+# 负载均衡的健康检查，放在根路径下
+probes = Blueprint("probes", __name__)
+
+
+@probes.get("/healthz")
+def healthz():
+    return jsonify(health())
+
+
+@probes.get("/readyz")
+def readyz():
+    # 预热完成、快照加载之前返回 503，负载均衡不会把请求转发到冷的 worker；
+    # 之后 ES 不可用时仍返回 200（status 为 degraded），由快照和缓存提供旧数据
+    try:
+        ready, details = readiness()
+    except Exception:
+        traceback.print_exc()
+        return jsonify(ready=False, status="error"), 503
+    return jsonify(ready=ready, **details), 200 if ready else 503
+
+
+@probes.get("/metrics")
+def metrics():
+    # Prometheus 抓取地址，包含所有 worker 的指标
+    return Response(render(), content_type=CONTENT_TYPE)
+
+
+@api.get("/commit/<prefix>")
+def commit(prefix):
+    # 查询包含某个 sha 前缀的所有运行，例如 /api/commit/1a2b3c4
+    if normalize_prefix(prefix) is None:
+        return jsonify(error=f"bad commit prefix: {prefix}"), 400
+    start = time.perf_counter()
+    try:
+        runs = search_commit(prefix)
+    except Exception as e:
+        # ES 不可用时为 502，其余（包括数据处理中的 ValueError）是服务端的错误
+        traceback.print_exc()
+        return jsonify(error="search failed"), 502 if is_outage(e) else 500
+    return jsonify(
+        prefix=prefix.lower(),
+        count=len(runs),
+        runs=runs,
+        took_ms=round((time.perf_counter() - start) * 1000, 1),
+    )
+
+
+@api.get("/export")
+def export():
+    # 流式导出原始数据，例如 /api/export?start=2024-01-01&end=2024-07-01&fields=model_type,acc
+    # 可选参数：format=ndjson|arrow，model_type，gzip=1|0（默认按 Accept-Encoding）
+    args = request.args
+    start_date, end_date = args.get("start"), args.get("end")
+    if not start_date or not end_date:
+        return jsonify(error="start and end are required"), 400
+    # 格式不对的日期交给 ES 会查询失败，变成 502
+    lo, hi = DATE_DECODER.bounds(start_date, end_date)
+    if lo < 0 or hi < 0:
+        return jsonify(error="start and end must be dates such as 2024-01-01"), 400
+    if lo > hi:
+        return jsonify(error="start must not be after end"), 400
+    fmt = args.get("format", "ndjson")
+    if fmt not in EXPORT_FORMATS:
+        return jsonify(error=f"format must be one of {', '.join(EXPORT_FORMATS)}"), 400
+    if fmt == "arrow" and importlib.util.find_spec("pyarrow") is None:
+        return jsonify(error="arrow export requires pyarrow"), 501
+    fields = [field for field in args.get("fields", ",".join(EXPORT_FIELDS)).split(",") if field]
+    unknown = [field for field in fields if field not in EXPORT_FIELDS]
+    if unknown:
+        return jsonify(error=f"unknown fields: {', '.join(unknown)}"), 400
+    if "gzip" in args:
+        compress = args["gzip"].lower() in ("1", "true", "yes")
+    else:
+        compress = "gzip" in request.accept_encodings
+
+    if not acquire_export_slot():
+        return jsonify(error="too many exports in progress"), 429, {"Retry-After": "30"}
+    try:
+        hits = open_export(start_date, end_date, fields, model_type=args.get("model_type"))
+    except Exception:
+        release_export_slot()
+        traceback.print_exc()
+        return jsonify(error="search failed"), 502
+
+    chunks = arrow_chunks(hits, fields) if fmt == "arrow" else ndjson_chunks(hits, fields)
+    if compress:
+        chunks = gzip_chunks(chunks)
+
+    def generate():
+        # 中途出错时记录后继续抛出：WSGI 服务器中断连接，分块响应缺少结束块，
+        # 客户端会看到不完整的响应，而不是一个看起来完整、实际被截断的文件
+        try:
+            yield from chunks
+        except Exception:
+            traceback.print_exc()
+            raise
+
+    def cleanup():
+        # 响应结束或客户端断开时由 WSGI 服务器调用，PIT 和导出名额随之释放
+        hits.close()
+        release_export_slot()
+
+    headers = {"Content-Disposition": f"attachment; filename=export.{fmt}"}
+    if compress:
+        headers["Content-Encoding"] = "gzip"
+    response = Response(generate(), mimetype=EXPORT_FORMATS[fmt], headers=headers)
+    response.call_on_close(cleanup)
+    return response
@@ -0,0 +1,70 @@
+import argparse
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from benchmarks.datasets import SIZES, generate_columns  # noqa: E402
+from benchmarks.memory_es import AsyncMemoryES, FaultyES, MemoryES  # noqa: E402
+from utils.es_utils import _build_frame, scan_hits, search_concurrently  # noqa: E402
+from utils.series import MODEL_TYPES  # noqa: E402
+
+# 顺序分页与按模型并发（AsyncElasticsearch 路径）两种方式取同一个时间范围：检查结果一致，
+# 并比较每个请求有 --latency 网络延迟时的总耗时。结果不一致时退出码为 1
+
+
+def _same(a, b, fields):
+    # 并发结果按模型拼接，顺序与顺序分页不同，逐个模型比较
+    for model in MODEL_TYPES:
+        x, y = a.model(model), b.model(model)
+        if not np.array_equal(x.ts, y.ts):
+            return False
+        for field in fields:
+            if not np.array_equal(x[field], y[field], equal_nan=True):
+                return False
+        if not np.array_equal(x.hover_data(), y.hover_data()):
+            return False
+    return True
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Check search_concurrently against scan_hits.")
+    parser.add_argument("--sizes", default="1k,10k,100k", help="comma separated, e.g. 1k,10k")
+    parser.add_argument("--days", type=int, default=30)
+    parser.add_argument("--latency", type=float, default=0.005, help="seconds per ES request")
+    args = parser.parse_args()
+
+    fields = ("acc", "perf")
+    failed = False
+    print(f"{'size':>6} {'points':>8} {'sequential ms':>14} {'concurrent ms':>14} {'same':>5}")
+    for size in args.sizes.split(","):
+        columns = generate_columns(SIZES[size], days=args.days)
+        memory = MemoryES(columns)
+        lo, hi = int(columns["created_at"][0]), int(columns["created_at"][-1])
+
+        start = time.perf_counter()
+        es = FaultyES(memory, latency=args.latency)
+        sequential = _build_frame(scan_hits(es, lo, hi, fields=fields), fields)
+        sequential_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        concurrent = search_concurrently(
+            lo, hi, fields=fields, es=AsyncMemoryES(memory, latency=args.latency)
+        )
+        concurrent_time = time.perf_counter() - start
+
+        same = len(sequential) == len(concurrent) and _same(sequential, concurrent, fields)
+        failed |= not same
+        print(
+            f"{size:>6} {len(concurrent):>8} {sequential_time * 1000:>14.1f} "
+            f"{concurrent_time * 1000:>14.1f} {str(same):>5}"
+        )
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+import argparse
+import sys
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from benchmarks.datasets import generate_columns  # noqa: E402
+from utils.dates import DATE_FORMATS, DateDecoder  # noqa: E402
+
+
+def legacy_parse(date_str):
+    # 改造前 _get_date_obj 的实现：逐个格式尝试 strptime
+    for fmt in DATE_FORMATS:
+        try:
+            return datetime.strptime(date_str, fmt)
+        except ValueError:
+            continue
+    return None
+
+
+def legacy_millis(values):
+    millis = []
+    for value in values:
+        date = legacy_parse(value)
+        if date.tzinfo is None:
+            date = date.replace(tzinfo=timezone.utc)
+        millis.append(int(date.timestamp() * 1000))
+    return np.array(millis, dtype=np.int64)
+
+
+def timed(fn, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark created_at decoding.")
+    parser.add_argument("--num", type=int, default=100_000)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    ts = generate_columns(args.num)["created_at"]
+    git = [
+        datetime.fromtimestamp(t / 1000).astimezone().strftime("%a %b %-d %H:%M:%S %Y %z")
+        for t in ts.tolist()
+    ]
+    # 混合格式：每 10 条里有 1 条完整时间戳
+    mixed = [
+        s if i % 10 else datetime.fromtimestamp(t / 1000).strftime("%Y-%m-%d %H:%M:%S")
+        for i, (s, t) in enumerate(zip(git, ts.tolist()))
+    ]
+
+    print(f"{'input':<8}{'method':<22}{'ms':>10}{'ns/value':>10}")
+    for name, values in (("git", git), ("mixed", mixed)):
+        expected = legacy_millis(values)
+        for method, fn in (
+            ("strptime loop", lambda: legacy_millis(values)),
+            ("DateDecoder.parse", lambda: [DateDecoder().parse(v) for v in values]),
+            ("DateDecoder.to_millis", lambda: DateDecoder().to_millis(values)),
+        ):
+            elapsed, result = timed(fn, args.repeat)
+            if method == "DateDecoder.to_millis":
+                assert np.array_equal(result, expected), "to_millis mismatch"
+            print(
+                f"{name:<8}{method:<22}{elapsed * 1000:>10.1f}{elapsed / len(values) * 1e9:>10.0f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
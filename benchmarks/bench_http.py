@@ -0,0 +1,109 @@
+import argparse
+import importlib.util
+import re
+import sys
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+from benchmarks.datasets import SIZES, generate_columns  # noqa: E402
+from benchmarks.memory_es import MemoryES  # noqa: E402
+
+_SCRIPT_RE = re.compile(r'<script[^>]* src="([^"]+)"')
+_LINK_RE = re.compile(r'<link[^>]* href="([^"]+)"')
+
+
+def _request(client, method, path, headers, etags, **kwargs):
+    # 第二次访问时带上 If-None-Match，模拟浏览器缓存
+    headers = dict(headers)
+    if etags is not None and path in etags:
+        headers["If-None-Match"] = etags[path]
+    start = time.perf_counter()
+    response = client.open(path, method=method, headers=headers, **kwargs)
+    elapsed = time.perf_counter() - start
+    if etags is not None and response.headers.get("ETag"):
+        etags[path] = response.headers["ETag"]
+    result = (response.status_code, len(response.get_data()), elapsed)
+    response.close()
+    return result
+
+
+def load_page(client, path, headers, etags=None):
+    # 浏览器首次渲染前需要的请求：页面 HTML、其中引用的本地脚本和样式、
+    # _dash-layout/_dash-dependencies，以及 pages 根据 URL 渲染页面内容的回调
+    stats = {"requests": 0, "bytes": 0, "server_ms": 0.0, "not_modified": 0, "external": 0}
+
+    def record(status, size, elapsed):
+        stats["requests"] += 1
+        stats["bytes"] += size
+        stats["server_ms"] += elapsed * 1000
+        stats["not_modified"] += status == 304
+
+    index = client.get(path, headers={"Accept-Encoding": "identity"}).get_data(as_text=True)
+    record(*_request(client, "GET", path, headers, etags))
+    for url in _SCRIPT_RE.findall(index) + _LINK_RE.findall(index):
+        if url.startswith("/"):
+            record(*_request(client, "GET", url, headers, etags))
+        else:
+            stats["external"] += 1
+    for url in ("/_dash-layout", "/_dash-dependencies"):
+        record(*_request(client, "GET", url, headers, etags))
+    body = {
+        "output": ".._pages_content.children..._pages_store.data..",
+        "outputs": [
+            {"id": "_pages_content", "property": "children"},
+            {"id": "_pages_store", "property": "data"},
+        ],
+        "inputs": [
+            {"id": "_pages_location", "property": "pathname", "value": path},
+            {"id": "_pages_location", "property": "search", "value": ""},
+        ],
+        "changedPropIds": ["_pages_location.pathname"],
+        "state": [],
+    }
+    record(*_request(client, "POST", "/_dash-update-component", headers, None, json=body))
+    return stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure bytes and server time for a page load.")
+    parser.add_argument("--size", choices=list(SIZES), default="100k")
+    parser.add_argument("--path", default="/")
+    parser.add_argument("--bandwidth", type=float, default=20.0, help="link speed in Mbit/s")
+    args = parser.parse_args()
+
+    import utils.es_utils as es_utils
+
+    es = MemoryES(generate_columns(SIZES[args.size]))
+    es_utils.get_or_connect_es = lambda: es
+    from main import server
+
+    client = server.test_client()
+    load_page(client, args.path, {})  # 预热：快照和各模块的首次加载不计入
+
+    print(
+        f"{'mode':<8}{'visit':<8}{'requests':>9}{'304':>5}{'external':>9}"
+        f"{'bytes':>12}{'server ms':>11}{'est. ms':>9}"
+    )
+    # before：不压缩、不做条件请求，与改动前服务端的行为相同
+    modes = [("before", "identity", False), ("gzip", "gzip", True)]
+    if importlib.util.find_spec("brotli") is not None:
+        modes.append(("br", "br", True))
+    for mode, encoding, revalidate in modes:
+        headers = {"Accept-Encoding": encoding}
+        etags = {} if revalidate else None
+        for visit in ("first", "repeat"):
+            stats = load_page(client, args.path, headers, etags)
+            # 估计的首次渲染时间：服务端处理时间加上按给定带宽传输全部字节的时间
+            transfer_ms = stats["bytes"] * 8 / (args.bandwidth * 1e6) * 1000
+            print(
+                f"{mode:<8}{visit:<8}{stats['requests']:>9}{stats['not_modified']:>5}"
+                f"{stats['external']:>9}{stats['bytes']:>12}{stats['server_ms']:>11.1f}"
+                f"{stats['server_ms'] + transfer_ms:>9.1f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
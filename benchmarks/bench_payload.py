@@ -0,0 +1,110 @@
+import argparse
+import json
+import random
+import string
+import sys
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+
+import pytz
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from utils.es_utils import DATE_FMT, TIME_ZONE, _build_frame  # noqa: E402
+from utils.series import CATEGORY_FIELDS  # noqa: E402
+
+
+def record_fixture(num=1000, seed=0):
+    # 模拟未做任何裁剪时一页 search 响应的完整结构
+    rnd = random.Random(seed)
+    now = datetime.now(pytz.timezone(TIME_ZONE))
+
+    def commit():
+        return ''.join(rnd.choices(string.hexdigits.lower(), k=40))
+
+    hits = []
+    for i in range(num):
+        created_at = now - timedelta(minutes=30 * (num - i))
+        model_type = rnd.choice(["Dense", "MoE"])
+        hits.append(
+            {
+                "_index": "quality_monitor",
+                "_id": ''.join(rnd.choices(string.ascii_letters + string.digits, k=20)),
+                "_score": None,
+                "_source": {
+                    "created_at": created_at.strftime(DATE_FMT),
+                    "trigger_repo": rnd.choice(["XMLIR", "KLX-Megatron-Extension", "KLX-LLM"]),
+                    "xmlir_commit": f"master@{commit()}",
+                    "llm_commit": f"master@{commit()}",
+                    "mextension_commit": f"dev@{commit()}",
+                    "mcore_commit": f"core_r0.10.0@{commit()}",
+                    "model_type": model_type,
+                    "acc": round(rnd.uniform(2.2, 2.5), 2),
+                    "perf": round(rnd.uniform(300, 310), 2),
+                },
+                "sort": [int(created_at.timestamp() * 1000), i],
+            }
+        )
+    return {
+        "pit_id": "46ToAwMDaWR5BXV1aWQy",
+        "took": 3,
+        "timed_out": False,
+        "_shards": {"total": 1, "successful": 1, "skipped": 0, "failed": 0},
+        "hits": {"total": {"value": num, "relation": "eq"}, "max_score": None, "hits": hits},
+    }
+
+
+def trim(response, fields):
+    # 与 scan_hits 的 _source 过滤 + filter_path + track_total_hits=false 等价的响应
+    keep = list(CATEGORY_FIELDS) + list(fields)
+    return {
+        "pit_id": response["pit_id"],
+        "hits": {
+            "hits": [
+                {"_source": {k: hit["_source"][k] for k in keep}, "sort": hit["sort"]}
+                for hit in response["hits"]["hits"]
+            ]
+        },
+    }
+
+
+def measure(body, fields, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        response = json.loads(body)
+        _build_frame(response["hits"]["hits"], fields)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare full vs trimmed search payloads.")
+    parser.add_argument("--fixture", help="recorded full _search response (JSON)")
+    parser.add_argument("--record", help="write the generated fixture to this path")
+    parser.add_argument("--num", type=int, default=1000)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    if args.fixture:
+        with open(args.fixture) as f:
+            full = json.load(f)
+    else:
+        full = record_fixture(args.num)
+        if args.record:
+            with open(args.record, "w") as f:
+                json.dump(full, f)
+
+    before = json.dumps(full).encode()
+    before_time = measure(before, ("acc", "perf"), args.repeat)
+    print(f"{'payload':<12}{'bytes':>12}{'decode ms':>12}")
+    print(f"{'full':<12}{len(before):>12}{before_time * 1000:>12.2f}")
+    for fields in (("acc",), ("perf",)):
+        after = json.dumps(trim(full, fields)).encode()
+        after_time = measure(after, fields, args.repeat)
+        print(f"{fields[0] + ' only':<12}{len(after):>12}{after_time * 1000:>12.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,101 @@
+import argparse
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from benchmarks.datasets import SIZES, generate_columns, iter_docs  # noqa: E402
+from utils.regression import RegressionDetector  # noqa: E402
+from utils.series import MODEL_TYPES, VALUE_FIELDS  # noqa: E402
+
+TOLERANCE = 5  # 标记点与注入位置相差不超过这么多个点算命中
+
+
+def inject_shifts(columns, num_shifts, sigmas, seed):
+    # 在每个 (模型, 字段) 序列的随机位置注入阶跃变化，幅度为 sigmas 倍噪声标准差，方向交替
+    rnd = np.random.default_rng(seed)
+    truth = {}
+    for model_type in MODEL_TYPES:
+        index = np.flatnonzero(columns["model_type"] == model_type)
+        for field in VALUE_FIELDS:
+            values = columns[field]
+            step = sigmas * values[index].std()
+            positions = np.sort(rnd.choice(np.arange(1000, len(index) - 1000), num_shifts, False))
+            for i, position in enumerate(positions):
+                values[index[position:]] += step if i % 2 else -step
+            truth[(model_type, field)] = positions
+    return truth
+
+
+def score(flags, positions):
+    found = np.array([position for position, _ in flags])
+    if not len(found):
+        return 0, 0
+    distance = np.abs(found[:, None] - positions[None, :])
+    hits = int((distance.min(axis=0) <= TOLERANCE).sum())
+    false = int((distance.min(axis=1) > TOLERANCE).sum())
+    return hits, false
+
+
+def run_full(columns, truth):
+    # 一次性处理整段历史：每个 (模型, 字段) 调用一次 update()
+    results = {}
+    elapsed = 0.0
+    for model_type in MODEL_TYPES:
+        index = np.flatnonzero(columns["model_type"] == model_type)
+        ids = list(range(len(index)))
+        for field in VALUE_FIELDS:
+            detector = RegressionDetector(fields=(field,))
+            start = time.perf_counter()
+            flags = detector.update(model_type, field, columns[field][index], ids)
+            elapsed += time.perf_counter() - start
+            results[(model_type, field)] = score(flags, truth[(model_type, field)])
+    return elapsed, results
+
+
+def run_incremental(columns, batch_size):
+    # 与入库路径相同：按批调用 annotate()，包括排序和写回文档的开销
+    docs = list(iter_docs(columns))
+    ids = [str(i) for i in range(len(docs))]
+    detector = RegressionDetector()
+    start = time.perf_counter()
+    earlier = 0
+    for lo in range(0, len(docs), batch_size):
+        earlier += len(detector.annotate(docs[lo : lo + batch_size], ids[lo : lo + batch_size]))
+    elapsed = time.perf_counter() - start
+    flagged = sum(any(key.endswith("_verdict") for key in doc) for doc in docs)
+    return elapsed, flagged + earlier
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the change-point detector.")
+    parser.add_argument("--size", choices=list(SIZES), default="1m")
+    parser.add_argument("--shifts", type=int, default=20, help="shifts per model and field")
+    parser.add_argument("--sigmas", type=float, default=3.0, help="shift size in noise stds")
+    parser.add_argument("--batch-size", type=int, default=500)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    columns = generate_columns(SIZES[args.size], seed=args.seed)
+    truth = inject_shifts(columns, args.shifts, args.sigmas, args.seed)
+    points = len(columns["created_at"]) * len(VALUE_FIELDS)
+
+    elapsed, results = run_full(columns, truth)
+    print(f"full history: {points} points in {elapsed:.2f}s ({points / elapsed:,.0f} points/s)")
+    print(f"{'series':<12}{'injected':>10}{'detected':>10}{'false':>8}")
+    for (model_type, field), (hits, false) in results.items():
+        print(f"{model_type + '/' + field:<12}{args.shifts:>10}{hits:>10}{false:>8}")
+
+    elapsed, flagged = run_incremental(columns, args.batch_size)
+    docs = len(columns["created_at"])
+    print(
+        f"incremental:  {docs} docs in batches of {args.batch_size}, {elapsed:.2f}s "
+        f"({docs / elapsed:,.0f} docs/s), {flagged} flagged"
+    )
+
+
+if __name__ == "__main__":
+    main()
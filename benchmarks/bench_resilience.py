@@ -0,0 +1,93 @@
+import argparse
+import statistics
+import sys
+import time
+from datetime import datetime
+from pathlib import Path
+
+import pytz
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from benchmarks.datasets import generate_columns  # noqa: E402
+from benchmarks.memory_es import FaultyES, MemoryES  # noqa: E402
+from utils import es_utils  # noqa: E402
+from utils.cache import RangeCache  # noqa: E402
+from utils.resilience import CircuitBreaker, deadline  # noqa: E402
+
+# 依次模拟 ES 正常、变慢、不可用、恢复四个阶段，比较有无截止时间和熔断器时每个查询的延迟，
+# 以及返回旧数据和空结果的次数
+PHASES = ("healthy", "slow", "down", "recovered")
+
+
+def _date(millis):
+    return datetime.fromtimestamp(millis / 1000, pytz.timezone(es_utils.TIME_ZONE)).strftime(
+        es_utils.DATE_FMT
+    )
+
+
+def run(faults, lo, hi, args, resilient):
+    # 区间尾部立即过期，每个查询都要访问 ES，失败时才会用到缓存里的旧数据
+    es_utils.RESULT_CACHE = RangeCache(edge_ttl=0, edge_window=hi - lo + 86_400_000)
+    es_utils.ES_BREAKER = CircuitBreaker(
+        "Elasticsearch",
+        failures=args.failures if resilient else float("inf"),
+        reset_after=args.reset,
+    )
+    results = {}
+    for phase in PHASES:
+        faults.latency = args.slow if phase == "slow" else args.latency
+        faults.down = phase == "down"
+        if phase == "recovered":
+            # 等熔断器放行试探请求
+            time.sleep(args.reset)
+        requests = faults.requests
+        latencies, stale, empty = [], 0, 0
+        for _ in range(args.requests):
+            start = time.perf_counter()
+            with deadline(args.deadline if resilient else None):
+                frame = es_utils.search_data(_date(lo), _date(hi), es=faults, fields=("acc",))
+            latencies.append(time.perf_counter() - start)
+            stale += frame.stale
+            empty += not len(frame)
+        latencies.sort()
+        results[phase] = {
+            "p50": statistics.median(latencies) * 1000,
+            "p99": latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))] * 1000,
+            "stale": stale,
+            "empty": empty,
+            "es_requests": faults.requests - requests,
+        }
+    return results
+
+
+def main():
+    # 失败查询的调用栈打印到 stderr，可以用 2>/dev/null 隐藏
+    parser = argparse.ArgumentParser(description="Benchmark search_data while ES is slow or down.")
+    parser.add_argument("--docs", type=int, default=5_000)
+    parser.add_argument("--days", type=int, default=7)
+    parser.add_argument("--requests", type=int, default=10)
+    parser.add_argument("--latency", type=float, default=0.005, help="seconds per ES request")
+    parser.add_argument("--slow", type=float, default=0.5, help="latency in the slow phase")
+    parser.add_argument("--deadline", type=float, default=0.2, help="seconds per search_data")
+    parser.add_argument("--failures", type=int, default=3, help="failures before the circuit opens")
+    parser.add_argument("--reset", type=float, default=1.0, help="seconds the circuit stays open")
+    args = parser.parse_args()
+
+    columns = generate_columns(args.docs, days=args.days)
+    lo, hi = int(columns["created_at"][0]), int(columns["created_at"][-1])
+    faults = FaultyES(MemoryES(columns))
+
+    print(
+        f"{'mode':>9} {'phase':>9} {'p50 ms':>9} {'p99 ms':>9} {'stale':>6} {'empty':>6} {'es':>5}"
+    )
+    for mode, resilient in (("plain", False), ("resilient", True)):
+        for phase, result in run(faults, lo, hi, args, resilient).items():
+            print(
+                f"{mode:>9} {phase:>9} {result['p50']:>9.1f} {result['p99']:>9.1f} "
+                f"{result['stale']:>6} {result['empty']:>6} {result['es_requests']:>5}"
+            )
+
+
+if __name__ == "__main__":
+    main()
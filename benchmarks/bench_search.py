@@ -0,0 +1,159 @@
+import argparse
+import json
+import platform
+import statistics
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+import plotly
+from plotly.io.json import to_json_plotly
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from benchmarks.datasets import SIZES, generate_columns  # noqa: E402
+from benchmarks.memory_es import MemoryES, TimedClient  # noqa: E402
+from pages.common import create_scatter_figure  # noqa: E402
+from utils.es_utils import _build_frame, scan_hits, search_aggregated_data  # noqa: E402
+
+STAGES = ["fetch", "decode", "build", "figure", "serialize"]
+
+
+def _render(frame, field):
+    start = time.perf_counter()
+    figures = [
+        create_scatter_figure(frame.model(model), field, name=model, color='#e74c3c')
+        for model in ("Dense", "MoE")
+    ]
+    figure_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    payload = "".join(to_json_plotly(figure) for figure in figures)
+    return figure_time, time.perf_counter() - start, len(payload)
+
+
+def _timed(client, fetch, field):
+    start = time.perf_counter()
+    frame = fetch()
+    total = time.perf_counter() - start
+    figure_time, serialize_time, figure_bytes = _render(frame, field)
+    return {
+        "fetch": client.fetch_time,
+        "decode": client.decode_time,
+        "build": total - client.fetch_time - client.decode_time,
+        "figure": figure_time,
+        "serialize": serialize_time,
+    }, {"points": len(frame), "response_bytes": client.response_bytes, "figure_bytes": figure_bytes}
+
+
+def run_raw(es, lo, hi, fields):
+    client = TimedClient(es)
+    return _timed(
+        client, lambda: _build_frame(scan_hits(client, lo, hi, fields=fields), fields), fields[0]
+    )
+
+
+def run_aggregated(es, lo, hi, fields, interval):
+    client = TimedClient(es)
+    return _timed(
+        client,
+        lambda: search_aggregated_data(lo, hi, interval, es=client, fields=fields),
+        fields[0],
+    )
+
+
+def measure(fn, repeat):
+    runs = [fn() for _ in range(repeat)]
+    stages = {stage: statistics.median(run[0][stage] for run in runs) * 1000 for stage in STAGES}
+    stages["total"] = sum(stages.values())
+    return {"stages_ms": stages, **runs[-1][1]}
+
+
+def _git_revision():
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"], text=True, stderr=subprocess.DEVNULL
+        ).strip()
+    except Exception:
+        return None
+
+
+def compare(results, baseline, tolerance):
+    # 与基线逐项比较，任何阶段变慢超过 tolerance 即视为回归
+    old = {(r["size"], r["mode"]): r for r in baseline["results"]}
+    regressions = []
+    for result in results:
+        previous = old.get((result["size"], result["mode"]))
+        if previous is None:
+            continue
+        for stage, value in result["stages_ms"].items():
+            before = previous["stages_ms"].get(stage)
+            if before and value > before * (1 + tolerance) and value - before > 1:
+                regressions.append(
+                    f"{result['size']}/{result['mode']}/{stage}: {before:.1f} -> {value:.1f} ms"
+                )
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark search_data and figure building.")
+    parser.add_argument("--sizes", default=",".join(SIZES), help="comma separated, e.g. 1k,10k")
+    parser.add_argument("--days", type=int, default=180)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--field", choices=["acc", "perf"], default="acc")
+    parser.add_argument("--interval", default="3h", help="bucket size for the aggregated mode")
+    parser.add_argument("--output", help="write results as JSON to this path")
+    parser.add_argument("--baseline", help="previous results JSON to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.2)
+    args = parser.parse_args()
+
+    fields = (args.field,)
+    results = []
+    print(
+        f"{'size':>6} {'mode':>5} {'points':>8} " + " ".join(f"{s:>10}" for s in STAGES + ["total"])
+    )
+    for size in args.sizes.split(","):
+        columns = generate_columns(SIZES[size], days=args.days)
+        es = MemoryES(columns)
+        lo, hi = int(columns["created_at"][0]), int(columns["created_at"][-1])
+        for mode, fn in (
+            ("raw", lambda: run_raw(es, lo, hi, fields)),
+            ("agg", lambda: run_aggregated(es, lo, hi, fields, args.interval)),
+        ):
+            result = {"size": size, "docs": SIZES[size], "mode": mode, **measure(fn, args.repeat)}
+            results.append(result)
+            stages = result["stages_ms"]
+            print(
+                f"{size:>6} {mode:>5} {result['points']:>8} "
+                + " ".join(f"{stages[s]:>10.1f}" for s in STAGES + ["total"])
+            )
+
+    report = {
+        "meta": {
+            "revision": _git_revision(),
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+            "python": platform.python_version(),
+            "numpy": np.__version__,
+            "plotly": plotly.__version__,
+            "days": args.days,
+            "repeat": args.repeat,
+        },
+        "results": results,
+    }
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        for line in regressions:
+            print(f"REGRESSION {line}")
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
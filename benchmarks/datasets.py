@@ -0,0 +1,88 @@
+import argparse
+import json
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from utils.series import COMMIT_FIELDS  # noqa: E402
+
+SIZES = {"1k": 1_000, "10k": 10_000, "100k": 100_000, "1m": 1_000_000}
+REPOS = np.array(["XMLIR", "KLX-Megatron-Extension", "KLX-LLM"], dtype=object)
+BRANCHES = {
+    "xmlir_commit": ["master"],
+    "llm_commit": ["master"],
+    "mextension_commit": ["main", "dev", "dev_0.10.0"],
+    "mcore_commit": ["core_r0.10.0"],
+}
+# 与 init_es.generate_sample_data 相同的取值范围
+PROFILES = {
+    "Dense": {"acc": (2.2, 2.5), "perf": (300, 310)},
+    "MoE": {"acc": (7.2, 7.5), "perf": (200, 210)},
+}
+
+
+def _commit_pool(rnd, field, size):
+    branches = BRANCHES[field]
+    shas = rnd.integers(0, 16, size=(size, 40))
+    digits = np.array(list("0123456789abcdef"))
+    return np.array(
+        [f"{branches[i % len(branches)]}@{''.join(digits[row])}" for i, row in enumerate(shas)],
+        dtype=object,
+    )
+
+
+def generate_columns(num, days=180, seed=0, end_ms=None):
+    # 向量化生成，1M 条也只需几秒；每个 commit 平均被 4 次运行共享，接近 CI 的实际情况
+    rnd = np.random.default_rng(seed)
+    if end_ms is None:
+        end_ms = int(time.time() * 1000)
+    ts = np.sort(rnd.integers(end_ms - days * 86_400_000, end_ms, size=num, dtype=np.int64))
+    model_type = np.where(rnd.random(num) < 0.5, "Dense", "MoE").astype(object)
+    columns = {
+        "created_at": ts,
+        "model_type": model_type,
+        "trigger_repo": REPOS[rnd.integers(0, 3, num)],
+    }
+    pool_size = max(num // 4, 1)
+    for field in COMMIT_FIELDS:
+        columns[field] = _commit_pool(rnd, field, pool_size)[rnd.integers(0, pool_size, num)]
+    for field in ("acc", "perf"):
+        values = np.empty(num)
+        for name, profile in PROFILES.items():
+            mask = model_type == name
+            low, high = profile[field]
+            values[mask] = np.round(rnd.uniform(low, high, mask.sum()), 2)
+        columns[field] = values
+    return columns
+
+
+def iter_docs(columns):
+    fields = list(columns)
+    for row in zip(*(columns[field].tolist() for field in fields)):
+        yield dict(zip(fields, row))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate a synthetic quality_monitor dataset.")
+    parser.add_argument("size", choices=list(SIZES))
+    parser.add_argument("--days", type=int, default=180)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", default="-", help="JSONL output, '-' for stdout")
+    args = parser.parse_args()
+
+    columns = generate_columns(SIZES[args.size], days=args.days, seed=args.seed)
+    out = sys.stdout if args.output == "-" else open(args.output, "w")
+    try:
+        for doc in iter_docs(columns):
+            out.write(json.dumps(doc) + "\n")
+    finally:
+        if out is not sys.stdout:
+            out.close()
+
+
+if __name__ == "__main__":
+    main()
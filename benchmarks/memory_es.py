@@ -0,0 +1,257 @@
+import asyncio
+import json
+import threading
+import time
+
+import numpy as np
+from elastic_transport import ConnectionError, ConnectionTimeout
+
+from utils.commits import COMMIT_SHA, COMMIT_SHORT, commit_fields
+from utils.es_utils import _to_millis
+from utils.series import COMMIT_FIELDS
+
+_UNITS = {"ms": 1, "s": 1_000, "m": 60_000, "h": 3_600_000, "d": 86_400_000}
+
+
+def _millis(value):
+    if isinstance(value, (int, np.integer)):
+        return int(value)
+    return _to_millis(value)
+
+
+def _interval(value):
+    unit = value.lstrip("0123456789")
+    return int(value[: -len(unit)]) * _UNITS[unit]
+
+
+class MemoryES:
+    # 只实现 search_data 和 search_commit 用到的那部分 API：point-in-time、search_after 分页、
+    # range/term/prefix/exists 过滤、按 created_at 倒序、_source 过滤，以及 terms + date_histogram
+    # + stats 聚合。文档按 (created_at, 位置) 有序存放，位置即 _shard_doc 排序值。
+    def __init__(self, columns, tz_offset_ms=8 * 3_600_000):
+        self.columns = columns
+        self.ts = columns["created_at"]
+        self.tz_offset_ms = tz_offset_ms
+        self.requests = 0
+        self._multi = {}
+
+    def ping(self):
+        return True
+
+    def options(self, **kwargs):
+        return self
+
+    def open_point_in_time(self, index, keep_alive):
+        return {"id": "memory-pit"}
+
+    def close_point_in_time(self, id=None, body=None):
+        return {"succeeded": True}
+
+    def search(self, index=None, body=None, filter_path=None, **kwargs):
+        self.requests += 1
+        body = dict(body or {}, **kwargs)
+        rows = self._filter(body.get("query", {"match_all": {}}))
+        if "aggs" in body:
+            return {"aggregations": self._aggregate(rows, body["aggs"])}
+
+        search_after = body.get("search_after")
+        if search_after is not None:
+            rows = rows[rows > search_after[1]]
+        if _descending(body.get("sort")):
+            rows = rows[::-1]
+        rows = rows[: body.get("size", 10)]
+        # 与 ES 一致：文档中不存在的字段不出现在 _source 里
+        source = [field for field in body.get("_source") or self.columns if field in self.columns]
+        values = {field: self.columns[field][rows].tolist() for field in source}
+        ts = self.ts[rows].tolist()
+        hits = [
+            {"_source": dict(zip(source, row)), "sort": [t, int(i)]}
+            for t, i, row in zip(ts, rows.tolist(), zip(*(values[f] for f in source)))
+        ]
+        return {"pit_id": "memory-pit", "hits": {"hits": hits}}
+
+    def _filter(self, query):
+        if "bool" in query:
+            rows = np.arange(len(self.ts))
+            for clause in query["bool"].get("filter", []):
+                rows = np.intersect1d(rows, self._filter(clause), assume_unique=True)
+            return rows
+        if "range" in query:
+            bounds = query["range"]["created_at"]
+            lo = np.searchsorted(self.ts, _millis(bounds["gte"]), side="left")
+            hi = np.searchsorted(self.ts, _millis(bounds["lte"]), side="right")
+            return np.arange(lo, hi)
+        if "term" in query:
+            field, value = next(iter(query["term"].items()))
+            if field in (COMMIT_SHA, COMMIT_SHORT):
+                return self._match(field, lambda v: v == value)
+            return np.flatnonzero(self.columns[field.split(".")[0]] == value)
+        if "prefix" in query:
+            field, value = next(iter(query["prefix"].items()))
+            return self._match(field, lambda v: v.startswith(value))
+        if "exists" in query:
+            # 生成的数据集里没有检测结果字段，整列要么都有要么都没有
+            if query["exists"]["field"] not in self.columns:
+                return np.empty(0, dtype=np.int64)
+            return np.arange(len(self.ts))
+        return np.arange(len(self.ts))
+
+    def _match(self, field, predicate):
+        # commit_sha/commit_short 是入库时由 commit_fields() 生成的多值字段，第一次查询时才计算
+        values = self._multi.get(field)
+        if values is None:
+            docs = zip(*(self.columns[name].tolist() for name in COMMIT_FIELDS))
+            values = [commit_fields(dict(zip(COMMIT_FIELDS, doc)))[field] for doc in docs]
+            self._multi[field] = values
+        return np.array([i for i, row in enumerate(values) if any(map(predicate, row))], dtype=int)
+
+    def _aggregate(self, rows, aggs):
+        result = {}
+        for name, spec in aggs.items():
+            if "terms" in spec:
+                field = spec["terms"]["field"].split(".")[0]
+                labels = self.columns[field][rows]
+                buckets = []
+                for key in sorted(set(labels.tolist())):
+                    sub = rows[labels == key]
+                    bucket = {"key": key, "doc_count": len(sub)}
+                    bucket.update(self._aggregate(sub, spec.get("aggs", {})))
+                    buckets.append(bucket)
+                result[name] = {"buckets": buckets}
+            elif "date_histogram" in spec:
+                step = _interval(spec["date_histogram"]["fixed_interval"])
+                local = self.ts[rows] + self.tz_offset_ms
+                keys = local // step * step - self.tz_offset_ms
+                buckets = []
+                for key, start, count in zip(*_runs(keys)):
+                    bucket = {"key": int(key), "doc_count": int(count)}
+                    bucket.update(
+                        self._aggregate(rows[start : start + count], spec.get("aggs", {}))
+                    )
+                    buckets.append(bucket)
+                result[name] = {"buckets": buckets}
+            elif "stats" in spec:
+                values = self.columns[spec["stats"]["field"]][rows]
+                result[name] = {
+                    "count": len(values),
+                    "min": float(values.min()),
+                    "max": float(values.max()),
+                    "avg": float(values.mean()),
+                    "sum": float(values.sum()),
+                }
+        return result
+
+
+def _descending(sort):
+    return bool(sort) and sort[0] == {"created_at": {"order": "desc"}}
+
+
+def _runs(keys):
+    starts = np.flatnonzero(np.r_[True, keys[1:] != keys[:-1]])
+    counts = np.diff(np.r_[starts, len(keys)])
+    return keys[starts], starts, counts
+
+
+class TimedClient:
+    # 把 MemoryES 的响应序列化成 JSON 再解析回来，模拟真实客户端的网络传输和解码，
+    # 并分别累计两部分耗时
+    def __init__(self, es):
+        self.es = es
+        self.fetch_time = 0.0
+        self.decode_time = 0.0
+        self.response_bytes = 0
+
+    def options(self, **kwargs):
+        return self
+
+    def open_point_in_time(self, **kwargs):
+        return self.es.open_point_in_time(**kwargs)
+
+    def close_point_in_time(self, **kwargs):
+        return self.es.close_point_in_time(**kwargs)
+
+    def search(self, **kwargs):
+        start = time.perf_counter()
+        raw = json.dumps(self.es.search(**kwargs)).encode()
+        self.fetch_time += time.perf_counter() - start
+        self.response_bytes += len(raw)
+        start = time.perf_counter()
+        response = json.loads(raw)
+        self.decode_time += time.perf_counter() - start
+        return response
+
+
+class FaultyES:
+    # 包装 MemoryES 注入故障：每个请求先等待 latency 秒，down 为 True 时连接失败。
+    # 与真实客户端一致，options(request_timeout=...) 给出的超时先到时抛出 ConnectionTimeout
+    def __init__(self, es, latency=0.0, down=False):
+        self.es = es
+        self.latency = latency
+        self.down = down
+        self.requests = 0
+        self._lock = threading.Lock()
+
+    def options(self, request_timeout=None, **kwargs):
+        return _FaultyClient(self, request_timeout)
+
+    def ping(self):
+        return not self.down
+
+    def open_point_in_time(self, **kwargs):
+        return _FaultyClient(self).open_point_in_time(**kwargs)
+
+    def close_point_in_time(self, **kwargs):
+        return _FaultyClient(self).close_point_in_time(**kwargs)
+
+    def search(self, **kwargs):
+        return _FaultyClient(self).search(**kwargs)
+
+
+class _FaultyClient:
+    def __init__(self, faults, request_timeout=None):
+        self.faults = faults
+        self.request_timeout = request_timeout
+
+    def _request(self, method, **kwargs):
+        faults = self.faults
+        with faults._lock:
+            faults.requests += 1
+        if faults.down:
+            raise ConnectionError("injected connection failure")
+        timeout = self.request_timeout
+        if timeout is not None and faults.latency > timeout:
+            time.sleep(timeout)
+            raise ConnectionTimeout(f"injected timeout after {timeout:.3f}s")
+        time.sleep(faults.latency)
+        return getattr(faults.es, method)(**kwargs)
+
+    def open_point_in_time(self, **kwargs):
+        return self._request("open_point_in_time", **kwargs)
+
+    def close_point_in_time(self, **kwargs):
+        return self._request("close_point_in_time", **kwargs)
+
+    def search(self, **kwargs):
+        return self._request("search", **kwargs)
+
+
+class AsyncMemoryES:
+    # AsyncElasticsearch 接口的 MemoryES，用于不依赖真实 ES 检查 search_concurrently；
+    # 每个请求先 await latency 秒，多个协程的等待可以重叠
+    def __init__(self, es, latency=0.0):
+        self.es = es
+        self.latency = latency
+
+    def options(self, **kwargs):
+        return self
+
+    async def open_point_in_time(self, **kwargs):
+        await asyncio.sleep(self.latency)
+        return self.es.open_point_in_time(**kwargs)
+
+    async def close_point_in_time(self, **kwargs):
+        return self.es.close_point_in_time(**kwargs)
+
+    async def search(self, **kwargs):
+        await asyncio.sleep(self.latency)
+        return self.es.search(**kwargs)
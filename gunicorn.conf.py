@@ -0,0 +1,8 @@
+import time
+
+
+def post_fork(server, worker):
+    # 每个 worker 启动后立即在后台连接 ES 并加载快照，/readyz 在完成前返回 503
+    from utils.lifecycle import start_warm_up
+
+    start_warm_up(started_at=time.time())
@@ -1,36 +1,58 @@
+import inspect
+import os
+import sys
+
 import dash
-from dash import Dash
+from dash import Dash, html
 from flask import Flask
 
+from api import api, probes
+from middleware import init_app
+from utils.assets import ASSETS_IGNORE, external_scripts, external_stylesheets
+from utils.lifecycle import start_warm_up
+
 server = Flask(__name__, instance_relative_config=True)
+server.register_blueprint(api)
+server.register_blueprint(probes)
+init_app(server)
 dash_app = Dash(
     __name__,
     server=server,
     use_pages=True,
     assets_folder='static',
-    external_scripts=[
-        {
-            'src': 'https://cdn.jsdelivr.net/npm/bootstrap@5.3.1/dist/js/bootstrap.bundle.min.js',
-            'integrity': 'sha384-HwwvtgBNo3bZJJLYd8oVXjrBZt8cqVSpeBNS5n7C8IVInixGAoxmnlMuBnhbgrkm',
-            'crossorigin': 'anonymous',
-        }
-    ],
-    external_stylesheets=[
-        {
-            'href': 'https://cdn.jsdelivr.net/npm/bootstrap@5.3.1/dist/css/bootstrap.min.css',
-            'integrity': 'sha384-4bw+/aepP/YC94hEpVNVgiZdgIC5+VKNBQNGCHeKRQN+PtmoHDEXuppvnDJzQIu9',
-            'crossorigin': 'anonymous',
-            'rel': 'stylesheet',
-        },
-        {
-            'href': 'https://stackpath.bootstrapcdn.com/font-awesome/4.7.0/css/font-awesome.min.css',
-            'rel': 'stylesheet',
-        },
-    ],
+    # 只在启动时生效，见下面的 validation_layout
+    suppress_callback_exceptions=True,
+    # 样式使用提交在 static/vendor 中的副本，文件缺失时才退回 CDN（见 utils/assets.py）
+    assets_ignore=ASSETS_IGNORE,
+    external_scripts=external_scripts(),
+    external_stylesheets=external_stylesheets(),
 )
 
 with server.app_context():
     dash_app.layout = dash.page_container
 
+
+def validation_layout():
+    # 浏览器端用来校验回调的组件 id：各页面不含数据的组件结构；没有 skeleton 的页面不查询数据，
+    # 直接用 layout（去掉 timed，不计入 LAYOUT_SECONDS）
+    pages = [
+        getattr(sys.modules[page['module']], 'skeleton', inspect.unwrap(page['layout']))()
+        for page in dash.page_registry.values()
+    ]
+    return html.Div([dash.page_container, *pages])
+
+
+# Dash 的 pages 路由在处理第一个请求时注册页面回调，不 suppress 时还会调用所有页面完整的 layout
+# （查询 ES、加载快照）生成 validation_layout。启动时用一个请求上下文先完成这一步，然后打开校验并
+# 换成不含数据的组件结构，之后的请求不再修改这两项
+with server.test_request_context("/"):
+    server.preprocess_request()
+dash_app.config.suppress_callback_exceptions = False
+dash_app.validation_layout = validation_layout()
+
+
 if __name__ == "__main__":
+    # gunicorn 在 post_fork 中预热（见 gunicorn.conf.py）；开发服务器的 reloader 只在子进程中预热
+    if os.environ.get("WERKZEUG_RUN_MAIN") == "true":
+        start_warm_up()
     server.run(debug=True)
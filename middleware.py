@@ -0,0 +1,201 @@
+import gzip
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+
+from flask import g, request
+
+from utils.assets import VENDOR_URL
+from utils.metrics import CALLBACK_BYTES, CALLBACK_SECONDS, HTTP_SECONDS, RESPONSE_BYTES
+from utils.profiler import PROFILE_ALWAYS, Session, profiling_enabled, requested
+from utils.resilience import reset_deadline, set_deadline
+
+try:
+    import brotli
+except ImportError:  # brotli 是可选依赖，没有时只用 gzip
+    brotli = None
+
+COMPRESS_MIN_SIZE = 1024  # 小于该字节数的响应压缩收益不抵开销
+# 可缓存的 GET 响应压缩一次后复用，用较高的压缩级别；回调的 POST 响应每次都不同，用最快的级别
+GZIP_LEVEL = 6
+GZIP_FAST_LEVEL = 1
+BROTLI_QUALITY = 5
+BROTLI_FAST_QUALITY = 1
+COMPRESS_MIMETYPES = {
+    "text/html",
+    "text/css",
+    "text/plain",
+    "text/javascript",
+    "application/javascript",
+    "application/json",
+    "image/svg+xml",
+}
+VENDOR_MAX_AGE = 365 * 24 * 3600
+# GET 响应压缩后的结果按 (ETag, 编码) 缓存，plotly.js 等大文件不必每次重新压缩
+COMPRESSED_CACHE_SIZE = 64
+DASH_CALLBACK_PATH = "/_dash-update-component"
+# 单个请求内所有 ES 查询的总时限（秒），超时后返回之前缓存的数据；应小于 gunicorn 的 --timeout
+REQUEST_DEADLINE = 15
+_COMPRESSED = OrderedDict()
+_LOCK = threading.Lock()
+
+
+def init_app(server):
+    # Dash 自带的 compress 选项依赖 flask-compress，这里直接在 after_request 中处理：
+    # 对 GET 响应加 ETag 并处理 If-None-Match，对文本类响应（含回调的 JSON）做 gzip/brotli 压缩。
+    # after_request 按注册的相反顺序执行，_record_metrics 看到的是压缩前的响应
+    server.before_request(_start_timer)
+    server.before_request(_start_deadline)
+    server.teardown_request(_clear_deadline)
+    server.after_request(_after_request)
+    server.after_request(_record_metrics)
+    if profiling_enabled():
+        # 最后注册的 after_request 最先执行，剖析结果不包含压缩
+        server.before_request(_start_profile)
+        server.after_request(_stop_profile)
+        server.teardown_request(_abort_profile)
+
+
+def _start_timer():
+    g.request_start = time.perf_counter()
+
+
+def _start_deadline():
+    g.deadline_token = set_deadline(REQUEST_DEADLINE)
+
+
+def _clear_deadline(exc=None):
+    token = g.pop("deadline_token", None)
+    if token is not None:
+        reset_deadline(token)
+
+
+def _record_metrics(response):
+    start = g.pop("request_start", None)
+    if start is None:
+        return response
+    elapsed = time.perf_counter() - start
+    endpoint = request.url_rule.rule if request.url_rule is not None else "unmatched"
+    HTTP_SECONDS.observe(
+        elapsed, endpoint=endpoint, method=request.method, status=response.status_code
+    )
+    # 流式响应的长度未知
+    size = None if response.is_streamed else response.calculate_content_length()
+    if size is not None:
+        RESPONSE_BYTES.observe(size, endpoint=endpoint)
+    if request.path == DASH_CALLBACK_PATH and request.method == "POST":
+        # 按回调的输出区分，例如 "data-perf.data"；pages 渲染页面的回调也在其中
+        body = request.get_json(silent=True) or {}
+        output = body.get("output", "unknown")
+        CALLBACK_SECONDS.observe(elapsed, output=output)
+        if size is not None:
+            CALLBACK_BYTES.observe(size, output=output)
+    return response
+
+
+def _start_profile():
+    if requested(request.headers) or (PROFILE_ALWAYS and request.path == DASH_CALLBACK_PATH):
+        g.profile = Session.start()
+
+
+def _stop_profile(response):
+    session = g.pop("profile", None)
+    if session is None:
+        return response
+    meta = {
+        "path": request.path,
+        "method": request.method,
+        "args": request.args.to_dict(flat=False),
+        "status": response.status_code,
+        # 流式响应在剖析结束之后才生成内容
+        "response_bytes": None if response.is_streamed else response.calculate_content_length(),
+    }
+    if request.path == DASH_CALLBACK_PATH:
+        # 回调的输出和输入，例如日期范围
+        body = request.get_json(silent=True) or {}
+        meta.update({key: body.get(key) for key in ("output", "inputs", "state", "changedPropIds")})
+    directory = session.stop(meta)
+    response.headers["X-Profile-Id"] = directory.name
+    print(f"Profile written to {directory}")
+    return response
+
+
+def _abort_profile(exc):
+    session = g.pop("profile", None)
+    if session is not None:
+        session.abort()
+
+
+def _encoding():
+    accept = request.accept_encodings
+    if brotli is not None and accept["br"]:
+        return "br"
+    if accept["gzip"]:
+        return "gzip"
+    return None
+
+
+def _compress(data, encoding, fast=False):
+    if encoding == "br":
+        return brotli.compress(data, quality=BROTLI_FAST_QUALITY if fast else BROTLI_QUALITY)
+    return gzip.compress(data, GZIP_FAST_LEVEL if fast else GZIP_LEVEL, mtime=0)
+
+
+def _cached_compress(data, encoding, etag):
+    if etag is None:
+        return _compress(data, encoding, fast=True)
+    key = (etag, encoding)
+    with _LOCK:
+        body = _COMPRESSED.get(key)
+        if body is not None:
+            _COMPRESSED.move_to_end(key)
+            return body
+    body = _compress(data, encoding)
+    with _LOCK:
+        _COMPRESSED[key] = body
+        while len(_COMPRESSED) > COMPRESSED_CACHE_SIZE:
+            _COMPRESSED.popitem(last=False)
+    return body
+
+
+def _after_request(response):
+    if request.path.startswith(VENDOR_URL):
+        # Flask 的 send_file 默认带 no-cache，会让浏览器每次都重新验证
+        response.cache_control.no_cache = None
+        response.cache_control.public = True
+        response.cache_control.max_age = VENDOR_MAX_AGE
+        response.cache_control.immutable = True
+    if (
+        response.status_code != 200
+        or response.is_streamed
+        or response.mimetype not in COMPRESS_MIMETYPES
+        or "Content-Encoding" in response.headers
+    ):
+        return response
+
+    # 静态文件响应默认直接透传文件对象，需要读出内容才能压缩
+    response.direct_passthrough = False
+    data = response.get_data()
+    cacheable = request.method in ("GET", "HEAD")
+    encoding = _encoding() if len(data) >= COMPRESS_MIN_SIZE else None
+    response.vary.add("Accept-Encoding")
+
+    etag = None
+    if cacheable:
+        etag = response.get_etag()[0] or hashlib.sha1(data).hexdigest()
+        # 不同编码是不同的表示，ETag 也要区分
+        tag = f"{etag}-{encoding}" if encoding else etag
+        response.set_etag(tag)
+        if request.if_none_match.contains(tag):
+            not_modified = response.__class__(status=304)
+            not_modified.set_etag(tag)
+            if "Cache-Control" in response.headers:
+                not_modified.headers["Cache-Control"] = response.headers["Cache-Control"]
+            not_modified.vary.add("Accept-Encoding")
+            return not_modified
+
+    if encoding is not None:
+        response.set_data(_cached_compress(data, encoding, etag))
+        response.headers["Content-Encoding"] = encoding
+    return response
@@ -1,17 +1,22 @@
 import json
+from pathlib import Path
 
 import dash
 import dash_bootstrap_components as dbc
 from dash import dcc, html
 
+from utils.metrics import LAYOUT_SECONDS, timed
+
 from .common import create_sidebar
 
 dash.register_page(__name__, path='/about', title='About', name='About')
 
-with open('pages/text.json') as f:
+# 与工作目录无关，导入时读取一次
+with open(Path(__file__).with_name('text.json')) as f:
     about = json.load(f)['about']
 
 
+@timed(LAYOUT_SECONDS, page='about')
 def layout():
     banner = dbc.Row(
         [
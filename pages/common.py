@@ -1,11 +1,16 @@
+import time
 from datetime import datetime, timedelta
 
 import dash_bootstrap_components as dbc
+import numpy as np
 import plotly.graph_objs as go
 import pytz
-from dash import dcc, html
+from dash import Patch, dcc, html
 
-from utils import DATE_FMT, TIME_ZONE
+from utils import DATE_FMT, RAW_SPAN_LIMIT, TIME_ZONE, is_regression
+from utils.metrics import BUILD_SECONDS, timed
+
+LIVE_INTERVAL = 30  # 秒，实时刷新的轮询间隔
 
 
 def create_sidebar(active_item=None):
@@ -71,48 +76,355 @@ def create_sidebar(active_item=None):
     )
 
 
-def create_time_card(id):
-    return dbc.Card(
-        [
-            dbc.CardBody(
-                [
-                    html.H5("时间范围", className="card-title"),
-                    dcc.DatePickerRange(
-                        id=id,
-                        start_date=(
-                            datetime.now(pytz.timezone(TIME_ZONE)) - timedelta(days=30)
-                        ).strftime(DATE_FMT),
-                        end_date=datetime.now(pytz.timezone(TIME_ZONE)).strftime(DATE_FMT),
-                        display_format='YYYY-MM-DD',
-                    ),
-                ]
-            )
-        ],
+def create_time_card(id, live_id=None):
+    children = [
+        html.H5("时间范围", className="card-title"),
+        dcc.DatePickerRange(
+            id=id,
+            start_date=(datetime.now(pytz.timezone(TIME_ZONE)) - timedelta(days=30)).strftime(
+                DATE_FMT
+            ),
+            end_date=datetime.now(pytz.timezone(TIME_ZONE)).strftime(DATE_FMT),
+            display_format='YYYY-MM-DD',
+        ),
+    ]
+    if live_id is not None:
+        # 实时刷新开关：打开后按 LIVE_INTERVAL 轮询，只把新数据追加到已有的图上
+        children += [
+            dbc.Switch(id=live_id, label="实时刷新", value=False, className="mt-2"),
+            dcc.Interval(id=f'{live_id}-interval', interval=LIVE_INTERVAL * 1000, disabled=True),
+            dcc.Store(id=f'{live_id}-cursor'),
+        ]
+    return dbc.Card([dbc.CardBody(children)], className="mb-3")
+
+
+def create_stale_alert(id):
+    # ES 查询失败、页面显示的是之前缓存的数据时由 STALE_JS 打开
+    return dbc.Alert(
+        "数据服务暂时不可用，当前显示的是之前加载的数据，可能不是最新的。",
+        id=id,
+        color="warning",
+        is_open=False,
         className="mb-3",
     )
 
 
-def create_scatter_figure(x, y, name, color, text, y_range):
+# 点数超过 WEBGL_THRESHOLD 时改用 WebGL 渲染；超过 MARKER_THRESHOLD 时只画线，
+# 按图宽约 1000px、marker 直径 6px 估算，再多 marker 就会相互重叠
+WEBGL_THRESHOLD = 1000
+MARKER_THRESHOLD = 300
+Y_PADDING = 0.05  # y 轴上下各留出数据跨度的 5%
+
+HOVER_TEMPLATE = (
+    "%{y:.3f} · %{x|%Y-%m-%d %H:%M}<br>"
+    + "%{customdata[0]}<br>"
+    + "XMLIR %{customdata[1]}<br>"
+    + "LLM %{customdata[2]}<br>"
+    + "MExt %{customdata[3]}<br>"
+    + "MCore %{customdata[4]}"
+    + "<extra></extra>"
+)
+BAND_HOVER_TEMPLATE = (
+    "%{y:.3f} · %{x|%Y-%m-%d %H:%M}<br>"
+    + "%{customdata[0]} runs, %{customdata[1]:.3f} ~ %{customdata[2]:.3f}"
+    + "<extra></extra>"
+)
+
+
+FLAG_HOVER_TEMPLATE = (
+    "%{customdata[0]} · %{x|%Y-%m-%d %H:%M}<br>"
+    + "%{y:.3f}, baseline %{customdata[1]:.3f} (%{customdata[2]:+.1f}σ)<br>"
+    + "%{customdata[3]}<br>"
+    + "XMLIR %{customdata[4]}<br>"
+    + "LLM %{customdata[5]}<br>"
+    + "MExt %{customdata[6]}<br>"
+    + "MCore %{customdata[7]}"
+    + "<extra></extra>"
+)
+FLAG_COLORS = {True: '#c0392b', False: '#27ae60'}  # 退化 / 改善
+
+
+def _band_color(color, alpha=0.2):
+    color = color.lstrip('#')
+    r, g, b = (int(color[i : i + 2], 16) for i in (0, 2, 4))
+    return f"rgba({r},{g},{b},{alpha})"
+
+
+def _trace_type(n):
+    return 'scattergl' if n > WEBGL_THRESHOLD else 'scatter'
+
+
+def _y_range(*columns):
+    # 由数据决定 y 轴范围，不再写死；没有数据时交给 plotly 自动缩放
+    values = [c[np.isfinite(c)] for c in columns if len(c)]
+    values = [v for v in values if len(v)]
+    if not values:
+        return None
+    lo = min(float(v.min()) for v in values)
+    hi = max(float(v.max()) for v in values)
+    pad = (hi - lo) * Y_PADDING or abs(hi) * Y_PADDING or 1.0
+    return [lo - pad, hi + pad]
+
+
+def _band_traces(x, y_min, y_max, color):
+    # 长时间范围下数据按时间分桶，用每个桶的 min/max 围成阴影带
+    trace_type = _trace_type(len(x))
+    return [
+        {
+            'type': trace_type,
+            'x': x,
+            'y': y_max,
+            'mode': 'lines',
+            'line': {'width': 0},
+            'hoverinfo': 'skip',
+            'showlegend': False,
+        },
+        {
+            'type': trace_type,
+            'x': x,
+            'y': y_min,
+            'mode': 'lines',
+            'line': {'width': 0},
+            'fill': 'tonexty',
+            'fillcolor': _band_color(color),
+            'hoverinfo': 'skip',
+            'showlegend': False,
+        },
+    ]
+
+
+def _flag_trace(flags, field):
+    # 入库时检测出的变化点：退化用红色向下三角，改善用绿色向上三角
+    regression = is_regression(field, flags[f'{field}_score'])
     return {
-        'data': [
-            go.Scatter(
-                x=x,
-                y=y,
-                mode='lines+markers',
-                name=name,
-                line=dict(color=color),
-                hovertemplate="<b>Value</b>: %{y:.2f}<br>"
-                + "%{text}<br>"
-                + "<b>Date</b>: %{x}<br>"
-                + "<extra></extra>",
-                text=text,
-            )
-        ],
+        'type': 'scatter',
+        'x': flags.dates(TIME_ZONE),
+        'y': flags[field],
+        'mode': 'markers',
+        'name': 'change points',
+        'showlegend': False,
+        'marker': {
+            'size': 12,
+            'symbol': np.where(regression, 'triangle-down', 'triangle-up'),
+            'color': np.where(regression, FLAG_COLORS[True], FLAG_COLORS[False]),
+            'line': {'width': 1, 'color': 'white'},
+        },
+        'customdata': np.column_stack(
+            [
+                np.where(regression, 'regression', 'improvement'),
+                flags[f'{field}_baseline'],
+                flags[f'{field}_score'],
+                flags.hover_data(),
+            ]
+        ),
+        'hovertemplate': FLAG_HOVER_TEMPLATE,
+    }
+
+
+def create_scatter_figure(frame, field, name, color, y_range=None, flags=None):
+    # trace 直接用 dict 描述：go.Scatter 会校验并复制 numpy 数组，dict 则把列原样交给序列化。
+    # 渲染方式按点数选择，y_range 为空时按数据计算；flags 为检测出的变化点，画在最后一个 trace
+    x = frame.dates(TIME_ZONE)
+    y = frame[field]
+    traces = []
+    if frame.aggregated:
+        y_min, y_max = frame[f'{field}_min'], frame[f'{field}_max']
+        traces.extend(_band_traces(x, y_min, y_max, color))
+        customdata = np.column_stack([frame['count'], y_min, y_max])
+        hovertemplate = BAND_HOVER_TEMPLATE
+        columns = (y_min, y_max)
+    else:
+        customdata = frame.hover_data()
+        hovertemplate = HOVER_TEMPLATE
+        columns = (y,)
+    traces.append(
+        {
+            'type': _trace_type(len(frame)),
+            'x': x,
+            'y': y,
+            'mode': 'lines+markers' if len(frame) <= MARKER_THRESHOLD else 'lines',
+            'name': name,
+            'line': {'color': color},
+            'marker': {'size': 6},
+            'customdata': customdata,
+            'hovertemplate': hovertemplate,
+        }
+    )
+    if flags is not None:
+        traces.append(_flag_trace(flags, field))
+    return {
+        'data': traces,
         'layout': go.Layout(
             margin={'l': 40, 'b': 40, 't': 10, 'r': 10},
             hovermode='closest',
+            hoverlabel={'font': {'size': 11}},
             plot_bgcolor='white',
             paper_bgcolor='white',
-            yaxis=dict(range=y_range),
+            yaxis=dict(range=y_range or _y_range(*columns)),
         ),
     }
+
+
+@timed(BUILD_SECONDS, stage='figure')
+def series_store(frame, graphs, window, range=None, flags=None):
+    # 发给浏览器的列式数据：每张图整个窗口的 figure 及对应的毫秒时间戳。
+    # 日期范围落在 window 内时由 RANGE_FILTER_JS 在浏览器端切片，不再请求服务端；
+    # range 记录这份数据是为哪个日期范围加载的，避免浏览器反复请求同一范围；
+    # 变化点 trace 有自己的时间戳 marks
+    figures = {}
+    for id, (model, field, name, color) in graphs.items():
+        sub = frame.model(model)
+        marks = flags.model(model) if flags is not None else None
+        figures[id] = {
+            't': sub.ts,
+            'marks': marks.ts if marks is not None else None,
+            'figure': create_scatter_figure(sub, field, name, color, flags=marks),
+        }
+    return {
+        'ids': list(graphs),
+        'window': list(window),
+        'range': range,
+        'aggregated': frame.aggregated,
+        'stale': frame.stale or (flags is not None and flags.stale),
+        'options': {
+            'webgl': WEBGL_THRESHOLD,
+            'markers': MARKER_THRESHOLD,
+            'padding': Y_PADDING,
+            'raw_span': int(RAW_SPAN_LIMIT.total_seconds() * 1000),
+        },
+        'graphs': figures,
+    }
+
+
+@timed(BUILD_SECONDS, stage='patch')
+def extend_store(frame, graphs):
+    # 实时刷新：把新点追加到浏览器里已有的数据上（Patch 只发送增量），
+    # 再由 RANGE_FILTER_JS 在浏览器端重新生成图，整张图不经过网络
+    store = Patch()
+    for id, (model, field, _, _) in graphs.items():
+        sub = frame.model(model)
+        if not len(sub):
+            continue
+        trace = store['graphs'][id]['figure']['data'][0]
+        store['graphs'][id]['t'].extend(sub.ts.tolist())
+        trace['x'].extend(np.datetime_as_string(sub.dates(TIME_ZONE)).tolist())
+        trace['y'].extend(sub[field].tolist())
+        trace['customdata'].extend(sub.hover_data().tolist())
+    store['window'][1] = int(time.time() * 1000)
+    # 能查询到新数据说明 ES 已经恢复
+    store['stale'] = False
+    return store
+
+
+STALE_JS = """
+function(store) {
+    return Boolean(store && store.stale);
+}
+"""
+
+
+RANGE_FILTER_JS = """
+function(start, end, store) {
+    const noUpdate = window.dash_clientside.no_update;
+    const DAY = 86400000;
+    const MONTHS = {Jan: 0, Feb: 1, Mar: 2, Apr: 3, May: 4, Jun: 5,
+                    Jul: 6, Aug: 7, Sep: 8, Oct: 9, Nov: 10, Dec: 11};
+
+    // 与服务端一致：不带时区的日期按 UTC 解释，git 时间戳带时区偏移
+    function millis(value) {
+        let m = /^(\d{4})-(\d{2})-(\d{2})(?:[ T](\d{2}):(\d{2}):(\d{2}))?$/.exec(value || '');
+        if (m) {
+            return Date.UTC(+m[1], +m[2] - 1, +m[3], +(m[4] || 0), +(m[5] || 0), +(m[6] || 0));
+        }
+        m = /^\w{3} (\w{3}) +(\d{1,2}) (\d{2}):(\d{2}):(\d{2}) (\d{4}) ([+-])(\d{2})(\d{2})$/.exec(value || '');
+        if (m) {
+            const offset = (+m[8] * 60 + +m[9]) * 60000 * (m[7] === '-' ? -1 : 1);
+            return Date.UTC(+m[6], MONTHS[m[1]], +m[2], +m[3], +m[4], +m[5]) - offset;
+        }
+        return NaN;
+    }
+
+    function bisect(t, value, right) {
+        let lo = 0, hi = t.length;
+        while (lo < hi) {
+            const mid = (lo + hi) >> 1;
+            if (t[mid] < value || (right && t[mid] === value)) {
+                lo = mid + 1;
+            } else {
+                hi = mid;
+            }
+        }
+        return lo;
+    }
+
+    // 与服务端的 round_up 一致：纯日期的结束日期包含当天
+    const endDay = millis(end);
+    const lo = millis(start), hi = /^\d{4}-\d{2}-\d{2}$/.test(end || '') ? endDay + DAY - 1 : endDay;
+    const options = store.options;
+    const loaded = store.range && store.range[0] === start && store.range[1] === end;
+    // 结束日期是今天时范围包含到“现在”，实时刷新追加的点也在范围内；
+    // 这时窗口的结束时刻（快照时刻）即已知数据的边界，默认的结束时间总比它晚一点
+    const open = !(endDay + DAY <= Date.now());
+    const edge = open ? Math.min(hi, store.window[1]) : hi;
+    const inside = lo >= store.window[0] && edge <= store.window[1]
+        && !(store.aggregated && edge - lo <= options.raw_span);
+    if (!loaded && !inside) {
+        // 超出已加载的窗口（或需要从分桶数据回到原始点）时才请求服务端
+        return store.ids.map(() => noUpdate).concat([{start: start, end: end}, noUpdate]);
+    }
+
+    let last = null;
+    const figures = store.ids.map(function(id) {
+        const graph = store.graphs[id];
+        const t = graph.t;
+        const i = loaded ? 0 : bisect(t, lo, false);
+        const j = loaded || open ? t.length : bisect(t, hi, true);
+        const n = j - i;
+        if (t.length) {
+            last = Math.max(last === null ? t[t.length - 1] : last, t[t.length - 1]);
+        }
+        // 变化点 trace（最后一个）按自己的时间戳切片
+        const marked = graph.marks ? graph.figure.data.length - 1 : -1;
+        const marks = graph.marks || [];
+        const mi = loaded ? 0 : bisect(marks, lo, false);
+        const mj = loaded || open ? marks.length : bisect(marks, hi, true);
+
+        let yMin = Infinity, yMax = -Infinity;
+        const data = graph.figure.data.map(function(trace, index) {
+            const a = index === marked ? mi : i, b = index === marked ? mj : j;
+            const sliced = Object.assign({}, trace, {x: trace.x.slice(a, b), y: trace.y.slice(a, b)});
+            if (trace.customdata) {
+                sliced.customdata = trace.customdata.slice(a, b);
+            }
+            if (index === marked) {
+                sliced.marker = Object.assign({}, trace.marker);
+                for (const key of ['color', 'symbol']) {
+                    if (Array.isArray(trace.marker[key])) {
+                        sliced.marker[key] = trace.marker[key].slice(a, b);
+                    }
+                }
+            } else {
+                sliced.type = n > options.webgl ? 'scattergl' : 'scatter';
+                if (trace.hoverinfo !== 'skip') {
+                    sliced.mode = n > options.markers ? 'lines' : 'lines+markers';
+                }
+            }
+            for (const v of sliced.y) {
+                if (v !== null && v < yMin) yMin = v;
+                if (v !== null && v > yMax) yMax = v;
+            }
+            return sliced;
+        });
+
+        const layout = Object.assign({}, graph.figure.layout);
+        if (yMin <= yMax) {
+            const pad = (yMax - yMin) * options.padding || Math.abs(yMax) * options.padding || 1;
+            layout.yaxis = Object.assign({}, layout.yaxis, {range: [yMin - pad, yMax + pad]});
+        }
+        return {data: data, layout: layout};
+    });
+
+    const cursor = {live: !store.aggregated && open, ts: last === null ? store.window[1] : last};
+    return figures.concat([noUpdate, cursor]);
+}
+"""
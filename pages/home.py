@@ -2,17 +2,45 @@ import dash
 import dash_bootstrap_components as dbc
 from dash import Input, Output, State, clientside_callback, dcc, html
 
-from utils import get_or_connect_es, search_data
-
-from .common import create_scatter_figure, create_sidebar, create_time_card
+from utils import (
+    DATE_DECODER,
+    SNAPSHOT,
+    SeriesFrame,
+    load_series,
+    search_flags,
+    search_since,
+)
+from utils.metrics import LAYOUT_SECONDS, timed
+
+from .common import (
+    RANGE_FILTER_JS,
+    STALE_JS,
+    create_sidebar,
+    create_stale_alert,
+    create_time_card,
+    extend_store,
+    series_store,
+)
 
 dash.register_page(__name__, path='/', title='Accuracy Monitor', name='Accuracy Monitor')
 
 
+# 图 id -> (模型类型, 字段, 图例名称, 颜色)
+GRAPHS = {
+    'acc-dense-graph': ('Dense', 'acc', 'Llama3', '#e74c3c'),
+    'acc-moe-graph': ('MoE', 'acc', 'DeepSeek-V3', '#9b59b6'),
+}
+
+
+@timed(LAYOUT_SECONDS, page='home')
 def layout():
-    es = get_or_connect_es()
-    dense_date, moe_date, dense_meta, moe_meta, dense_acc, moe_acc, _, _ = search_data(es=es)
+    data = load_series()
+    window = SNAPSHOT.window()
+    return skeleton(series_store(data, GRAPHS, window, flags=SNAPSHOT.flags('acc')))
+
 
+def skeleton(store=None):
+    # 页面的组件结构；不传 store 时不含数据，main.py 用它组成 validation_layout
     banner = dbc.Row(
         [
             dbc.Col(
@@ -36,7 +64,10 @@ def layout():
     filters = dbc.Row(
         [
             dbc.Col(
-                [create_time_card("date-range-acc")],
+                [
+                    create_time_card("date-range-acc", live_id="live-acc"),
+                    create_stale_alert("stale-acc"),
+                ],
                 width=12,
             )
         ]
@@ -51,17 +82,7 @@ def layout():
                             dbc.CardBody(
                                 [
                                     html.H5("前十步loss均值", className="card-title"),
-                                    dcc.Graph(
-                                        id='acc-dense-graph',
-                                        figure=create_scatter_figure(
-                                            dense_date,
-                                            dense_acc,
-                                            name='Llama3',
-                                            color='#e74c3c',
-                                            text=dense_meta,
-                                            y_range=[0.5, 3],
-                                        ),
-                                    ),
+                                    dcc.Graph(id='acc-dense-graph'),
                                 ]
                             )
                         ],
@@ -79,17 +100,7 @@ def layout():
                             dbc.CardBody(
                                 [
                                     html.H5("前十步loss均值", className="card-title"),
-                                    dcc.Graph(
-                                        id='acc-moe-graph',
-                                        figure=create_scatter_figure(
-                                            moe_date,
-                                            moe_acc,
-                                            name='DeepSeek-V3',
-                                            color='#9b59b6',
-                                            text=moe_meta,
-                                            y_range=[5, 8],
-                                        ),
-                                    ),
+                                    dcc.Graph(id='acc-moe-graph'),
                                 ]
                             )
                         ]
@@ -110,6 +121,8 @@ def layout():
             [
                 dbc.Container(banner, fluid=True, className="mb-4"),
                 dbc.Container([filters, tabs], fluid="md"),
+                dcc.Store(id='data-acc', data=store),
+                dcc.Store(id='data-acc-request'),
             ],
             className='content',
         ),
@@ -118,30 +131,74 @@ def layout():
     return layout
 
 
+clientside_callback(
+    RANGE_FILTER_JS,
+    [
+        Output('acc-dense-graph', 'figure'),
+        Output('acc-moe-graph', 'figure'),
+        Output('data-acc-request', 'data'),
+        Output('live-acc-cursor', 'data'),
+    ],
+    [
+        Input('date-range-acc', 'start_date'),
+        Input('date-range-acc', 'end_date'),
+        Input('data-acc', 'data'),
+    ],
+)
+
+
 @dash.callback(
-    [Output('acc-dense-graph', 'figure'), Output('acc-moe-graph', 'figure')],
-    [Input('date-range-acc', 'start_date'), Input('date-range-acc', 'end_date')],
+    Output('data-acc', 'data'),
+    Input('data-acc-request', 'data'),
+    prevent_initial_call=True,
 )
-def update_graphs(start_date, end_date):
-    dense_date, moe_date, dense_meta, moe_meta, dense_acc, moe_acc = [], [], [], [], [], []
+def load_range(request):
+    # 日期范围超出浏览器里已有的数据时才会调用，返回新范围的完整数据
+    start_date, end_date = request['start'], request['end']
+    data = SeriesFrame.empty()
+    flags = None
+    window = (0, 0)
 
     if start_date and end_date:
-        es = get_or_connect_es()
-        dense_date, moe_date, dense_meta, moe_meta, dense_acc, moe_acc, _, _ = search_data(
-            start_date=start_date, end_date=end_date, es=es
-        )
-
-    # 更新Dense图表
-    dense_figure = create_scatter_figure(
-        dense_date, dense_acc, name='Llama3', color='#e74c3c', text=dense_meta, y_range=[0.5, 3]
-    )
+        data = load_series(start_date, end_date, fields=('acc',))
+        flags = search_flags(start_date, end_date, 'acc')
+        window = DATE_DECODER.bounds(start_date, end_date)
 
-    # 更新MoE图表
-    moe_figure = create_scatter_figure(
-        moe_date, moe_acc, name='DeepSeek-V3', color='#9b59b6', text=moe_meta, y_range=[5, 8]
-    )
+    return series_store(data, GRAPHS, window, range=[start_date, end_date], flags=flags)
 
-    return dense_figure, moe_figure
+
+@dash.callback(
+    Output('data-acc', 'data', allow_duplicate=True),
+    Input('live-acc-interval', 'n_intervals'),
+    State('live-acc-cursor', 'data'),
+    prevent_initial_call=True,
+)
+def append_new_points(n_intervals, cursor):
+    # 实时刷新：只查询客户端最后一个时间戳之后的新数据，以 Patch 追加到浏览器里的数据上
+    if not cursor or not cursor['live']:
+        return dash.no_update
+    data = search_since(cursor['ts'], fields=('acc',))
+    if not len(data):
+        return dash.no_update
+    return extend_store(data, GRAPHS)
+
+
+clientside_callback(
+    STALE_JS,
+    Output('stale-acc', 'is_open'),
+    Input('data-acc', 'data'),
+)
+
+
+clientside_callback(
+    """
+    function(on) {
+        return !on;
+    }
+    """,
+    Output('live-acc-interval', 'disabled'),
+    Input('live-acc', 'value'),
+)
 
 
 clientside_callback(
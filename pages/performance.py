@@ -1,21 +1,49 @@
 import dash
 import dash_bootstrap_components as dbc
-from dash import dcc, html
-from dash.dependencies import Input, Output
-
-from utils import get_or_connect_es, search_data
-
-from .common import create_scatter_figure, create_sidebar, create_time_card
+from dash import clientside_callback, dcc, html
+from dash.dependencies import Input, Output, State
+
+from utils import (
+    DATE_DECODER,
+    SNAPSHOT,
+    SeriesFrame,
+    load_series,
+    search_flags,
+    search_since,
+)
+from utils.metrics import LAYOUT_SECONDS, timed
+
+from .common import (
+    RANGE_FILTER_JS,
+    STALE_JS,
+    create_sidebar,
+    create_stale_alert,
+    create_time_card,
+    extend_store,
+    series_store,
+)
 
 dash.register_page(
     __name__, path='/performance', title='Performance Monitor', name='Performance Monitor'
 )
 
 
+# 图 id -> (模型类型, 字段, 图例名称, 颜色)
+GRAPHS = {
+    'perf-dense-graph': ('Dense', 'perf', 'Llama3', '#2ecc71'),
+    'perf-moe-graph': ('MoE', 'perf', 'DeepSeek-V3', '#3498db'),
+}
+
+
+@timed(LAYOUT_SECONDS, page='performance')
 def layout():
-    es = get_or_connect_es()
-    dense_date, moe_date, dense_meta, moe_meta, _, _, dense_perf, moe_perf = search_data(es=es)
+    data = load_series()
+    window = SNAPSHOT.window()
+    return skeleton(series_store(data, GRAPHS, window, flags=SNAPSHOT.flags('perf')))
 
+
+def skeleton(store=None):
+    # 页面的组件结构；不传 store 时不含数据，main.py 用它组成 validation_layout
     banner = dbc.Row(
         [
             dbc.Col(
@@ -39,7 +67,10 @@ def layout():
     filters = dbc.Row(
         [
             dbc.Col(
-                [create_time_card("date-range-perf")],
+                [
+                    create_time_card("date-range-perf", live_id="live-perf"),
+                    create_stale_alert("stale-perf"),
+                ],
                 width=12,
             )
         ]
@@ -54,17 +85,7 @@ def layout():
                             dbc.CardBody(
                                 [
                                     html.H5("训练吞吐", className="card-title"),
-                                    dcc.Graph(
-                                        id='perf-dense-graph',
-                                        figure=create_scatter_figure(
-                                            dense_date,
-                                            dense_perf,
-                                            name='Llama3',
-                                            color='#2ecc71',
-                                            text=dense_meta,
-                                            y_range=[285, 315],
-                                        ),
-                                    ),
+                                    dcc.Graph(id='perf-dense-graph'),
                                 ]
                             )
                         ],
@@ -82,17 +103,7 @@ def layout():
                             dbc.CardBody(
                                 [
                                     html.H5("训练吞吐", className="card-title"),
-                                    dcc.Graph(
-                                        id='perf-moe-graph',
-                                        figure=create_scatter_figure(
-                                            moe_date,
-                                            moe_perf,
-                                            name='DeepSeek-V3',
-                                            color='#3498db',
-                                            text=moe_meta,
-                                            y_range=[180, 220],
-                                        ),
-                                    ),
+                                    dcc.Graph(id='perf-moe-graph'),
                                 ]
                             )
                         ]
@@ -113,6 +124,8 @@ def layout():
             [
                 dbc.Container(banner, fluid=True, className="mb-4"),
                 dbc.Container([filters, tabs], fluid="md"),
+                dcc.Store(id='data-perf', data=store),
+                dcc.Store(id='data-perf-request'),
             ],
             className='content',
         ),
@@ -121,27 +134,71 @@ def layout():
     return layout
 
 
+clientside_callback(
+    RANGE_FILTER_JS,
+    [
+        Output('perf-dense-graph', 'figure'),
+        Output('perf-moe-graph', 'figure'),
+        Output('data-perf-request', 'data'),
+        Output('live-perf-cursor', 'data'),
+    ],
+    [
+        Input('date-range-perf', 'start_date'),
+        Input('date-range-perf', 'end_date'),
+        Input('data-perf', 'data'),
+    ],
+)
+
+
 @dash.callback(
-    [Output('perf-dense-graph', 'figure'), Output('perf-moe-graph', 'figure')],
-    [Input('date-range-perf', 'start_date'), Input('date-range-perf', 'end_date')],
+    Output('data-perf', 'data'),
+    Input('data-perf-request', 'data'),
+    prevent_initial_call=True,
 )
-def update_graphs(start_date, end_date):
-    dense_date, moe_date, dense_meta, moe_meta, dense_perf, moe_perf = [], [], [], [], [], []
+def load_range(request):
+    # 日期范围超出浏览器里已有的数据时才会调用，返回新范围的完整数据
+    start_date, end_date = request['start'], request['end']
+    data = SeriesFrame.empty()
+    flags = None
+    window = (0, 0)
 
     if start_date and end_date:
-        es = get_or_connect_es()
-        dense_date, moe_date, dense_meta, moe_meta, _, _, dense_perf, moe_perf = search_data(
-            start_date=start_date, end_date=end_date, es=es
-        )
-
-    # 更新Dense图表
-    dense_figure = create_scatter_figure(
-        dense_date, dense_perf, name='Llama3', color='#2ecc71', text=dense_meta, y_range=[285, 315]
-    )
+        data = load_series(start_date, end_date, fields=('perf',))
+        flags = search_flags(start_date, end_date, 'perf')
+        window = DATE_DECODER.bounds(start_date, end_date)
 
-    # 更新MoE图表
-    moe_figure = create_scatter_figure(
-        moe_date, moe_perf, name='DeepSeek-V3', color='#3498db', text=moe_meta, y_range=[180, 220]
-    )
+    return series_store(data, GRAPHS, window, range=[start_date, end_date], flags=flags)
+
+
+@dash.callback(
+    Output('data-perf', 'data', allow_duplicate=True),
+    Input('live-perf-interval', 'n_intervals'),
+    State('live-perf-cursor', 'data'),
+    prevent_initial_call=True,
+)
+def append_new_points(n_intervals, cursor):
+    # 实时刷新：只查询客户端最后一个时间戳之后的新数据，以 Patch 追加到浏览器里的数据上
+    if not cursor or not cursor['live']:
+        return dash.no_update
+    data = search_since(cursor['ts'], fields=('perf',))
+    if not len(data):
+        return dash.no_update
+    return extend_store(data, GRAPHS)
+
+
+clientside_callback(
+    STALE_JS,
+    Output('stale-perf', 'is_open'),
+    Input('data-perf', 'data'),
+)
 
-    return dense_figure, moe_figure
+
+clientside_callback(
+    """
+    function(on) {
+        return !on;
+    }
+    """,
+    Output('live-perf-interval', 'disabled'),
+    Input('live-perf', 'value'),
+)
@@ -1,3 +1,7 @@
 #!/usr/bin/env bash
 
-gunicorn --bind `hostname`:8052 --reload --log-level info --workers 1 --threads 8 --timeout 0 main:server
+# 预聚合索引定期增量更新（间隔见 utils/rollup.py 的 ROLLUP_INTERVAL），随服务一起退出
+python -m utils.rollup --every &
+trap "kill $!" EXIT
+
+gunicorn --config gunicorn.conf.py --bind `hostname`:8052 --reload --log-level info --workers 4 --threads 8 --timeout 30 --graceful-timeout 30 main:server
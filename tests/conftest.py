@@ -0,0 +1,66 @@
+import sys
+from pathlib import Path
+
+import pytest
+from flask import Flask
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from benchmarks.datasets import generate_columns  # noqa: E402
+from benchmarks.memory_es import MemoryES  # noqa: E402
+from utils import es_utils, export  # noqa: E402
+from utils.cache import RangeCache  # noqa: E402
+from utils.resilience import CircuitBreaker, LastGood  # noqa: E402
+from utils.shared_cache import SharedFrameCache  # noqa: E402
+
+# 固定的数据集结束时间（2025-01-01 00:00 +08:00），结果与运行测试的时间无关
+END_MS = 1_735_660_800_000
+DAY_MS = 86_400_000
+
+
+@pytest.fixture
+def columns():
+    return generate_columns(2_000, days=30, seed=0, end_ms=END_MS)
+
+
+@pytest.fixture
+def memory_es(columns):
+    return MemoryES(columns)
+
+
+@pytest.fixture
+def long_es():
+    # 超过 RAW_SPAN_LIMIT，查询走分桶聚合
+    return MemoryES(generate_columns(2_000, days=80, seed=0, end_ms=END_MS))
+
+
+@pytest.fixture(autouse=True)
+def fresh_state(monkeypatch, tmp_path):
+    # 每个测试使用自己的缓存、熔断器和共享缓存目录，互不影响
+    monkeypatch.setattr(es_utils, "RESULT_CACHE", RangeCache())
+    monkeypatch.setattr(es_utils, "SHARED_CACHE", SharedFrameCache(tmp_path / "shared"))
+    monkeypatch.setattr(es_utils, "ES_BREAKER", CircuitBreaker("Elasticsearch"))
+    monkeypatch.setattr(es_utils, "LAST_GOOD", LastGood())
+    monkeypatch.setattr(es_utils, "BACKEND", None)
+
+
+@pytest.fixture
+def use_es(monkeypatch):
+    # 让不传 es 的调用（例如 API 路由）使用给定的客户端
+    def use(es):
+        monkeypatch.setattr(es_utils, "get_or_connect_es", lambda: es)
+        monkeypatch.setattr(export, "get_or_connect_es", lambda: es)
+        return es
+
+    return use
+
+
+@pytest.fixture
+def client(memory_es, use_es):
+    from api import api, probes
+
+    use_es(memory_es)
+    app = Flask(__name__)
+    app.register_blueprint(api)
+    app.register_blueprint(probes)
+    return app.test_client()
@@ -0,0 +1,99 @@
+import json
+
+import numpy as np
+
+from benchmarks.memory_es import FaultyES, MemoryES
+from utils import DATE_DECODER
+from utils.commits import split_commit
+from utils.series import COMMIT_FIELDS
+
+
+def _runs_with(columns, prefix):
+    return sum(
+        any(split_commit(columns[field][i])[1].startswith(prefix) for field in COMMIT_FIELDS)
+        for i in range(len(columns["created_at"]))
+    )
+
+
+def test_commit_lookup(client, columns):
+    sha = split_commit(columns["llm_commit"][0])[1]
+    for prefix in (sha[:5], sha[:7], sha[:12]):
+        response = client.get(f"/api/commit/{prefix.upper()}")
+        assert response.status_code == 200
+        body = response.get_json()
+        assert body["prefix"] == prefix
+        assert body["count"] == _runs_with(columns, prefix) > 0
+        created = [run["created_at"] for run in body["runs"]]
+        assert created == sorted(created, reverse=True)
+        for run in body["runs"]:
+            assert run["matched"]
+            for field in run["matched"]:
+                assert split_commit(run[field])[1].startswith(prefix)
+
+
+def test_commit_bad_prefix(client):
+    assert client.get("/api/commit/xyz").status_code == 400
+    assert client.get("/api/commit/not-a-sha").status_code == 400
+
+
+def test_commit_es_down(client, memory_es, use_es):
+    use_es(FaultyES(memory_es, down=True))
+    response = client.get("/api/commit/abcdef1")
+    assert response.status_code == 502
+
+
+class _CorruptES(MemoryES):
+    # 第一个命中的 commit 字段不是 "branch@sha"，模拟索引中格式不对的旧文档
+    def search(self, **kwargs):
+        response = super().search(**kwargs)
+        hits = response["hits"]["hits"]
+        if hits:
+            hits[0]["_source"]["llm_commit"] = "no-sha"
+        return response
+
+
+def test_commit_skips_malformed_runs(client, columns, use_es):
+    use_es(_CorruptES(columns))
+    sha = split_commit(columns["llm_commit"][0])[1][:7]
+    response = client.get(f"/api/commit/{sha}")
+    assert response.status_code == 200
+    assert response.get_json()["count"] == _runs_with(columns, sha) - 1
+
+
+def test_commit_server_error(client, monkeypatch):
+    import api
+
+    def fail(prefix):
+        raise ValueError("bad stored data")
+
+    monkeypatch.setattr(api, "search_commit", fail)
+    assert client.get("/api/commit/abcdef1").status_code == 500
+
+
+def test_export_bad_dates(client):
+    for start, end in [("2024-13-01", "2024-07-01"), ("2024-01-01", "2024-02-30"), ("x", "y")]:
+        response = client.get(f"/api/export?start={start}&end={end}")
+        assert response.status_code == 400
+        assert "dates" in response.get_json()["error"]
+    assert client.get("/api/export?start=2024-07-01&end=2024-01-01").status_code == 400
+
+
+def test_export_ndjson(client, columns):
+    # 带时间的边界：MemoryES 不像 ES 那样把纯日期的 lte 取到当天结束
+    args = {"start": "2024-12-10 00:00:00", "end": "2024-12-20 00:00:00"}
+    response = client.get("/api/export", query_string=dict(args, fields="model_type,acc", gzip=0))
+    assert response.status_code == 200
+    rows = [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+    lo, hi = DATE_DECODER.bounds(args["start"], args["end"])
+    ts = columns["created_at"]
+    assert len(rows) == np.count_nonzero((ts >= lo) & (ts <= hi)) > 0
+    assert set(rows[0]) == {"created_at", "model_type", "acc"}
+    assert [row["created_at"] for row in rows] == sorted(row["created_at"] for row in rows)
+
+
+def test_probes(client):
+    assert client.get("/healthz").get_json()["status"] == "ok"
+    client.get("/api/commit/abcdef1")
+    response = client.get("/metrics")
+    assert response.status_code == 200
+    assert 'xmegatron_es_wall_seconds_count{query="commit"}' in response.get_data(as_text=True)
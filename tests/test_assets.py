@@ -0,0 +1,28 @@
+from utils import assets
+
+
+def test_vendored_files_match_integrity():
+    # 提交的副本与 CDN 上的同一个版本一致
+    checked = 0
+    for asset in assets.STYLESHEETS + assets.SCRIPTS + assets.FONTS:
+        path = assets.VENDOR_DIR / asset["path"]
+        if asset["integrity"] and path.exists():
+            assert assets._integrity(path.read_bytes()) == asset["integrity"], asset["path"]
+            checked += 1
+    assert checked
+
+
+def test_vendored_files_are_linked_locally():
+    hrefs = [sheet["href"] for sheet in assets.external_stylesheets()]
+    assert assets.VENDOR_URL + f"{assets.FONT_AWESOME}/css/font-awesome.min.css" in hrefs
+
+
+def test_vendored_files_are_cached_for_good():
+    import main
+
+    response = main.server.test_client().get(
+        assets.VENDOR_URL + f"{assets.FONT_AWESOME}/fonts/fontawesome-webfont.woff2"
+    )
+    assert response.status_code == 200
+    cache = response.cache_control
+    assert cache.immutable and cache.max_age >= 86400 and not cache.no_cache
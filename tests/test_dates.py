@@ -0,0 +1,21 @@
+from utils.dates import DateDecoder
+
+JAN_1 = 1_735_689_600_000
+
+
+def test_to_millis_invalid_iso_date():
+    decoder = DateDecoder()
+    millis = decoder.to_millis(["2025-02-30", "2025-01-01", "2025-01-01 25:00:00"])
+    assert millis.tolist() == [-1, JAN_1, -1]
+
+
+def test_to_millis_mixed_formats():
+    decoder = DateDecoder()
+    values = ["Wed Jan 1 08:00:00 2025 +0800", "2025-02-30", "2025-01-01 00:00:00", "x"]
+    assert decoder.to_millis(values).tolist() == [JAN_1, -1, JAN_1, -1]
+
+
+def test_bounds_invalid_end():
+    decoder = DateDecoder()
+    assert decoder.bounds("2025-01-01", "2025-02-30") == (JAN_1, -1)
+    assert decoder.bounds("2025-01-01", "2025-01-01") == (JAN_1, JAN_1 + 86_400_000 - 1)
@@ -0,0 +1,106 @@
+import json
+import threading
+import time
+from types import SimpleNamespace
+
+import numpy as np
+from elasticsearch import Elasticsearch
+
+from utils.ingest import generate_actions, ingest, read_records
+from utils.regression import RegressionDetector
+from utils.series import COMMIT_FIELDS
+
+# acc 从第 98 条起变差 2.5 个标准差，每批 100 条时变化起点在第一批、报警在第二批
+SHIFT_AT = 98
+CHUNK = 100
+START_MS = 1_700_000_000_000
+
+
+def _records(n=200, shift_at=SHIFT_AT):
+    rnd = np.random.default_rng(0)
+    for i in range(n):
+        yield {
+            "created_at": START_MS + i * 60_000,
+            "trigger_repo": "XPytorch",
+            "model_type": "Dense",
+            "acc": 1.0 + rnd.normal(0, 0.01) + (0.025 if i >= shift_at else 0.0),
+            "perf": 100.0 + rnd.normal(0, 1),
+            **{field: f"main@{i:040x}" for field in COMMIT_FIELDS},
+        }
+
+
+class _BulkES:
+    # 按请求到达的顺序执行 bulk 中的 index/update；与 ES 一样，更新不存在的文档返回 404。
+    # 第一个 bulk 请求延迟 delay_first 秒，使 parallel_bulk 的后续分块先于它到达
+    def __init__(self, delay_first=0.0):
+        self.docs = {}
+        self.delay_first = delay_first
+        self.calls = 0
+        self._lock = threading.Lock()
+        # bulk 辅助函数用到客户端的序列化器和 tracing，借用一个不会发出请求的真实客户端
+        client = Elasticsearch("http://localhost:9200")
+        self.transport = client.transport
+        self._otel = client._otel
+
+    def options(self, **kwargs):
+        return self
+
+    def search(self, **kwargs):
+        return {"hits": {"hits": []}}
+
+    def bulk(self, operations, **kwargs):
+        with self._lock:
+            self.calls += 1
+            first = self.calls == 1
+        if first:
+            time.sleep(self.delay_first)
+        lines = [json.loads(line) for line in operations]
+        items = []
+        with self._lock:
+            for action, body in zip(lines[::2], lines[1::2]):
+                op, meta = next(iter(action.items()))
+                _id = meta["_id"]
+                if op == "index":
+                    self.docs[_id] = body
+                    items.append({op: {"_id": _id, "status": 201}})
+                elif _id in self.docs:
+                    self.docs[_id].update(body["doc"])
+                    items.append({op: {"_id": _id, "status": 200}})
+                else:
+                    error = {"type": "document_missing_exception"}
+                    items.append({op: {"_id": _id, "status": 404, "error": error}})
+        errors = any(item[next(iter(item))]["status"] >= 300 for item in items)
+        return SimpleNamespace(body={"errors": errors, "items": items})
+
+
+def test_earlier_chunk_updates_are_deferred():
+    stats = {"indexed": 0, "rejected": 0, "invalid": 0, "flagged": 0}
+    deferred = []
+    actions = list(
+        generate_actions(
+            _records(), "i", stats, RegressionDetector(), batch_size=CHUNK, deferred=deferred
+        )
+    )
+    assert {action["_op_type"] for action in actions} == {"index"}
+    assert [action["_op_type"] for action in deferred] == ["update"]
+
+
+def test_parallel_ingest_keeps_earlier_chunk_verdicts():
+    es = _BulkES(delay_first=0.2)
+    stats = ingest(es, _records(), index_name="i", chunk_size=CHUNK, workers=2)
+    assert stats["rejected"] == 0
+    flagged = [doc for doc in es.docs.values() if doc.get("acc_verdict") == "regression"]
+    assert len(flagged) == 1
+    assert flagged[0]["created_at"] < START_MS + CHUNK * 60_000
+    assert len(es.docs) == 200
+
+
+def test_bad_jsonl_line_counts_as_invalid(tmp_path):
+    path = tmp_path / "runs.jsonl"
+    records = list(_records(3))
+    lines = [json.dumps(records[0]), "{not json", "[1, 2]", json.dumps(records[1])]
+    path.write_text("\n".join(lines) + "\n")
+    stats = {"indexed": 0, "rejected": 0, "invalid": 0, "flagged": 0}
+    actions = list(generate_actions(read_records(str(path)), "i", stats))
+    assert stats["invalid"] == 2
+    assert len(actions) == 2
@@ -0,0 +1,47 @@
+import time
+from types import SimpleNamespace
+
+import pytest
+
+from utils import local_store
+
+
+class _Stop(BaseException):
+    pass
+
+
+class _ES:
+    def close(self):
+        pass
+
+
+def test_sync_every_survives_errors(monkeypatch, tmp_path, capsys):
+    results = iter(
+        [
+            RuntimeError("transient"),
+            {"synced": 2, "skipped": 0, "checkpoint": 1, "full": False},
+        ]
+    )
+
+    def sync(self, es, index_name, full=False):
+        result = next(results)
+        if isinstance(result, Exception):
+            raise result
+        return result
+
+    sleeps = []
+
+    def sleep(seconds):
+        sleeps.append(seconds)
+        if len(sleeps) == 2:
+            raise _Stop
+
+    monkeypatch.setattr(local_store, "connect_es", _ES)
+    monkeypatch.setattr(local_store.LocalStore, "sync", sync)
+    clock = SimpleNamespace(time=time.time, perf_counter=time.perf_counter, sleep=sleep)
+    monkeypatch.setattr(local_store, "time", clock)
+    path = tmp_path / "local.db"
+    monkeypatch.setattr("sys.argv", ["local_store", "--path", str(path), "--every", "1"])
+    with pytest.raises(_Stop):
+        local_store.main()
+    assert "Done: 2 synced" in capsys.readouterr().out
@@ -0,0 +1,91 @@
+import time
+
+import pytest
+
+from benchmarks.memory_es import FaultyES
+from utils import es_utils
+from utils.resilience import CircuitBreaker, CircuitOpen, DeadlineExceeded, deadline, time_left
+
+RESET = 0.05
+
+
+def _search(faults):
+    return es_utils.search_data(
+        "2024-12-01", "2024-12-31", es=faults, use_cache=False, fields=("acc",)
+    )
+
+
+def test_breaker_open_half_open_cycle(memory_es, monkeypatch):
+    breaker = CircuitBreaker("Elasticsearch", failures=2, reset_after=RESET)
+    monkeypatch.setattr(es_utils, "ES_BREAKER", breaker)
+    faults = FaultyES(memory_es, down=True)
+
+    for _ in range(2):
+        assert not len(_search(faults))
+    assert breaker.state == "open"
+    # 打开后直接失败，不再访问 ES
+    assert not len(_search(faults))
+    assert faults.requests == 2
+    assert breaker.stats()["rejected"] == 1
+
+    # 试探请求失败：重新打开
+    time.sleep(RESET)
+    _search(faults)
+    assert faults.requests == 3
+    assert breaker.state == "open"
+    _search(faults)
+    assert faults.requests == 3
+
+    # 试探请求成功：关闭
+    faults.down = False
+    time.sleep(RESET)
+    assert len(_search(faults))
+    assert breaker.state == "closed"
+    assert breaker.stats()["opened"] == 2
+
+
+def test_half_open_allows_one_trial():
+    breaker = CircuitBreaker("test", failures=1, reset_after=RESET)
+    breaker.failure(DeadlineExceeded())
+    time.sleep(RESET)
+    breaker.before_call()
+    assert breaker.state == "half_open"
+    with pytest.raises(CircuitOpen):
+        breaker.before_call()
+
+
+def test_deadline_expiry():
+    with deadline(0.01):
+        with deadline(10):
+            # 内层不能延长外层的截止时间
+            assert time_left() <= 0.01
+        time.sleep(0.02)
+        with pytest.raises(DeadlineExceeded):
+            time_left()
+    assert time_left() is None
+
+
+def test_deadline_cuts_slow_search(memory_es):
+    faults = FaultyES(memory_es, latency=1.0)
+    start = time.perf_counter()
+    with deadline(0.05):
+        frame = _search(faults)
+    assert time.perf_counter() - start < 0.5
+    assert not len(frame)
+    assert es_utils.ES_BREAKER.stats()["consecutive_failures"] == 1
+
+
+def test_last_good_served_when_down(long_es):
+    # 分桶聚合失败时返回上一次成功的结果
+    faults = FaultyES(long_es)
+    fresh = es_utils.search_data("2024-10-15", "2024-12-31", es=faults, fields=("acc",))
+    assert fresh.aggregated and len(fresh) and not fresh.stale
+
+    faults.down = True
+    stale = es_utils.search_data("2024-10-15", "2024-12-31", es=faults, fields=("acc",))
+    assert stale.stale
+    assert stale.ts is fresh.ts and stale["acc"] is fresh["acc"]
+
+    # 没有成功结果的范围返回空
+    empty = es_utils.search_data("2024-10-16", "2024-12-31", es=faults, fields=("acc",))
+    assert not len(empty) and not empty.stale
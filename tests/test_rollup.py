@@ -0,0 +1,68 @@
+import time
+from types import SimpleNamespace
+
+import pytest
+
+from utils import rollup
+
+
+class _Stop(BaseException):
+    pass
+
+
+class _ES:
+    def __init__(self):
+        self.closed = False
+
+    def close(self):
+        self.closed = True
+
+
+def test_every_survives_es_errors(monkeypatch, capsys):
+    # 启动时 ES 不可用、之后一次更新失败：都不退出，下一轮重新连接后继续
+    clients = []
+    connects = iter([ConnectionError("down"), None, None])
+
+    def connect_es():
+        error = next(connects)
+        if error is not None:
+            raise error
+        clients.append(_ES())
+        return clients[-1]
+
+    results = iter([RuntimeError("transient"), {"rollup_docs": 3, "checkpoint": 1, "full": False}])
+
+    def update_rollup(es, index_name, rollup_index, full=False):
+        result = next(results)
+        if isinstance(result, Exception):
+            raise result
+        return result
+
+    sleeps = []
+
+    def sleep(seconds):
+        sleeps.append(seconds)
+        if len(sleeps) == 3:
+            raise _Stop
+
+    monkeypatch.setattr(rollup, "connect_es", connect_es)
+    monkeypatch.setattr(rollup, "update_rollup", update_rollup)
+    # 只替换 rollup 模块看到的 time，不影响其他线程
+    clock = SimpleNamespace(time=time.time, perf_counter=time.perf_counter, sleep=sleep)
+    monkeypatch.setattr(rollup, "time", clock)
+    monkeypatch.setattr("sys.argv", ["rollup", "--every", "1"])
+    with pytest.raises(_Stop):
+        rollup.main()
+    assert sleeps == [1, 1, 1]
+    assert [es.closed for es in clients] == [True, True]
+    assert "Done: 3 rollup docs written" in capsys.readouterr().out
+
+
+def test_single_run_still_fails(monkeypatch):
+    def connect_es():
+        raise ConnectionError("down")
+
+    monkeypatch.setattr(rollup, "connect_es", connect_es)
+    monkeypatch.setattr("sys.argv", ["rollup"])
+    with pytest.raises(ConnectionError):
+        rollup.main()
@@ -0,0 +1,62 @@
+import numpy as np
+
+from benchmarks.bench_concurrent import _same
+from benchmarks.memory_es import AsyncMemoryES, MemoryES
+from utils import DATE_DECODER, es_utils
+from utils.cache import RangeCache
+from utils.es_utils import _build_frame, scan_hits, search_concurrently
+
+FIELDS = ("acc", "perf")
+
+
+class _RangeES(MemoryES):
+    # 记录每次查询的时间范围（只记分页的第一页）
+    def __init__(self, columns):
+        super().__init__(columns)
+        self.ranges = []
+
+    def search(self, index=None, body=None, filter_path=None, **kwargs):
+        request = dict(body or {}, **kwargs)
+        if "search_after" not in request:
+            bounds = request["query"]["range"]["created_at"]
+            self.ranges.append((bounds["gte"], bounds["lte"]))
+        return super().search(index=index, body=body, filter_path=filter_path, **kwargs)
+
+
+def test_concurrent_matches_sequential(memory_es, columns):
+    lo, hi = int(columns["created_at"][0]), int(columns["created_at"][-1])
+    sequential = _build_frame(scan_hits(memory_es, lo, hi, fields=FIELDS), FIELDS)
+    concurrent = search_concurrently(lo, hi, fields=FIELDS, es=AsyncMemoryES(memory_es))
+    assert len(concurrent) == len(sequential) == len(columns["created_at"])
+    assert _same(sequential, concurrent, FIELDS)
+
+
+def test_range_cache_fetches_delta():
+    cache = RangeCache()
+    calls = []
+
+    def fetch(lo, hi):
+        calls.append((lo, hi))
+        return _build_frame([], FIELDS)
+
+    cache.get("index", 100, 200, fetch)
+    cache.get("index", 150, 300, fetch)
+    cache.get("index", 50, 300, fetch)
+    cache.get("index", 120, 280, fetch)
+    assert calls == [(100, 200), (201, 300), (50, 99)]
+    assert cache.stats()["hits"] == 1
+
+
+def test_search_data_fetches_delta(columns):
+    es = _RangeES(columns)
+    first = DATE_DECODER.bounds("2024-12-05", "2024-12-20")
+    second = DATE_DECODER.bounds("2024-12-10", "2024-12-25")
+    es_utils.search_data("2024-12-05", "2024-12-20", es=es, fields=FIELDS)
+    frame = es_utils.search_data("2024-12-10", "2024-12-25", es=es, fields=FIELDS)
+    assert es.ranges == [first, (first[1] + 1, second[1])]
+    ts = columns["created_at"]
+    assert len(frame) == np.count_nonzero((ts >= second[0]) & (ts <= second[1])) > 0
+
+    # 完全覆盖的范围不再查询
+    es_utils.search_data("2024-12-06", "2024-12-24", es=es, fields=FIELDS)
+    assert len(es.ranges) == 2
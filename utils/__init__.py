@@ -1,3 +1,40 @@
-from .es_utils import DATE_FMT, INDEX_NAME, TIME_ZONE, get_or_connect_es, search_data
+from .es_utils import (
+    DATE_DECODER,
+    DATE_FMT,
+    INDEX_NAME,
+    RAW_SPAN_LIMIT,
+    TIME_ZONE,
+    cache_stats,
+    es_pool_stats,
+    get_or_connect_es,
+    is_regression,
+    search_commit,
+    search_data,
+    search_flags,
+    search_rollup,
+    search_since,
+    set_backend,
+)
+from .series import SeriesFrame
+from .snapshot import SNAPSHOT, load_series
 
-__all__ = ["DATE_FMT", "INDEX_NAME", "TIME_ZONE", "get_or_connect_es", "search_data"]
+__all__ = [
+    "DATE_DECODER",
+    "DATE_FMT",
+    "INDEX_NAME",
+    "RAW_SPAN_LIMIT",
+    "SNAPSHOT",
+    "SeriesFrame",
+    "TIME_ZONE",
+    "cache_stats",
+    "es_pool_stats",
+    "get_or_connect_es",
+    "is_regression",
+    "load_series",
+    "search_commit",
+    "search_data",
+    "search_flags",
+    "search_rollup",
+    "search_since",
+    "set_backend",
+]
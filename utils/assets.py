@@ -0,0 +1,113 @@
+import argparse
+import base64
+import hashlib
+import urllib.request
+from pathlib import Path
+
+# 第三方静态资源提交在 static/vendor/<名称-版本>/ 下，由 Flask 的 /static 路由提供；
+# 目录名带版本号，内容不会变化，可以长期缓存。文件缺失时才退回 CDN
+STATIC_DIR = Path(__file__).resolve().parent.parent / "static"
+VENDOR_DIR = STATIC_DIR / "vendor"
+VENDOR_URL = "/static/vendor/"
+# Dash 会按文件名顺序自动引入 assets_folder 中的所有 css/js，第三方的 .min 文件需要排除，
+# 改为通过 external_stylesheets/external_scripts 按顺序引入，保证 style.css 在 Bootstrap 之后生效
+ASSETS_IGNORE = r"\.min\.(css|js)$"
+
+BOOTSTRAP = "bootstrap-5.3.1"
+FONT_AWESOME = "font-awesome-4.7.0"
+_BOOTSTRAP_CDN = "https://cdn.jsdelivr.net/npm/bootstrap@5.3.1/dist"
+_FONT_AWESOME_CDN = "https://stackpath.bootstrapcdn.com/font-awesome/4.7.0"
+
+STYLESHEETS = [
+    {
+        "path": f"{BOOTSTRAP}/css/bootstrap.min.css",
+        "url": f"{_BOOTSTRAP_CDN}/css/bootstrap.min.css",
+        "integrity": "sha384-4bw+/aepP/YC94hEpVNVgiZdgIC5+VKNBQNGCHeKRQN+PtmoHDEXuppvnDJzQIu9",
+    },
+    {
+        "path": f"{FONT_AWESOME}/css/font-awesome.min.css",
+        "url": f"{_FONT_AWESOME_CDN}/css/font-awesome.min.css",
+        "integrity": "sha384-wvfXpqpZZVQGK6TAh5PVlGOfQNHSoD2xbE+QkPxCAFlNEevoEH3Sl0sibVcOQVnN",
+    },
+]
+# dash_bootstrap_components 的组件自己实现交互，不需要 Bootstrap 的 JS
+SCRIPTS = []
+# font-awesome.min.css 通过 ../fonts/ 相对路径引用字体文件
+FONTS = [
+    {
+        "path": f"{FONT_AWESOME}/fonts/fontawesome-webfont.{ext}",
+        "url": f"{_FONT_AWESOME_CDN}/fonts/fontawesome-webfont.{ext}",
+        "integrity": None,
+    }
+    for ext in ("eot", "svg", "ttf", "woff", "woff2")
+]
+
+
+def _integrity(data):
+    return "sha384-" + base64.b64encode(hashlib.sha384(data).digest()).decode()
+
+
+def _tag(asset, attr):
+    if (VENDOR_DIR / asset["path"]).exists():
+        return {attr: VENDOR_URL + asset["path"]}
+    tag = {attr: asset["url"]}
+    if asset["integrity"]:
+        tag.update({"integrity": asset["integrity"], "crossorigin": "anonymous"})
+    return tag
+
+
+def external_stylesheets():
+    return [dict(_tag(asset, "href"), rel="stylesheet") for asset in STYLESHEETS]
+
+
+def external_scripts():
+    return [_tag(asset, "src") for asset in SCRIPTS]
+
+
+def _source(asset, mirror):
+    if mirror is None:
+        return asset["url"]
+    if "://" in mirror:
+        return mirror.rstrip("/") + "/" + asset["path"]
+    return Path(mirror) / asset["path"]
+
+
+def _read(source, timeout):
+    if isinstance(source, Path):
+        return source.read_bytes()
+    with urllib.request.urlopen(source, timeout=timeout) as response:
+        return response.read()
+
+
+def fetch_assets(force=False, timeout=30, mirror=None):
+    # 下载到 static/vendor/，有 integrity 的资源下载后校验（镜像中的文件同样校验）
+    stats = {"fetched": 0, "skipped": 0}
+    for asset in STYLESHEETS + SCRIPTS + FONTS:
+        target = VENDOR_DIR / asset["path"]
+        if target.exists() and not force:
+            stats["skipped"] += 1
+            continue
+        source = _source(asset, mirror)
+        data = _read(source, timeout)
+        if asset["integrity"] and _integrity(data) != asset["integrity"]:
+            raise ValueError(f"integrity mismatch: {source}")
+        target.parent.mkdir(parents=True, exist_ok=True)
+        target.write_bytes(data)
+        stats["fetched"] += 1
+        print(f"{source} -> {target.relative_to(STATIC_DIR)} ({len(data)} bytes)")
+    return stats
+
+
+def main():
+    # 升级版本或补齐缺失的文件时运行，下载的文件需要提交
+    parser = argparse.ArgumentParser(description="Download third-party assets into static/vendor.")
+    parser.add_argument("--force", action="store_true", help="download again even if present")
+    parser.add_argument("--mirror", help="URL or directory laid out like static/vendor")
+    args = parser.parse_args()
+
+    stats = fetch_assets(force=args.force, mirror=args.mirror)
+    print(f"Done: {stats['fetched']} fetched, {stats['skipped']} already present")
+
+
+if __name__ == "__main__":
+    main()
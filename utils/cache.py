@@ -0,0 +1,161 @@
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+from .series import SeriesFrame
+
+
+class _Segment:
+    __slots__ = ("lo", "hi", "frame", "fetched_at")
+
+    def __init__(self, lo, hi, frame, fetched_at):
+        self.lo = lo
+        self.hi = hi
+        self.frame = frame
+        self.fetched_at = fetched_at
+
+
+class RangeCache:
+    # 按 key（通常是索引名）缓存已经拉取过的时间区间 [lo, hi]（毫秒时间戳，闭区间）及其
+    # SeriesFrame，新的查询只向 ES 请求尚未覆盖的子区间。
+    def __init__(self, max_rows=500_000, edge_ttl=60.0, edge_window=6 * 3600 * 1000):
+        self.max_rows = max_rows
+        # 贴近“当前时间”的区间尾部可能还有迟到的 CI 结果，超过 edge_ttl 秒后丢弃重新拉取
+        self.edge_ttl = edge_ttl
+        self.edge_window = edge_window
+        self._segments = OrderedDict()
+        self._next_id = 0
+        self._rows = 0
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "partial_hits": 0, "misses": 0, "evictions": 0, "stale": 0}
+
+    def get(self, key, lo, hi, fetch, stale_ok=False):
+        # stale_ok: fetch 失败时，如果缓存中（包括已过期的区间尾部）有这段范围的数据，
+        # 返回这些旧数据（frame.stale 为 True）而不是抛出异常
+        now = time.time()
+        with self._lock:
+            # 过期裁剪前各区间的 frame；裁剪会替换 segment.frame 而不是原地修改，这里只保留引用
+            previous = [
+                _Segment(segment.lo, segment.hi, segment.frame, segment.fetched_at)
+                for seg_key, segment in self._segments.values()
+                if seg_key == key and segment.lo <= hi and segment.hi >= lo
+            ]
+            segments = self._lookup(key, lo, hi, now)
+            missing = self._missing(segments, lo, hi)
+            if not missing:
+                self._stats["hits"] += 1
+                return self._slice(segments, lo, hi)
+            if len(missing) == 1 and missing[0] == (lo, hi):
+                self._stats["misses"] += 1
+            else:
+                self._stats["partial_hits"] += 1
+
+        # fetch 在锁外执行，避免慢查询阻塞其他线程读取缓存
+        try:
+            fetched = [fetch(sub_lo, sub_hi) for sub_lo, sub_hi in missing]
+        except Exception:
+            if not stale_ok or not previous:
+                raise
+            previous.sort(key=lambda segment: segment.lo)
+            with self._lock:
+                self._stats["stale"] += 1
+                # 放回过期裁剪掉的数据（保留原来的拉取时刻），ES 恢复之前的请求仍然可以使用
+                for segment in previous:
+                    self._merge(key, segment.lo, segment.hi, [segment.frame], segment.fetched_at)
+                self._evict()
+            return self._slice(previous, lo, hi).as_stale()
+
+        with self._lock:
+            segment = self._merge(key, lo, hi, fetched, now)
+            frame = self._slice([segment], lo, hi)
+            self._evict()
+        return frame
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats["segments"] = len(self._segments)
+            stats["rows"] = self._rows
+        total = stats["hits"] + stats["partial_hits"] + stats["misses"]
+        stats["hit_rate"] = stats["hits"] / total if total else 0.0
+        return stats
+
+    def clear(self):
+        with self._lock:
+            self._segments.clear()
+            self._rows = 0
+
+    def _lookup(self, key, lo, hi, now):
+        segments = []
+        for seg_id, (seg_key, segment) in list(self._segments.items()):
+            if seg_key != key:
+                continue
+            self._expire_edge(seg_id, segment, now)
+            if seg_id in self._segments and segment.lo <= hi and segment.hi >= lo:
+                self._segments.move_to_end(seg_id)
+                segments.append(segment)
+        segments.sort(key=lambda segment: segment.lo)
+        return segments
+
+    def _expire_edge(self, seg_id, segment, now):
+        edge = int(segment.fetched_at * 1000) - self.edge_window
+        if segment.hi <= edge or now - segment.fetched_at <= self.edge_ttl:
+            return
+        self._rows -= len(segment.frame)
+        if edge < segment.lo:
+            del self._segments[seg_id]
+            return
+        segment.frame = segment.frame.between(segment.lo, edge)
+        segment.hi = edge
+        self._rows += len(segment.frame)
+
+    @staticmethod
+    def _missing(segments, lo, hi):
+        missing = []
+        cursor = lo
+        for segment in segments:
+            if segment.lo > cursor:
+                missing.append((cursor, segment.lo - 1))
+            cursor = max(cursor, segment.hi + 1)
+            if cursor > hi:
+                break
+        if cursor <= hi:
+            missing.append((cursor, hi))
+        return missing
+
+    def _merge(self, key, lo, hi, fetched, now):
+        # 与 [lo, hi] 重叠或相邻的旧区间全部并入一个新区间
+        merged = []
+        for seg_id, (seg_key, segment) in list(self._segments.items()):
+            if seg_key == key and segment.lo <= hi + 1 and segment.hi >= lo - 1:
+                merged.append(segment)
+                self._rows -= len(segment.frame)
+                del self._segments[seg_id]
+        frames = []
+        for frame in fetched:
+            # 并发线程可能已经写入了同一子区间，这部分以已缓存的数据为准
+            keep = np.ones(len(frame), dtype=bool)
+            for segment in merged:
+                keep &= (frame.ts < segment.lo) | (frame.ts > segment.hi)
+            frames.append(frame if keep.all() else frame.take(keep))
+        for segment in merged:
+            lo, hi = min(lo, segment.lo), max(hi, segment.hi)
+            frames.append(segment.frame)
+        segment = _Segment(lo, hi, SeriesFrame.concat(frames), now)
+        self._segments[self._next_id] = (key, segment)
+        self._next_id += 1
+        self._rows += len(segment.frame)
+        return segment
+
+    @staticmethod
+    def _slice(segments, lo, hi):
+        return SeriesFrame.concat([segment.frame.between(lo, hi) for segment in segments])
+
+    def _evict(self):
+        # 最近最少使用的区间先淘汰，至少保留刚写入的那一个
+        while self._rows > self.max_rows and len(self._segments) > 1:
+            _, (_, segment) = self._segments.popitem(last=False)
+            self._rows -= len(segment.frame)
+            self._stats["evictions"] += 1
@@ -0,0 +1,130 @@
+import argparse
+import re
+import time
+from functools import lru_cache
+
+from .init_es import INDEX_NAME, connect_es
+from .series import COMMIT_FIELDS
+
+SHORT_SHA_LEN = 7
+MIN_PREFIX_LEN = 4
+COMMIT_CACHE_SIZE = 65536
+_PREFIX_RE = re.compile(r"^[0-9a-f]+$")
+
+# 显式保存 "{field}_branch"/"{field}_sha"，以及四个 commit 字段合并后的 commit_sha/commit_short，
+# 查询某个 sha 时只需对一个 keyword 字段做 term 查询，不再在四个 "branch@sha" 字段上做通配
+COMMIT_SHA = "commit_sha"
+COMMIT_SHORT = "commit_short"
+
+# 已有文档补齐上述字段，逻辑与 commit_fields() 相同
+_BACKFILL_SCRIPT = """
+List shas = new ArrayList();
+List shorts = new ArrayList();
+for (String field : params.fields) {
+    def value = ctx._source[field];
+    if (value == null) { continue; }
+    int at = value.indexOf('@');
+    String sha = value.substring(at + 1).toLowerCase();
+    ctx._source[field + '_branch'] = value.substring(0, Math.max(at, 0));
+    ctx._source[field + '_sha'] = sha;
+    shas.add(sha);
+    shorts.add(sha.length() > params.short_len ? sha.substring(0, params.short_len) : sha);
+}
+ctx._source.commit_sha = shas;
+ctx._source.commit_short = shorts;
+"""
+
+
+def split_commit(commit):
+    # commit 字段的格式为 "branch@sha"
+    data = commit.split("@")
+    if len(data) != 2:
+        raise ValueError(f"bad commit: {commit}")
+    return data[0], data[1]
+
+
+@lru_cache(maxsize=COMMIT_CACHE_SIZE)
+def format_commit(commit):
+    # 图上显示为 "branch@短 sha"；同一个 commit 会出现在很多次查询里，跨请求缓存，每个不同的值只拆分一次
+    branch, cid = split_commit(commit)
+    return f"{branch}@{cid[:SHORT_SHA_LEN]}"
+
+
+def commit_fields(doc):
+    # 入库时预先计算，sha 统一为小写
+    fields = {}
+    shas = []
+    for field in COMMIT_FIELDS:
+        branch, sha = split_commit(doc[field])
+        sha = sha.lower()
+        fields[f"{field}_branch"] = branch
+        fields[f"{field}_sha"] = sha
+        shas.append(sha)
+    fields[COMMIT_SHA] = shas
+    fields[COMMIT_SHORT] = [sha[:SHORT_SHA_LEN] for sha in shas]
+    return fields
+
+
+def commit_mapping(fields=COMMIT_FIELDS):
+    properties = {COMMIT_SHA: {"type": "keyword"}, COMMIT_SHORT: {"type": "keyword"}}
+    for field in fields:
+        properties[f"{field}_branch"] = {"type": "keyword"}
+        properties[f"{field}_sha"] = {"type": "keyword"}
+    return properties
+
+
+def normalize_prefix(prefix):
+    # 返回小写的 sha 前缀；太短或不是十六进制时返回 None
+    prefix = prefix.strip().lower()
+    if len(prefix) < MIN_PREFIX_LEN or not _PREFIX_RE.match(prefix):
+        return None
+    return prefix
+
+
+def commit_query(prefix):
+    # 不短于 SHORT_SHA_LEN 的前缀先用 commit_short 上的 term 精确缩小范围，
+    # 更长的部分再在这些文档上用 prefix 校验；更短的前缀直接对 commit_short 做 prefix 查询
+    if len(prefix) < SHORT_SHA_LEN:
+        return {"prefix": {COMMIT_SHORT: prefix}}
+    query = [{"term": {COMMIT_SHORT: prefix[:SHORT_SHA_LEN]}}]
+    if len(prefix) > SHORT_SHA_LEN:
+        query.append({"prefix": {COMMIT_SHA: prefix}})
+    return {"bool": {"filter": query}}
+
+
+def backfill_commit_fields(es, index_name=INDEX_NAME):
+    es.indices.put_mapping(index=index_name, properties=commit_mapping())
+    response = es.update_by_query(
+        index=index_name,
+        query={"bool": {"must_not": {"exists": {"field": COMMIT_SHA}}}},
+        script={
+            "source": _BACKFILL_SCRIPT,
+            "lang": "painless",
+            "params": {"fields": list(COMMIT_FIELDS), "short_len": SHORT_SHA_LEN},
+        },
+        conflicts="proceed",
+        refresh=True,
+        wait_for_completion=True,
+    )
+    return {"updated": response["updated"], "failures": len(response["failures"])}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fill commit lookup fields on existing documents.")
+    parser.add_argument("--index", default=INDEX_NAME)
+    args = parser.parse_args()
+
+    es = connect_es()
+    try:
+        start = time.perf_counter()
+        stats = backfill_commit_fields(es, args.index)
+        print(
+            f"Done: {stats['updated']} updated, {stats['failures']} failures "
+            f"in {time.perf_counter() - start:.2f}s"
+        )
+    finally:
+        es.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,178 @@
+import re
+from datetime import datetime, timedelta, timezone
+
+import numpy as np
+
+# 与 ES mapping 中 created_at 的格式一一对应：git 时间戳、完整时间戳、纯日期
+DATE_FORMATS = ["%a %b %d %H:%M:%S %Y %z", "%Y-%m-%d %H:%M:%S", "%Y-%m-%d"]
+
+_MONTHS = {
+    m: i + 1 for i, m in enumerate("Jan Feb Mar Apr May Jun Jul Aug Sep Oct Nov Dec".split())
+}
+# \A...\Z 匹配整个值：$ 会放过结尾的换行
+_GIT_RE = re.compile(
+    r"\A[A-Z][a-z]{2} ([A-Z][a-z]{2}) +(\d{1,2}) (\d{2}):(\d{2}):(\d{2}) (\d{4}) ([+-])(\d{2})(\d{2})\Z"
+)
+_ISO_RE = re.compile(r"\A\d{4}-\d{2}-\d{2}( \d{2}:\d{2}:\d{2})?\Z")
+_DATE_ONLY_RE = re.compile(r"\A\d{4}-\d{2}-\d{2}\Z")
+DAY_MILLIS = 86_400_000
+_TZ_CACHE = {}
+
+
+def _tz(sign, hours, minutes):
+    key = (sign, hours, minutes)
+    tz = _TZ_CACHE.get(key)
+    if tz is None:
+        offset = timedelta(hours=int(hours), minutes=int(minutes))
+        tz = _TZ_CACHE[key] = timezone(-offset if sign == "-" else offset)
+    return tz
+
+
+def _parse_git(date_str):
+    # 预编译正则 + 月份查表，比 strptime 的通用格式解析快得多
+    match = _GIT_RE.match(date_str)
+    if match is None:
+        return None
+    month, day, hour, minute, second, year, sign, tz_h, tz_m = match.groups()
+    month = _MONTHS.get(month)
+    if month is None:
+        return None
+    try:
+        return datetime(
+            int(year),
+            month,
+            int(day),
+            int(hour),
+            int(minute),
+            int(second),
+            tzinfo=_tz(sign, tz_h, tz_m),
+        )
+    except ValueError:
+        return None
+
+
+def _parse_with(fmt):
+    def parse(date_str):
+        try:
+            return datetime.strptime(date_str, fmt)
+        except ValueError:
+            return None
+
+    return parse
+
+
+_PARSERS = [_parse_git] + [_parse_with(fmt) for fmt in DATE_FORMATS[1:]]
+
+
+def round_up(millis, value):
+    # 区间上界是纯日期时与 ES 的 lte 一致，取到当天最后一毫秒（区间均为闭区间）
+    if millis is None or millis < 0 or not isinstance(value, str):
+        return millis
+    if _DATE_ONLY_RE.match(value) is None:
+        return millis
+    return millis + DAY_MILLIS - 1
+
+
+def _days_from_civil(year, month, day):
+    # Howard Hinnant 的 days_from_civil，全部是整数运算，可直接作用于 numpy 数组
+    year = year - (month <= 2)
+    era = np.floor_divide(year, 400)
+    yoe = year - era * 400
+    doy = (153 * (month + np.where(month > 2, -3, 9)) + 2) // 5 + day - 1
+    doe = yoe * 365 + yoe // 4 - yoe // 100 + doy
+    return era * 146097 + doe - 719468
+
+
+class DateDecoder:
+    # 记住上一次成功的格式并优先尝试，混合格式时再按 DATE_FORMATS 的顺序回退，
+    # 常见路径上不再有抛出/捕获 ValueError 的开销
+    def __init__(self):
+        self._parser = _PARSERS[0]
+
+    def parse(self, date_str):
+        date = self._parser(date_str)
+        if date is not None:
+            return date
+        for parser in _PARSERS:
+            if parser is self._parser:
+                continue
+            date = parser(date_str)
+            if date is not None:
+                self._parser = parser
+                return date
+        return None
+
+    def to_millis(self, values):
+        # 批量转换为毫秒时间戳（int64），无法解析的值为 -1；不带时区的按 UTC 处理（与 ES 一致）
+        values = list(values)
+        if not values:
+            return np.empty(0, dtype=np.int64)
+        if all(isinstance(value, (int, np.integer)) for value in values):
+            return np.asarray(values, dtype=np.int64)
+        strings = [str(value) for value in values]
+        millis = self._git_millis(strings)
+        if millis is not None:
+            return millis
+
+        # 混合格式：按格式分组，每组仍然向量化转换，只有无法识别的值逐条解析
+        millis = np.full(len(strings), -1, dtype=np.int64)
+        groups = {"git": [], "iso": [], "other": []}
+        for i, s in enumerate(strings):
+            if _GIT_RE.match(s):
+                groups["git"].append(i)
+            elif _ISO_RE.match(s):
+                groups["iso"].append(i)
+            else:
+                groups["other"].append(i)
+        if groups["git"]:
+            index = np.array(groups["git"])
+            git = self._git_millis([strings[i] for i in index])
+            if git is None:
+                # 格式正确但月份无法识别，逐条解析
+                git = [self._millis(strings[i]) for i in index]
+            millis[index] = git
+        if groups["iso"]:
+            index = np.array(groups["iso"])
+            try:
+                iso = np.array([strings[i] for i in index], dtype="datetime64[ms]").astype(np.int64)
+            except ValueError:
+                # 格式正确但日期不存在（如 2025-02-30），逐条解析，这些值为 -1
+                iso = [self._millis(strings[i]) for i in index]
+            millis[index] = iso
+        for i in groups["other"]:
+            millis[i] = self._millis(values[i])
+        return millis
+
+    def bounds(self, start, end):
+        # 时间范围 [start, end] 对应的毫秒时间戳，纯日期的 end 包含当天
+        lo, hi = self.to_millis([start, end]).tolist()
+        return lo, round_up(hi, end)
+
+    def _git_millis(self, strings):
+        # 逐个值匹配，结果与输入按位置对应；只有全部匹配时才走向量化路径
+        matches = []
+        for s in strings:
+            match = _GIT_RE.match(s)
+            if match is None:
+                return None
+            matches.append(match.groups())
+        parts = np.array(matches, dtype=object).T
+        month = np.array([_MONTHS.get(m, 0) for m in parts[0]], dtype=np.int64)
+        if not month.all():
+            return None
+        day, hour, minute, second, year = (parts[i].astype(np.int64) for i in (1, 2, 3, 4, 5))
+        offset = parts[7].astype(np.int64) * 60 + parts[8].astype(np.int64)
+        offset = np.where(parts[6] == "-", -offset, offset)
+        days = _days_from_civil(year, month, day)
+        seconds = days * 86400 + hour * 3600 + minute * 60 + second - offset * 60
+        return seconds * 1000
+
+    def _millis(self, value):
+        if isinstance(value, (int, np.integer)):
+            return int(value)
+        date = self.parse(value)
+        if date is None:
+            return -1
+        if date.tzinfo is None:
+            date = date.replace(tzinfo=timezone.utc)
+        return int(date.timestamp() * 1000)
@@ -0,0 +1,210 @@
+import threading
+import time
+import traceback
+
+from elastic_transport import Urllib3HttpNode
+from elasticsearch import Elasticsearch
+
+from .metrics import ES_POOL_IN_FLIGHT, ES_POOL_SLOTS, ES_POOL_TIMEOUTS, ES_POOL_WAIT_SECONDS
+from .resilience import DeadlineExceeded, time_left
+
+ES_POOL_SIZE = 8  # 与 serve.sh 中 gunicorn 的线程数一致
+ES_REQUEST_TIMEOUT = 10  # 秒
+ES_MAX_RETRIES = 2
+ES_RETRY_ON_STATUS = (502, 503, 504)
+ES_DEAD_NODE_BACKOFF = 1.0  # 秒，节点连续失败时按指数退避，最多退避到 ES_MAX_BACKOFF
+ES_MAX_BACKOFF = 30.0
+ES_HEALTH_INTERVAL = 15  # 秒
+ES_RECONNECT_AFTER = 3  # 连续多少次健康检查失败后重建客户端
+
+
+class PoolStats:
+    def __init__(self, size):
+        self.size = size
+        self._lock = threading.Lock()
+        self._in_flight = 0
+        self._max_in_flight = 0
+        self._requests = 0
+        self._waits = 0
+        self._wait_time = 0.0
+        self._max_wait_time = 0.0
+
+    def acquired(self, wait_time, waited):
+        with self._lock:
+            self._in_flight += 1
+            self._max_in_flight = max(self._max_in_flight, self._in_flight)
+            self._requests += 1
+            if waited:
+                self._waits += 1
+                self._wait_time += wait_time
+                self._max_wait_time = max(self._max_wait_time, wait_time)
+            in_flight = self._in_flight
+        ES_POOL_IN_FLIGHT.set(in_flight)
+        ES_POOL_WAIT_SECONDS.observe(wait_time if waited else 0.0)
+
+    def released(self):
+        with self._lock:
+            self._in_flight -= 1
+            in_flight = self._in_flight
+        ES_POOL_IN_FLIGHT.set(in_flight)
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                "pool_size": self.size,
+                "in_flight": self._in_flight,
+                "max_in_flight": self._max_in_flight,
+                "saturation": self._in_flight / self.size,
+                "requests": self._requests,
+                "waits": self._waits,
+                "wait_time": self._wait_time,
+                "max_wait_time": self._max_wait_time,
+            }
+
+
+class _PooledNode(Urllib3HttpNode):
+    # 每个节点最多 connections_per_node 个并发请求，超出时排队并记录等待时间；
+    # 请求有截止时间时最多排队到截止时间，超时抛出 DeadlineExceeded（不是 TransportError，
+    # transport 不会因此把节点标记为不可用，也不会重试）
+    stats = None
+
+    def __init__(self, config):
+        super().__init__(config)
+        self._slots = threading.BoundedSemaphore(config.connections_per_node)
+
+    def perform_request(self, *args, **kwargs):
+        start = time.perf_counter()
+        waited = not self._slots.acquire(blocking=False)
+        if waited and not self._slots.acquire(timeout=time_left()):
+            ES_POOL_TIMEOUTS.inc()
+            raise DeadlineExceeded("timed out waiting for an Elasticsearch connection")
+        self.stats.acquired(time.perf_counter() - start, waited)
+        try:
+            return super().perform_request(*args, **kwargs)
+        finally:
+            self._slots.release()
+            self.stats.released()
+
+
+class ESClientManager:
+    # 每个进程一个连接池；健康检查在后台线程进行，请求路径上不再 ping
+    def __init__(
+        self,
+        addr,
+        usr,
+        pwd,
+        pool_size=ES_POOL_SIZE,
+        request_timeout=ES_REQUEST_TIMEOUT,
+        max_retries=ES_MAX_RETRIES,
+        health_interval=ES_HEALTH_INTERVAL,
+    ):
+        self.addr = addr
+        self.usr = usr
+        self.pwd = pwd
+        self.pool_size = pool_size
+        self.request_timeout = request_timeout
+        self.max_retries = max_retries
+        self.health_interval = health_interval
+        self._pool_stats = PoolStats(pool_size)
+        self._node_class = type("PooledNode", (_PooledNode,), {"stats": self._pool_stats})
+        self._client = None
+        self._lock = threading.Lock()
+        self._health_thread = None
+        self._stop = threading.Event()
+        self._healthy = None
+        self._failures = 0
+        self._reconnects = 0
+        self._last_check = None
+
+    def client(self):
+        client = self._client
+        if client is None:
+            with self._lock:
+                if self._client is None:
+                    self._client = self._connect()
+                    ES_POOL_SLOTS.set(self.pool_size)
+                    self._start_health_check()
+                client = self._client
+        return client
+
+    @property
+    def healthy(self):
+        return self._healthy
+
+    def check(self):
+        try:
+            ok = self.client().options(request_timeout=self.request_timeout).ping()
+        except Exception:
+            ok = False
+        self._last_check = time.time()
+        if ok != self._healthy:
+            print(
+                "Successfully connected to Elasticsearch!"
+                if ok
+                else "Could not connect to Elasticsearch."
+            )
+        self._healthy = ok
+        self._failures = 0 if ok else self._failures + 1
+        if self._failures >= ES_RECONNECT_AFTER:
+            self._reconnect()
+        return ok
+
+    def stats(self):
+        stats = self._pool_stats.snapshot()
+        stats.update(
+            healthy=self._healthy,
+            consecutive_failures=self._failures,
+            reconnects=self._reconnects,
+            last_check=self._last_check,
+        )
+        return stats
+
+    def close(self):
+        self._stop.set()
+        with self._lock:
+            if self._client is not None:
+                self._client.close()
+                self._client = None
+
+    def _connect(self):
+        return Elasticsearch(
+            self.addr,
+            basic_auth=(self.usr, self.pwd),
+            connections_per_node=self.pool_size,
+            request_timeout=self.request_timeout,
+            max_retries=self.max_retries,
+            retry_on_timeout=True,
+            retry_on_status=ES_RETRY_ON_STATUS,
+            dead_node_backoff_factor=ES_DEAD_NODE_BACKOFF,
+            max_dead_node_backoff=ES_MAX_BACKOFF,
+            node_class=self._node_class,
+        )
+
+    def _reconnect(self):
+        # ES 重启后旧连接可能全部失效，直接换一个新客户端并关闭旧的连接池；
+        # 正在使用旧客户端的请求会失败，由调用方按 ES 错误处理
+        with self._lock:
+            old, self._client = self._client, self._connect()
+            self._reconnects += 1
+            self._failures = 0
+        if old is not None:
+            try:
+                old.close()
+            except Exception:
+                traceback.print_exc()
+
+    def _start_health_check(self):
+        if self._health_thread is not None:
+            return
+        self._health_thread = threading.Thread(
+            target=self._health_loop, name="es-health", daemon=True
+        )
+        self._health_thread.start()
+
+    def _health_loop(self):
+        self.check()
+        while not self._stop.wait(self.health_interval):
+            try:
+                self.check()
+            except Exception:
+                traceback.print_exc()
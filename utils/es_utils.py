@@ -1,8 +1,34 @@
+import asyncio
+import concurrent.futures
+import sys
+import threading
+import time
 import traceback
-from datetime import datetime, timedelta
+from datetime import datetime, timedelta, timezone
 
+import numpy as np
 import pytz
-from elasticsearch import Elasticsearch
+from elasticsearch import AsyncElasticsearch, NotFoundError
+
+from .cache import RangeCache
+from .commits import commit_query, format_commit, normalize_prefix, split_commit
+from .dates import DateDecoder, round_up
+from .es_client import ES_MAX_RETRIES, ES_POOL_SIZE, ES_REQUEST_TIMEOUT, ESClientManager
+from .local_store import LocalStore
+from .metrics import ES_ERRORS, ES_REJECTED, STALE_RESULTS, build_timer, observe_es
+from .regression import HIGHER_IS_WORSE, verdict_fields
+from .resilience import CircuitBreaker, CircuitOpen, DeadlineExceeded, LastGood, time_left
+from .rollup import CHECKPOINT_ID, ROLLUP_INDEX, ROLLUP_SUFFIX
+from .series import (
+    CATEGORY_FIELDS,
+    COMMIT_FIELDS,
+    MODEL_TYPES,
+    VALUE_FIELDS,
+    FrameBuilder,
+    SeriesFrame,
+    band_fields,
+)
+from .shared_cache import SharedFrameCache
 
 DATE_FMT = "%a %b %-d %H:%M:%S %Y %z"
 TIME_ZONE = "Asia/Shanghai"
@@ -10,44 +36,570 @@ INDEX_NAME = "quality_monitor"
 ES_ADDR = ["http://172.219.129.21:8901"]
 ES_USR = "usr"
 ES_PWD = "123"
-ES_CLIENT = None
+ES_MANAGER = ESClientManager(ES_ADDR, ES_USR, ES_PWD)
+ASYNC_CLIENT = None
+ASYNC_LOOP = None
+_ASYNC_LOCK = threading.Lock()
+PAGE_SIZE = 1000
+PIT_KEEP_ALIVE = "1m"
+PIT_CLOSE_TIMEOUT = 5  # 秒；关闭失败也无妨，PIT 在 keep_alive 后自动过期
+# 连续失败后熔断，熔断期间的查询直接失败，由调用方返回之前的结果，不再占用线程等待超时
+ES_BREAKER = CircuitBreaker("Elasticsearch")
+# 分桶聚合和变化点标记的最近一次成功结果（原始点的旧数据由 RESULT_CACHE 提供）
+LAST_GOOD = LastGood()
+# 超过该跨度的查询改为服务端按时间分桶聚合，避免把全部原始文档拉回来画图
+RAW_SPAN_LIMIT = timedelta(days=62)
+MAX_POINTS = 2000
+BUCKET_INTERVALS = [
+    ("1h", timedelta(hours=1)),
+    ("3h", timedelta(hours=3)),
+    ("6h", timedelta(hours=6)),
+    ("12h", timedelta(hours=12)),
+    ("1d", timedelta(days=1)),
+    ("7d", timedelta(days=7)),
+    ("30d", timedelta(days=30)),
+]
+# 超过该跨度（数月）的聚合查询改读按天预聚合的 ROLLUP_INDEX，分桶不小于 1d
+ROLLUP_SPAN_LIMIT = timedelta(days=90)
+RESULT_CACHE = RangeCache()
+# 多个 gunicorn worker 之间共享的结果，每个 worker 仍保留自己的 RESULT_CACHE
+SHARED_CACHE = SharedFrameCache()
+# 历史区间在共享缓存中的有效期（秒）；同一台机器上的入库会立即使其失效（见 bump_generation），
+# 其他机器上的入库和回填最多延迟这么久可见
+HISTORY_TTL = 6 * 3600
+DATE_DECODER = DateDecoder()
+# 只让 ES 返回画图用到的部分（以及记入指标的 took）：_source 之外的 _index/_id/_score 以及 hits.total 都不需要
+SEARCH_FILTER_PATH = ["took", "pit_id", "hits.hits._source", "hits.hits.sort"]
+AGG_FILTER_PATH = ["took", "aggregations.model_types.buckets"]
+MAX_FLAGS = 1000
+# 查询后端："es" 直接查询 ES；"local" 读取 utils.local_store 从 ES 同步（或直接导入）的 SQLite 文件，
+# 小规模部署和测试不依赖任何外部服务
+STORAGE_BACKEND = "es"
+BACKEND = LocalStore() if STORAGE_BACKEND == "local" else None
+MAX_COMMIT_RUNS = 1000
+
+
+def set_backend(backend):
+    # backend 为 None 时查询 ES；否则需要提供与 LocalStore 相同的 scan/aggregate/flags，
+    # search_data、search_since 和 search_flags 改为读取它
+    global BACKEND
+    BACKEND = backend
+    RESULT_CACHE.clear()
+
 
+def get_or_connect_es():
+    return ES_MANAGER.client()
 
-def get_or_connect_es(addr=ES_ADDR, usr=ES_USR, pwd=ES_PWD):
-    global ES_CLIENT
-    if ES_CLIENT is None:
-        es = Elasticsearch(addr, basic_auth=(usr, pwd))
 
-        if es.ping():
-            print("Successfully connected to Elasticsearch!")
-        else:
-            raise Exception("Could not connect to Elasticsearch.")
-        ES_CLIENT = es
+def es_pool_stats():
+    return ES_MANAGER.stats()
 
-    return ES_CLIENT
+
+def get_or_connect_async_es(addr=ES_ADDR, usr=ES_USR, pwd=ES_PWD):
+    global ASYNC_CLIENT
+    with _ASYNC_LOCK:
+        if ASYNC_CLIENT is None:
+            ASYNC_CLIENT = AsyncElasticsearch(
+                addr,
+                basic_auth=(usr, pwd),
+                connections_per_node=ES_POOL_SIZE,
+                request_timeout=ES_REQUEST_TIMEOUT,
+                max_retries=ES_MAX_RETRIES,
+                retry_on_timeout=True,
+            )
+    return ASYNC_CLIENT
 
 
 def _get_date_obj(date_str):
-    formats = ["%a %b %d %H:%M:%S %Y %z", "%Y-%m-%d %H:%M:%S", "%Y-%m-%d"]
-    for fmt in formats:
-        try:
-            date = datetime.strptime(date_str, fmt)
-            return True, date
-        except ValueError:
+    date = DATE_DECODER.parse(date_str)
+    return date is not None, date
+
+
+def _to_millis(date_str, upper=False):
+    # upper: 作为区间上界，纯日期包含当天
+    success, date = _get_date_obj(date_str)
+    if not success:
+        return None
+    # 与 ES 一致：不带时区的日期按 UTC 解释
+    if date.tzinfo is None:
+        date = date.replace(tzinfo=timezone.utc)
+    millis = int(date.timestamp() * 1000)
+    return round_up(millis, date_str) if upper else millis
+
+
+def _millis(value, upper=False):
+    # 日期字符串或毫秒时间戳，无法解析时为 -1
+    millis = int(DATE_DECODER.to_millis([value])[0])
+    return round_up(millis, value) if upper else millis
+
+
+def _call(es, kind, method, **kwargs):
+    # 同步 ES 请求都经过这里：熔断器打开时立即失败；请求有截止时间时超时不超过剩余时间，
+    # 并且不再重试（重试会使总耗时成倍超出截止时间）。返回 (响应, 耗时)
+    timeout = time_left()
+    try:
+        ES_BREAKER.before_call()
+    except CircuitOpen:
+        ES_REJECTED.inc()
+        raise
+    if timeout is not None:
+        es = es.options(request_timeout=timeout, max_retries=0)
+    start = time.perf_counter()
+    try:
+        response = getattr(es, method)(**kwargs)
+    except Exception as e:
+        ES_ERRORS.inc(query=kind)
+        ES_BREAKER.failure(e)
+        raise
+    ES_BREAKER.success()
+    return response, time.perf_counter() - start
+
+
+def _search(es, kind, **kwargs):
+    # 记录客户端耗时、ES 的 took 和命中数；kind 为指标中的查询类型（query 标签），
+    # 不叫 query 以免与 ES 的 query 参数冲突
+    response, elapsed = _call(es, kind, "search", **kwargs)
+    hits = None
+    if "aggs" not in kwargs.get("body", {}):
+        hits = len(response.get('hits', {}).get('hits', []))
+    observe_es(kind, elapsed, response, hits)
+    return response
+
+
+def _close_pit(es, pit_id):
+    try:
+        es.options(request_timeout=PIT_CLOSE_TIMEOUT).close_point_in_time(id=pit_id)
+    except Exception as e:
+        print(f"Failed to close point in time: {e!r}")
+
+
+def _log_failure():
+    # 熔断和超时是预期内的失败，只打印一行；其他错误打印调用栈
+    exc = sys.exc_info()[1]
+    if isinstance(exc, (CircuitOpen, DeadlineExceeded)):
+        print(f"Search skipped: {exc}")
+    else:
+        traceback.print_stack()
+
+
+def _range_query(start_date, end_date):
+    return {
+        "range": {
+            "created_at": {
+                "gte": start_date,
+                "lte": end_date,
+            }
+        }
+    }
+
+
+def _scan_query(
+    start_date,
+    end_date,
+    pit_id,
+    page_size,
+    fields,
+    model_type=None,
+    source=None,
+    keep_alive=PIT_KEEP_ALIVE,
+):
+    query = _range_query(start_date, end_date)
+    if model_type is not None:
+        # 按模型类型在服务端过滤，每种模型各自一条查询
+        query = {"bool": {"filter": [query, {"term": {"model_type.raw": model_type}}]}}
+    return {
+        "query": query,
+        # created_at 直接取排序值（毫秒时间戳），不需要出现在 _source 里
+        "_source": list(CATEGORY_FIELDS) + list(fields) if source is None else list(source),
+        "track_total_hits": False,
+        # _shard_doc 作为次级排序键，保证 created_at 相同的文档也能稳定翻页
+        "sort": [{"created_at": {"order": "asc"}}, {"_shard_doc": {"order": "asc"}}],
+        "size": page_size,
+        "pit": {"id": pit_id, "keep_alive": keep_alive},
+    }
+
+
+def scan_hits(
+    es,
+    start_date,
+    end_date,
+    index_name=INDEX_NAME,
+    page_size=PAGE_SIZE,
+    fields=VALUE_FIELDS,
+    model_type=None,
+    source=None,
+    keep_alive=PIT_KEEP_ALIVE,
+):
+    # 使用 point-in-time + search_after 分页遍历整个时间范围，内存占用与结果总数无关。
+    # source 给定时只返回这些字段（默认为类别字段加 fields）
+    pit_id = _call(es, "open_pit", "open_point_in_time", index=index_name, keep_alive=keep_alive)[
+        0
+    ]['id']
+    query_conditions = _scan_query(
+        start_date, end_date, pit_id, page_size, fields, model_type, source, keep_alive
+    )
+    try:
+        while True:
+            response = _search(es, "scan", body=query_conditions, filter_path=SEARCH_FILTER_PATH)
+            # 每次响应都可能返回新的 pit_id，后续请求必须使用最新的
+            pit_id = response.get('pit_id', pit_id)
+            query_conditions["pit"]["id"] = pit_id
+            # filter_path 会省略空的 hits
+            hits = response.get('hits', {}).get('hits', [])
+            yield from hits
+            if len(hits) < page_size:
+                break
+            query_conditions["search_after"] = hits[-1]['sort']
+    finally:
+        _close_pit(es, pit_id)
+
+
+async def scan_hits_async(
+    es,
+    start_date,
+    end_date,
+    index_name=INDEX_NAME,
+    page_size=PAGE_SIZE,
+    fields=VALUE_FIELDS,
+    model_type=None,
+):
+    pit_id = (await es.open_point_in_time(index=index_name, keep_alive=PIT_KEEP_ALIVE))['id']
+    query_conditions = _scan_query(start_date, end_date, pit_id, page_size, fields, model_type)
+    try:
+        while True:
+            start = time.perf_counter()
+            try:
+                response = await es.search(body=query_conditions, filter_path=SEARCH_FILTER_PATH)
+            except Exception:
+                ES_ERRORS.inc(query="scan_async")
+                raise
+            hits = response.get('hits', {}).get('hits', [])
+            observe_es("scan_async", time.perf_counter() - start, response, len(hits))
+            pit_id = response.get('pit_id', pit_id)
+            query_conditions["pit"]["id"] = pit_id
+            for hit in hits:
+                yield hit
+            if len(hits) < page_size:
+                break
+            query_conditions["search_after"] = hits[-1]['sort']
+    finally:
+        await es.close_point_in_time(id=pit_id)
+
+
+def _span(start_date, end_date):
+    start_ok, start = _get_date_obj(start_date)
+    end_ok, end = _get_date_obj(end_date)
+    if not (start_ok and end_ok):
+        return None
+    if (start.tzinfo is None) != (end.tzinfo is None):
+        start, end = start.replace(tzinfo=None), end.replace(tzinfo=None)
+    return end - start
+
+
+def _pick_interval(start_date, end_date):
+    span = _span(start_date, end_date)
+    if span is None or span <= RAW_SPAN_LIMIT:
+        return None
+    for interval, length in BUCKET_INTERVALS:
+        if span / length <= MAX_POINTS:
+            return interval
+    return BUCKET_INTERVALS[-1][0]
+
+
+def _daily(interval):
+    # 预聚合的最小粒度是一天
+    names = [name for name, _ in BUCKET_INTERVALS]
+    return max(interval, "1d", key=names.index)
+
+
+def _bucket_start(millis, interval):
+    # 与 ES 带 time_zone 的 fixed_interval 分桶一致：按 TIME_ZONE 的本地时间对齐
+    offset = datetime.fromtimestamp(millis / 1000, pytz.timezone(TIME_ZONE)).utcoffset()
+    offset = int(offset.total_seconds() * 1000)
+    length = int(dict(BUCKET_INTERVALS)[interval].total_seconds() * 1000)
+    return (millis + offset) // length * length - offset
+
+
+def _day_range(start_date, end_date):
+    # 预聚合文档的 day 是 TIME_ZONE 的零点；起点向下取整到所在的自然日，
+    # 否则纯日期（按 UTC 解释）会漏掉第一天
+    return {
+        "range": {
+            "day": {
+                "gte": _bucket_start(_millis(start_date), "1d"),
+                "lte": _millis(end_date, upper=True),
+                "format": "epoch_millis",
+            }
+        }
+    }
+
+
+def _rollup_cut(es, rollup_index, interval):
+    # 预聚合只在检查点之前是完整的：返回检查点所在时间桶的起点，没有检查点时为 None
+    try:
+        response, _ = _call(es, "checkpoint", "get", index=rollup_index, id=CHECKPOINT_ID)
+    except NotFoundError:
+        return None
+    return _bucket_start(int(response["_source"]["checkpoint"]), _daily(interval))
+
+
+def search_aggregated_data(
+    start_date, end_date, interval, index_name=INDEX_NAME, es=None, fields=VALUE_FIELDS
+):
+    if es is None:
+        es = get_or_connect_es()
+    try:
+        return _search_aggregated(start_date, end_date, interval, index_name, es, fields)
+    except Exception:
+        _log_failure()
+        return SeriesFrame.empty(fields, aggregated=True)
+
+
+def _search_aggregated(start_date, end_date, interval, index_name, es, fields):
+    # 与 search_aggregated_data 相同，但查询失败时抛出异常
+    query_conditions = {
+        "query": _range_query(start_date, end_date),
+        "size": 0,
+        "track_total_hits": False,
+        "aggs": {
+            "model_types": {
+                "terms": {"field": "model_type.raw", "size": 10},
+                "aggs": {
+                    "over_time": {
+                        "date_histogram": {
+                            "field": "created_at",
+                            "fixed_interval": interval,
+                            "time_zone": TIME_ZONE,
+                            "min_doc_count": 1,
+                        },
+                        # stats 一次性返回 min/max/avg/count
+                        "aggs": {field: {"stats": {"field": field}} for field in fields},
+                    }
+                },
+            }
+        },
+    }
+
+    ts, model_codes = [], []
+    values = {field: [] for field in fields + band_fields(fields)}
+    response = _search(
+        es, "aggregate", index=index_name, body=query_conditions, filter_path=AGG_FILTER_PATH
+    )
+    model_buckets = response.get('aggregations', {}).get('model_types', {}).get('buckets', [])
+    for model_bucket in model_buckets:
+        if model_bucket['key'] not in MODEL_TYPES:
             continue
-    return False, None
+        code = MODEL_TYPES.index(model_bucket['key'])
+        for bucket in model_bucket['over_time']['buckets']:
+            ts.append(bucket['key'])
+            model_codes.append(code)
+            values["count"].append(bucket['doc_count'])
+            for field in fields:
+                stats = bucket[field]
+                values[field].append(stats['avg'])
+                values[f"{field}_min"].append(stats['min'])
+                values[f"{field}_max"].append(stats['max'])
+
+    order = np.argsort(np.array(ts, dtype=np.int64), kind="stable")
+    labels = np.empty(len(MODEL_TYPES), dtype=object)
+    labels[:] = MODEL_TYPES
+    return SeriesFrame(
+        np.array(ts, dtype=np.int64)[order],
+        {field: np.array(column, dtype=np.float64)[order] for field, column in values.items()},
+        {"model_type": (np.array(model_codes, dtype=np.int32)[order], labels)},
+    )
+
+
+def search_rollup(
+    start_date, end_date, interval, index_name=ROLLUP_INDEX, es=None, fields=VALUE_FIELDS
+):
+    # 与 search_aggregated_data 返回相同的列，但只读每天每种模型一条的预聚合文档；
+    # 平均值由 sum/count 重新计算，因此在任意不小于 1d 的粒度上都是精确的
+    if es is None:
+        es = get_or_connect_es()
+    aggs = {"count": {"sum": {"field": "count"}}}
+    for field in fields:
+        aggs[f"{field}_min"] = {"min": {"field": f"{field}_min"}}
+        aggs[f"{field}_max"] = {"max": {"field": f"{field}_max"}}
+        aggs[f"{field}_sum"] = {"sum": {"field": f"{field}_sum"}}
+    query_conditions = {
+        "query": _day_range(start_date, end_date),
+        "size": 0,
+        "track_total_hits": False,
+        "aggs": {
+            "model_types": {
+                "terms": {"field": "model_type", "size": 10},
+                "aggs": {
+                    "over_time": {
+                        "date_histogram": {
+                            "field": "day",
+                            "fixed_interval": _daily(interval),
+                            "time_zone": TIME_ZONE,
+                            "min_doc_count": 1,
+                        },
+                        "aggs": aggs,
+                    }
+                },
+            }
+        },
+    }
+
+    ts, model_codes = [], []
+    values = {field: [] for field in fields + band_fields(fields)}
+    try:
+        response = _search(
+            es, "rollup", index=index_name, body=query_conditions, filter_path=AGG_FILTER_PATH
+        )
+        model_buckets = response.get('aggregations', {}).get('model_types', {}).get('buckets', [])
+        for model_bucket in model_buckets:
+            if model_bucket['key'] not in MODEL_TYPES:
+                continue
+            code = MODEL_TYPES.index(model_bucket['key'])
+            for bucket in model_bucket['over_time']['buckets']:
+                count = bucket['count']['value']
+                ts.append(bucket['key'])
+                model_codes.append(code)
+                values["count"].append(count)
+                for field in fields:
+                    values[field].append(bucket[f"{field}_sum"]['value'] / max(count, 1))
+                    values[f"{field}_min"].append(bucket[f"{field}_min"]['value'])
+                    values[f"{field}_max"].append(bucket[f"{field}_max"]['value'])
+    except Exception:
+        _log_failure()
+        return SeriesFrame.empty(fields, aggregated=True)
+
+    order = np.argsort(np.array(ts, dtype=np.int64), kind="stable")
+    labels = np.empty(len(MODEL_TYPES), dtype=object)
+    labels[:] = MODEL_TYPES
+    return SeriesFrame(
+        np.array(ts, dtype=np.int64)[order],
+        {field: np.array(column, dtype=np.float64)[order] for field, column in values.items()},
+        {"model_type": (np.array(model_codes, dtype=np.int32)[order], labels)},
+    )
+
+
+def _build_frame(hits, fields=VALUE_FIELDS):
+    # created_at 的排序值即毫秒时间戳，不需要在 Python 里解析日期字符串
+    with build_timer("frame"):
+        builder = FrameBuilder(fields, formatters={field: format_commit for field in COMMIT_FIELDS})
+        for hit in hits:
+            builder.append(hit['sort'][0], hit['_source'])
+        return builder.build()
+
+
+async def _search_model_async(es, start_date, end_date, index_name, fields, model_type):
+    # 每个协程在自己的 task 中运行，build_timer 只扣除本协程的 ES 耗时
+    with build_timer("frame"):
+        builder = FrameBuilder(fields, formatters={field: format_commit for field in COMMIT_FIELDS})
+        async for hit in scan_hits_async(
+            es, start_date, end_date, index_name=index_name, fields=fields, model_type=model_type
+        ):
+            builder.append(hit['sort'][0], hit['_source'])
+        return builder.build()
+
+
+async def search_models_async(
+    es, start_date, end_date, index_name=INDEX_NAME, fields=VALUE_FIELDS, model_types=MODEL_TYPES
+):
+    # 每种模型一条查询并发执行，总耗时取决于最慢的一条，而不是两者之和
+    frames = await asyncio.gather(
+        *(
+            _search_model_async(es, start_date, end_date, index_name, fields, model_type)
+            for model_type in model_types
+        )
+    )
+    return SeriesFrame.concat(frames)
+
+
+def _async_loop():
+    global ASYNC_LOOP
+    with _ASYNC_LOCK:
+        if ASYNC_LOOP is None:
+            loop = asyncio.new_event_loop()
+            threading.Thread(target=loop.run_forever, name="es-async", daemon=True).start()
+            ASYNC_LOOP = loop
+    return ASYNC_LOOP
+
+
+def search_concurrently(
+    start_date,
+    end_date,
+    index_name=INDEX_NAME,
+    fields=VALUE_FIELDS,
+    model_types=MODEL_TYPES,
+    es=None,
+):
+    # 同步调用方（Dash 回调）通过常驻的事件循环线程执行异步查询；超过请求的截止时间时
+    # 取消协程（同时取消进行中的 ES 请求）并抛出 DeadlineExceeded
+    if es is None:
+        es = get_or_connect_async_es()
+    timeout = time_left()
+    try:
+        ES_BREAKER.before_call()
+    except CircuitOpen:
+        ES_REJECTED.inc()
+        raise
+    future = asyncio.run_coroutine_threadsafe(
+        search_models_async(es, start_date, end_date, index_name, fields, model_types),
+        _async_loop(),
+    )
+    try:
+        frame = future.result(timeout=timeout)
+    except concurrent.futures.TimeoutError:
+        future.cancel()
+        exc = DeadlineExceeded("request deadline exceeded")
+        ES_BREAKER.failure(exc)
+        raise exc from None
+    except Exception as e:
+        ES_BREAKER.failure(e)
+        raise
+    ES_BREAKER.success()
+    return frame
+
 
+def _search_stitched(start_date, end_date, interval, index_name, es, fields):
+    # 检查点所在时间桶之前读预聚合，之后（预聚合任务尚未处理的部分）在原始数据上聚合再拼接；
+    # 预聚合不可用时返回 None
+    rollup_index = index_name + ROLLUP_SUFFIX
+    cut = _rollup_cut(es, rollup_index, interval)
+    if cut is None or cut <= _millis(start_date):
+        return None
+    frame = search_rollup(
+        start_date, cut - 1, interval, index_name=rollup_index, es=es, fields=fields
+    )
+    if not len(frame):
+        return None
+    if cut > _millis(end_date, upper=True):
+        return frame
+    tail = _search_aggregated(cut, end_date, _daily(interval), index_name, es, fields)
+    return SeriesFrame.concat([frame, tail])
 
-def _format_commit(commit):
-    data = commit.split("@")
-    assert len(data) == 2, f"bad commit: {commit}"
-    branch, cid = data[0], data[1]
-    if len(cid) > 7:
-        cid = cid[:7]
-    return f"{branch}@{cid}"
 
+def _stale(key, empty, source):
+    # 查询失败时返回 key 对应的上一次成功结果（标记为旧数据），没有则返回 empty
+    frame = LAST_GOOD.get(key)
+    if frame is None:
+        return empty
+    STALE_RESULTS.inc(source=source)
+    return frame.as_stale()
 
-def search_data(start_date=None, end_date=None, index_name=INDEX_NAME, es=ES_CLIENT):
+
+def search_data(
+    start_date=None,
+    end_date=None,
+    index_name=INDEX_NAME,
+    es=None,
+    mode="auto",
+    use_cache=True,
+    fields=VALUE_FIELDS,
+    concurrent=False,
+):
+    # fields: 需要的数值列，精度页只取 acc，性能页只取 perf
+    # concurrent: 通过 AsyncElasticsearch 为每种模型并发发起一条查询
+    fields = tuple(fields)
+    backend = BACKEND
+    if es is None and not concurrent and backend is None:
+        es = get_or_connect_es()
     if end_date is None:
         end_date = datetime.now(pytz.timezone(TIME_ZONE)).strftime(DATE_FMT)
     if start_date is None:
@@ -55,56 +607,172 @@ def search_data(start_date=None, end_date=None, index_name=INDEX_NAME, es=ES_CLI
             DATE_FMT
         )
 
+    # mode: "raw" 返回原始点，"auto" 对长时间范围自动切换为分桶聚合（额外带 min/max/count 列）
+    if mode == "auto":
+        interval = _pick_interval(start_date, end_date)
+        if interval is not None:
+            if backend is not None:
+                # 本地后端直接在原始数据上分桶，不需要预聚合
+                try:
+                    return backend.aggregate(
+                        _millis(start_date), _millis(end_date, upper=True), interval, fields
+                    )
+                except Exception:
+                    traceback.print_stack()
+                return SeriesFrame.empty(fields, aggregated=True)
+            if es is None:
+                # 并发模式只用于原始点；聚合仍是一条同步查询
+                es = get_or_connect_es()
+            key = ("aggregate", index_name, fields, start_date, end_date, interval)
+            try:
+                frame = None
+                if _span(start_date, end_date) > ROLLUP_SPAN_LIMIT:
+                    frame = _search_stitched(start_date, end_date, interval, index_name, es, fields)
+                # 预聚合索引尚未建立或尚未覆盖该范围时退回原始数据上的聚合
+                if frame is None:
+                    frame = _search_aggregated(
+                        start_date, end_date, interval, index_name, es, fields
+                    )
+            except Exception:
+                _log_failure()
+                return _stale(key, SeriesFrame.empty(fields, aggregated=True), "aggregate")
+            LAST_GOOD.put(key, frame)
+            return frame
+
+    def fetch(lo, hi):
+        if backend is not None:
+            return backend.scan(_millis(lo), _millis(hi, upper=True), fields)
+        if concurrent:
+            return search_concurrently(lo, hi, index_name=index_name, fields=fields)
+        return _build_frame(scan_hits(es, lo, hi, index_name=index_name, fields=fields), fields)
+
+    def shared_fetch(lo, hi):
+        # 不再变化的历史区间只由一个 worker 查询，其他 worker 读取它的结果；
+        # 贴近当前时间、可能还有迟到数据的区间仍由各自查询
+        edge = int(time.time() * 1000) - RESULT_CACHE.edge_window
+        if backend is not None or hi >= edge:
+            return fetch(lo, hi)
+        key = ("range", index_name, fields, lo, hi)
+        return SHARED_CACHE.get(key, lambda: (fetch(lo, hi), {}), ttl=HISTORY_TTL)[0]
+
+    try:
+        lo, hi = _to_millis(start_date), _to_millis(end_date, upper=True)
+        if use_cache and lo is not None and hi is not None:
+            # ES 不可用时返回缓存中已有的（包括已过期的）数据
+            frame = RESULT_CACHE.get((index_name, fields), lo, hi, shared_fetch, stale_ok=True)
+            if frame.stale:
+                print("Search failed, serving previously fetched data.")
+                STALE_RESULTS.inc(source="raw")
+            return frame
+        return fetch(start_date, end_date)
+    except Exception:
+        _log_failure()
+
+    return SeriesFrame.empty(fields)
+
+
+def search_since(since, index_name=INDEX_NAME, es=None, fields=VALUE_FIELDS):
+    # 实时刷新：只取 since（毫秒时间戳）之后写入的文档，开销只与新增文档数有关，
+    # 与页面选择的时间范围无关；结果每次都不同，不经过 RESULT_CACHE
+    fields = tuple(fields)
+    now = int(datetime.now(timezone.utc).timestamp() * 1000)
+    if BACKEND is not None:
+        try:
+            return BACKEND.scan(since + 1, now, fields)
+        except Exception:
+            traceback.print_stack()
+        return SeriesFrame.empty(fields)
+    if es is None:
+        es = get_or_connect_es()
+    try:
+        return _build_frame(
+            scan_hits(es, since + 1, now, index_name=index_name, fields=fields), fields
+        )
+    except Exception:
+        _log_failure()
+
+    return SeriesFrame.empty(fields)
+
+
+def search_flags(start_date, end_date, field, index_name=INDEX_NAME, es=None):
+    # 只取入库时被检测器标记过的点，页面据此在图上标注，渲染时不再重新分析历史。
+    # 返回的列为 field、{field}_score（带符号的变化幅度）和 {field}_baseline
+    _, score, baseline = verdict_fields(field)
+    fields = (field, score, baseline)
+    if BACKEND is not None:
+        try:
+            return BACKEND.flags(_millis(start_date), _millis(end_date, upper=True), field)
+        except Exception:
+            traceback.print_stack()
+        return SeriesFrame.empty(fields)
+    if es is None:
+        es = get_or_connect_es()
     query_conditions = {
         "query": {
-            "range": {
-                "created_at": {
-                    "gte": start_date,
-                    "lte": end_date,
-                }
+            "bool": {
+                "filter": [
+                    _range_query(start_date, end_date),
+                    {"exists": {"field": verdict_fields(field)[0]}},
+                ]
             }
         },
-        "sort": [{"created_at": {"order": "asc"}}],  # 按时间升序排序
-        "size": 1000,  # 最多返回1000个查询结果
+        "_source": list(CATEGORY_FIELDS) + list(fields),
+        "track_total_hits": False,
+        "sort": [{"created_at": {"order": "asc"}}],
+        "size": MAX_FLAGS,
     }
-
-    dense_date, dense_acc, dense_perf, dense_meta = [], [], [], []
-    moe_date, moe_acc, moe_perf, moe_meta = [], [], [], []
+    key = ("flags", index_name, field, start_date, end_date)
     try:
-        response = es.search(index=index_name, body=query_conditions)
-        for hit in response['hits']['hits']:
-            doc = hit['_source']
-            model_type = doc['model_type']
-            date = doc['created_at']
-            success, date_obj = _get_date_obj(date)
-            if success:
-                date = date_obj
-            acc = doc['acc']
-            perf = doc['perf']
-            trigger_repo = doc['trigger_repo']
-            xmlir_commit = _format_commit(doc['xmlir_commit'])
-            llm_commit = _format_commit(doc['llm_commit'])
-            mextension_commit = _format_commit(doc['mextension_commit'])
-            mcore_commit = _format_commit(doc['mcore_commit'])
-            meta_info = (
-                f"<b>Trigger Repo</b>: {trigger_repo}<br>"
-                + f"<b>XMLIR Commit</b>: {xmlir_commit}<br>"
-                + f"<b>LLM Commit</b>: {llm_commit}<br>"
-                + f"<b>MExtension Commit</b>: {mextension_commit}<br>"
-                + f"<b>MCore Commit</b>: {mcore_commit}"
-            )
-
-            if model_type == "Dense":
-                dense_date.append(date)
-                dense_acc.append(acc)
-                dense_perf.append(perf)
-                dense_meta.append(meta_info)
-            elif model_type == "MoE":
-                moe_date.append(date)
-                moe_acc.append(acc)
-                moe_perf.append(perf)
-                moe_meta.append(meta_info)
+        response = _search(
+            es, "flags", index=index_name, body=query_conditions, filter_path=SEARCH_FILTER_PATH
+        )
+        frame = _build_frame(response.get('hits', {}).get('hits', []), fields)
     except Exception:
-        traceback.print_stack()
+        _log_failure()
+        return _stale(key, SeriesFrame.empty(fields), "flags")
+    LAST_GOOD.put(key, frame)
+    return frame
+
+
+def search_commit(prefix, index_name=INDEX_NAME, es=None, size=MAX_COMMIT_RUNS):
+    # 返回包含该 sha 前缀（任一 commit 字段）的所有运行，按时间倒序；前缀不合法时抛出 ValueError
+    normalized = normalize_prefix(prefix)
+    if normalized is None:
+        raise ValueError(f"bad commit prefix: {prefix}")
+    if es is None:
+        es = get_or_connect_es()
+    response = _search(
+        es,
+        "commit",
+        index=index_name,
+        query=commit_query(normalized),
+        _source=list(CATEGORY_FIELDS) + list(VALUE_FIELDS),
+        sort=[{"created_at": {"order": "desc"}}],
+        size=size,
+        track_total_hits=False,
+        filter_path=["took", "hits.hits._source", "hits.hits.sort"],
+    )
+    runs = []
+    for hit in response.get('hits', {}).get('hits', []):
+        # 索引中格式不对的文档（缺少 commit 字段、不是 "branch@sha"）跳过，不影响其余结果
+        try:
+            run = dict(hit['_source'], created_at=hit['sort'][0])
+            run["matched"] = [
+                field
+                for field in COMMIT_FIELDS
+                if split_commit(run[field])[1].lower().startswith(normalized)
+            ]
+        except (AttributeError, IndexError, KeyError, TypeError, ValueError) as e:
+            print(f"Skip invalid run: {e!r}", file=sys.stderr)
+            continue
+        runs.append(run)
+    return runs
+
+
+def is_regression(field, score):
+    # score 的符号即变化方向；acc 变大、perf 变小为退化
+    return (np.asarray(score) > 0) == HIGHER_IS_WORSE.get(field, True)
+
 
-    return dense_date, moe_date, dense_meta, moe_meta, dense_acc, moe_acc, dense_perf, moe_perf
+def cache_stats():
+    return dict(RESULT_CACHE.stats(), shared=SHARED_CACHE.stats())
@@ -0,0 +1,154 @@
+import json
+import threading
+import zlib
+from itertools import islice
+
+from .es_utils import INDEX_NAME, get_or_connect_es, scan_hits
+from .regression import verdict_fields
+from .series import CATEGORY_FIELDS, VALUE_FIELDS
+
+# 可导出的字段；created_at 总是作为第一列输出（毫秒时间戳）
+EXPORT_FIELDS = (
+    CATEGORY_FIELDS
+    + VALUE_FIELDS
+    + tuple(name for field in VALUE_FIELDS for name in verdict_fields(field))
+)
+EXPORT_FORMATS = {
+    "ndjson": "application/x-ndjson",
+    "arrow": "application/vnd.apache.arrow.stream",
+}
+EXPORT_PAGE_SIZE = 5000
+# 客户端读得慢时两页之间可能间隔较久，PIT 需要保留得更久
+EXPORT_KEEP_ALIVE = "5m"
+# 同时进行的导出数，保证其余 gunicorn 线程始终可以处理页面请求
+MAX_EXPORTS = 2
+GZIP_LEVEL = 6
+_EXPORT_SLOTS = threading.BoundedSemaphore(MAX_EXPORTS)
+
+
+def acquire_export_slot():
+    return _EXPORT_SLOTS.acquire(blocking=False)
+
+
+def release_export_slot():
+    _EXPORT_SLOTS.release()
+
+
+def open_export(start_date, end_date, fields, model_type=None, index_name=INDEX_NAME, es=None):
+    # 先取出第一条，使打开 PIT 和第一页查询的错误在开始发送响应之前抛出
+    if es is None:
+        es = get_or_connect_es()
+    hits = scan_hits(
+        es,
+        start_date,
+        end_date,
+        index_name=index_name,
+        page_size=EXPORT_PAGE_SIZE,
+        model_type=model_type,
+        source=fields,
+        keep_alive=EXPORT_KEEP_ALIVE,
+    )
+    return _Export(next(hits, None), hits)
+
+
+class _Export:
+    # 先返回预取的第一条再继续遍历；close() 关闭底层的 scan_hits 并释放 PIT，
+    # 即使响应还没有开始发送也可以调用
+    def __init__(self, first, hits):
+        self._first = first
+        self._hits = hits
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        if self._first is not None:
+            first, self._first = self._first, None
+            return first
+        return next(self._hits)
+
+    def close(self):
+        self._hits.close()
+
+
+def _batches(hits, fields):
+    # 每次最多 EXPORT_PAGE_SIZE 行，内存占用与导出总量无关
+    while True:
+        page = list(islice(hits, EXPORT_PAGE_SIZE))
+        if not page:
+            return
+        yield [hit['sort'][0] for hit in page], [
+            [hit['_source'].get(field) for hit in page] for field in fields
+        ]
+
+
+def ndjson_chunks(hits, fields):
+    for ts, columns in _batches(hits, fields):
+        lines = [
+            json.dumps(dict(zip(("created_at",) + tuple(fields), row)), ensure_ascii=False)
+            for row in zip(ts, *columns)
+        ]
+        yield ("\n".join(lines) + "\n").encode()
+
+
+def _arrow_type(pa, field):
+    if field in CATEGORY_FIELDS or field.endswith("_verdict"):
+        return pa.string()
+    return pa.float64()
+
+
+class _Chunks:
+    # pyarrow 的写入目标：收集写入的字节，由生成器按批取走
+    def __init__(self):
+        self.parts = []
+        self.closed = False
+
+    def write(self, data):
+        self.parts.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def take(self):
+        data, self.parts = b"".join(self.parts), []
+        return data
+
+
+def arrow_chunks(hits, fields):
+    # Arrow IPC stream：每页一个 record batch；pyarrow 是可选依赖，只在导出 Arrow 时需要
+    import pyarrow as pa
+
+    schema = pa.schema(
+        [pa.field("created_at", pa.timestamp("ms", tz="UTC"))]
+        + [pa.field(field, _arrow_type(pa, field)) for field in fields]
+    )
+    sink = _Chunks()
+    with pa.ipc.new_stream(sink, schema) as writer:
+        yield sink.take()
+        for ts, columns in _batches(hits, fields):
+            writer.write_batch(
+                pa.record_batch(
+                    [pa.array(ts, type=pa.int64()).cast(schema.field(0).type)]
+                    + [
+                        pa.array(column, type=schema.field(i + 1).type)
+                        for i, column in enumerate(columns)
+                    ],
+                    schema=schema,
+                )
+            )
+            yield sink.take()
+    yield sink.take()
+
+
+def gzip_chunks(chunks, level=GZIP_LEVEL):
+    # 每块之后 Z_SYNC_FLUSH，客户端可以边下载边解压，服务端不缓存整个响应
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+    for chunk in chunks:
+        data = compressor.compress(chunk) + compressor.flush(zlib.Z_SYNC_FLUSH)
+        if data:
+            yield data
+    yield compressor.flush()
@@ -0,0 +1,260 @@
+import argparse
+import csv
+import hashlib
+import json
+import sys
+import time
+
+from elasticsearch.helpers import parallel_bulk, streaming_bulk
+
+from .commits import commit_fields, commit_mapping
+from .init_es import INDEX_NAME, connect_es, create_index
+from .local_store import LOCAL_STORE_PATH, LocalStore
+from .regression import WARMUP, RegressionDetector, verdict_mapping
+from .rollup import INGESTED_AT_MAPPING
+from .series import COMMIT_FIELDS, MODEL_TYPES
+from .shared_cache import bump_generation
+
+REQUIRED_FIELDS = ["created_at", "trigger_repo", "model_type", "acc", "perf", *COMMIT_FIELDS]
+
+
+def read_records(path, fmt=None):
+    # path 为 "-" 时从标准输入读取；格式默认按扩展名判断
+    if fmt is None:
+        fmt = "csv" if path.endswith(".csv") else "jsonl"
+    f = sys.stdin if path == "-" else open(path, newline="")
+    try:
+        if fmt == "csv":
+            yield from csv.DictReader(f)
+        else:
+            # 每行在 to_doc 中解析，格式错误的行与缺少字段的记录一样跳过并计入 invalid
+            for line in f:
+                line = line.strip()
+                if line:
+                    yield line
+    finally:
+        if f is not sys.stdin:
+            f.close()
+
+
+def doc_id(doc):
+    # 同一组 commit 在同一种模型上只保留一条结果，重复导入会覆盖而不是新增
+    key = "|".join([doc["model_type"], *(doc[field] for field in COMMIT_FIELDS)])
+    return hashlib.sha1(key.encode()).hexdigest()
+
+
+def to_doc(record):
+    if isinstance(record, str):
+        record = json.loads(record)
+    if not isinstance(record, dict):
+        raise TypeError(f"expected an object, got {type(record).__name__}")
+    missing = [field for field in REQUIRED_FIELDS if record.get(field) in (None, "")]
+    if missing:
+        raise ValueError(f"missing fields: {', '.join(missing)}")
+    doc = {field: record[field] for field in REQUIRED_FIELDS}
+    # CSV 中所有值都是字符串
+    doc["acc"] = float(doc["acc"])
+    doc["perf"] = float(doc["perf"])
+    if isinstance(doc["created_at"], str) and doc["created_at"].isdigit():
+        doc["created_at"] = int(doc["created_at"])
+    doc.update(commit_fields(doc))
+    return doc
+
+
+def generate_actions(records, index_name, stats, detector=None, batch_size=500, deferred=None):
+    # deferred 不为 None 时，更新之前批次中文档的动作放入其中，由调用方在全部 index 完成后发送
+    batch = []
+    for record in records:
+        try:
+            doc = to_doc(record)
+        except (ValueError, TypeError) as e:
+            stats["invalid"] += 1
+            print(f"Skip invalid record: {e}", file=sys.stderr)
+            continue
+        batch.append(doc)
+        if len(batch) >= batch_size:
+            yield from _batch_actions(batch, index_name, stats, detector, deferred)
+            batch = []
+    if batch:
+        yield from _batch_actions(batch, index_name, stats, detector, deferred)
+
+
+def _batch_actions(docs, index_name, stats, detector, deferred=None):
+    ids = [doc_id(doc) for doc in docs]
+    # 变化点检测在入库时完成，结果随文档一起写入；起点在之前批次里的文档单独更新
+    earlier = detector.annotate(docs, ids) if detector is not None else {}
+    ingested_at = int(time.time() * 1000)
+    for _id, doc in zip(ids, docs):
+        doc["ingested_at"] = ingested_at
+        if any(key.endswith("_verdict") for key in doc):
+            stats["flagged"] += 1
+        yield {"_op_type": "index", "_index": index_name, "_id": _id, "_source": doc}
+    for _id, verdict in earlier.items():
+        stats["flagged"] += 1
+        # 同时更新入库时间，增量同步和预聚合按 ingested_at 发现这些被修改的文档
+        doc = dict(verdict, ingested_at=ingested_at)
+        action = {"_op_type": "update", "_index": index_name, "_id": _id, "doc": doc}
+        if deferred is None:
+            yield action
+        else:
+            deferred.append(action)
+
+
+def ingest(
+    es, records, index_name=INDEX_NAME, chunk_size=500, workers=1, max_retries=3, detect=True
+):
+    # detect: 增量变化点检测，要求输入大致按时间顺序；乱序的历史回填可以关闭
+    stats = {"indexed": 0, "rejected": 0, "invalid": 0, "flagged": 0}
+    detector = None
+    if detect:
+        detector = RegressionDetector()
+        detector.warm_up(es, index_name, MODEL_TYPES)
+    # parallel_bulk 并发发送各个分块，更新之前分块中文档的检测结果可能先于该文档的 index 到达，
+    # 被 ES 以 document_missing 拒绝；这些更新留到全部分块写入之后再顺序发送
+    deferred = [] if workers > 1 else None
+    actions = generate_actions(
+        records, index_name, stats, detector, batch_size=chunk_size, deferred=deferred
+    )
+    start = time.perf_counter()
+    if workers > 1:
+        # parallel_bulk 不支持 429 重试，被拒绝的文档会计入 rejected
+        results = parallel_bulk(
+            es, actions, thread_count=workers, chunk_size=chunk_size, raise_on_error=False
+        )
+    else:
+        results = _streaming(es, actions, chunk_size, max_retries)
+    _consume(results, stats, chunk_size)
+    if deferred:
+        _consume(_streaming(es, deferred, chunk_size, max_retries), stats, chunk_size)
+
+    if stats["indexed"]:
+        # 写入的可能是已经被查看过的历史区间，web 进程共享的缓存随之失效
+        bump_generation()
+    elapsed = time.perf_counter() - start
+    total = stats["indexed"] + stats["rejected"]
+    print(
+        f"Done: {stats['indexed']} indexed, {stats['rejected']} rejected, "
+        f"{stats['invalid']} invalid, {stats['flagged']} flagged in {elapsed:.2f}s "
+        f"({total / max(elapsed, 1e-9):.0f} docs/s)"
+    )
+    return stats
+
+
+def ingest_local(store, records, chunk_size=500, detect=True):
+    # 不经过 ES，直接写入本地存储（LocalStore）
+    stats = {"indexed": 0, "rejected": 0, "invalid": 0, "flagged": 0}
+    detector = None
+    if detect:
+        detector = RegressionDetector()
+        for model_type in MODEL_TYPES:
+            detector.replay(model_type, *store.recent(model_type, WARMUP, detector.fields))
+    start = time.perf_counter()
+    actions = generate_actions(records, INDEX_NAME, stats, detector, batch_size=chunk_size)
+    stats["indexed"] = store.apply(actions, chunk_size)
+    elapsed = time.perf_counter() - start
+    print(
+        f"Done: {stats['indexed']} indexed, {stats['invalid']} invalid, "
+        f"{stats['flagged']} flagged in {elapsed:.2f}s "
+        f"({stats['indexed'] / max(elapsed, 1e-9):.0f} docs/s)"
+    )
+    return stats
+
+
+def _streaming(es, actions, chunk_size, max_retries):
+    return streaming_bulk(
+        es, actions, chunk_size=chunk_size, max_retries=max_retries, raise_on_error=False
+    )
+
+
+def _consume(results, stats, chunk_size):
+    chunk_start = time.perf_counter()
+    chunk_docs = chunk_rejected = 0
+    for ok, info in results:
+        chunk_docs += 1
+        if ok:
+            stats["indexed"] += 1
+        else:
+            stats["rejected"] += 1
+            chunk_rejected += 1
+            print(f"Rejected: {info}", file=sys.stderr)
+        if chunk_docs == chunk_size:
+            _report_chunk(chunk_docs, chunk_rejected, time.perf_counter() - chunk_start)
+            chunk_start = time.perf_counter()
+            chunk_docs = chunk_rejected = 0
+    if chunk_docs:
+        _report_chunk(chunk_docs, chunk_rejected, time.perf_counter() - chunk_start)
+
+
+def _report_chunk(docs, rejected, elapsed):
+    print(f"chunk: {docs} docs, {rejected} rejected, {docs / max(elapsed, 1e-9):.0f} docs/s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Bulk ingest CI results into Elasticsearch.")
+    parser.add_argument("inputs", nargs="*", default=["-"], help="JSONL/CSV files, '-' for stdin")
+    parser.add_argument("--format", choices=["jsonl", "csv"], help="input format")
+    parser.add_argument("--index", default=INDEX_NAME)
+    parser.add_argument("--chunk-size", type=int, default=500)
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--max-retries", type=int, default=3)
+    parser.add_argument(
+        "--backfill",
+        action="store_true",
+        help="disable index refresh while loading, for large backfills",
+    )
+    parser.add_argument(
+        "--no-detect",
+        action="store_true",
+        help="skip change-point detection, e.g. for out-of-order backfills",
+    )
+    parser.add_argument(
+        "--local",
+        nargs="?",
+        const=str(LOCAL_STORE_PATH),
+        help="write to a local SQLite store instead of Elasticsearch",
+    )
+    args = parser.parse_args()
+
+    if args.local is not None:
+        records = (record for path in args.inputs for record in read_records(path, args.format))
+        stats = ingest_local(
+            LocalStore(args.local), records, chunk_size=args.chunk_size, detect=not args.no_detect
+        )
+        if stats["invalid"]:
+            sys.exit(1)
+        return
+
+    es = connect_es()
+    try:
+        create_index(es, args.index)
+        # 已存在的索引补上检测结果、入库时间和 commit 查询字段的 mapping
+        es.indices.put_mapping(
+            index=args.index,
+            properties={**verdict_mapping(), **INGESTED_AT_MAPPING, **commit_mapping()},
+        )
+        if args.backfill:
+            es.indices.put_settings(index=args.index, settings={"refresh_interval": "-1"})
+        records = (record for path in args.inputs for record in read_records(path, args.format))
+        try:
+            stats = ingest(
+                es,
+                records,
+                index_name=args.index,
+                chunk_size=args.chunk_size,
+                workers=args.workers,
+                max_retries=args.max_retries,
+                detect=not args.no_detect,
+            )
+        finally:
+            if args.backfill:
+                es.indices.put_settings(index=args.index, settings={"refresh_interval": None})
+                es.indices.refresh(index=args.index)
+    finally:
+        es.close()
+
+    if stats["rejected"] or stats["invalid"]:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
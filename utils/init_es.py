@@ -39,6 +39,17 @@ def create_index(es, index_name):
                 "llm_commit": {"type": "keyword"},
                 "mextension_commit": {"type": "keyword"},
                 "mcore_commit": {"type": "keyword"},
+                # 拆分后的 branch 和小写 sha，以及四个 commit 的 sha 合并成的数组，用于按 sha 快速查找（见 commits.py）
+                "xmlir_commit_branch": {"type": "keyword"},
+                "xmlir_commit_sha": {"type": "keyword"},
+                "llm_commit_branch": {"type": "keyword"},
+                "llm_commit_sha": {"type": "keyword"},
+                "mextension_commit_branch": {"type": "keyword"},
+                "mextension_commit_sha": {"type": "keyword"},
+                "mcore_commit_branch": {"type": "keyword"},
+                "mcore_commit_sha": {"type": "keyword"},
+                "commit_sha": {"type": "keyword"},
+                "commit_short": {"type": "keyword"},
                 # model_type 使用 text 类型，表示会被分词的文本，用于全文搜索，适合搜索部分匹配关键词的情况，默认不支持排序和聚合
                 # model_type.raw 使用 keyword 类型，表示不分词的文本，用于聚合和排序
                 "model_type": {
@@ -48,6 +59,15 @@ def create_index(es, index_name):
                 },
                 "acc": {"type": "float"},
                 "perf": {"type": "float"},
+                # 入库时变化点检测的结果（见 regression.py），只有被标记的文档才有这些字段
+                "acc_verdict": {"type": "keyword"},
+                "acc_score": {"type": "float"},
+                "acc_baseline": {"type": "float"},
+                "perf_verdict": {"type": "keyword"},
+                "perf_score": {"type": "float"},
+                "perf_baseline": {"type": "float"},
+                # 入库时间（毫秒时间戳），按天预聚合的任务据此只处理新文档（见 rollup.py）
+                "ingested_at": {"type": "date", "format": "epoch_millis"},
             }
         },
         "settings": {"number_of_shards": 1, "number_of_replicas": 0},
@@ -0,0 +1,121 @@
+import threading
+import time
+import traceback
+
+from . import es_utils
+from .es_utils import ES_BREAKER, ES_MANAGER, cache_stats, es_pool_stats
+from .snapshot import SNAPSHOT
+
+WARM_UP_RETRY = 5  # 秒，ES 不可达时隔多久重试
+
+_STATE = {"started_at": None, "ready_at": None, "steps": {}, "attempts": 0}
+_LOCK = threading.Lock()
+_THREAD = None
+
+
+def warm_up():
+    # 连接 ES 并同步加载快照，第一个访问者不再承担建立连接、ping 和冷查询的开销。
+    # 返回是否成功；ES 不可达时不加载快照，由调用方重试
+    steps = {}
+    if es_utils.BACKEND is not None:
+        # 本地后端不需要连接 ES
+        start = time.perf_counter()
+        ok = es_utils.BACKEND.ping()
+        steps["ping"] = time.perf_counter() - start
+    else:
+        start = time.perf_counter()
+        ES_MANAGER.client()
+        steps["connect"] = time.perf_counter() - start
+
+        start = time.perf_counter()
+        ok = ES_MANAGER.check()
+        steps["ping"] = time.perf_counter() - start
+    if not ok:
+        return False
+
+    start = time.perf_counter()
+    SNAPSHOT.get()
+    steps["snapshot"] = time.perf_counter() - start
+    with _LOCK:
+        _STATE["steps"] = steps
+    return True
+
+
+def _run(stop):
+    while True:
+        with _LOCK:
+            _STATE["attempts"] += 1
+        try:
+            if warm_up():
+                break
+        except Exception:
+            traceback.print_exc()
+        print(f"Warm-up failed, retrying in {WARM_UP_RETRY}s.")
+        if stop.wait(WARM_UP_RETRY):
+            return
+
+    with _LOCK:
+        _STATE["ready_at"] = time.time()
+        state = dict(_STATE)
+    print(
+        f"Cold start: ready in {state['ready_at'] - state['started_at']:.2f}s "
+        f"after {state['attempts']} attempt(s) ("
+        + ", ".join(f"{name} {elapsed:.2f}s" for name, elapsed in state["steps"].items())
+        + ")"
+    )
+
+
+def start_warm_up(started_at=None, stop=None):
+    # 在 gunicorn 的 post_fork 中（或直接运行 main.py 时）调用，每个进程一次；
+    # started_at 为进程开始的时间，用于计算冷启动耗时
+    global _THREAD
+    with _LOCK:
+        if _THREAD is not None:
+            return _THREAD
+        _STATE["started_at"] = started_at or time.time()
+        _THREAD = threading.Thread(
+            target=_run, args=(stop or threading.Event(),), name="warm-up", daemon=True
+        )
+    _THREAD.start()
+    return _THREAD
+
+
+def health():
+    # 存活检查：进程能处理请求即可，不依赖 ES
+    with _LOCK:
+        started_at = _STATE["started_at"]
+    return {"status": "ok", "uptime": None if started_at is None else time.time() - started_at}
+
+
+def readiness():
+    # 就绪检查：只在冷启动（预热未完成、快照尚未加载）时失败。ES（或本地存储）不可达、快照过期时
+    # 仍然就绪，状态为 degraded：此时页面返回快照和缓存中的旧数据，负载均衡不应摘掉所有进程
+    with _LOCK:
+        state = dict(_STATE)
+    age = SNAPSHOT.age()
+    ready = state["ready_at"] is not None and age is not None
+    if es_utils.BACKEND is not None:
+        checks = {"local_store": es_utils.BACKEND.ping()}
+    else:
+        checks = {"elasticsearch": bool(ES_MANAGER.healthy)}
+    checks["breaker"] = ES_BREAKER.state == "closed"
+    checks["snapshot"] = age is not None and not SNAPSHOT.stale()
+    if not ready:
+        status = "starting"
+    else:
+        status = "ok" if all(checks.values()) else "degraded"
+    cold_start = None
+    if state["ready_at"] is not None:
+        cold_start = state["ready_at"] - state["started_at"]
+    return ready, {
+        "status": status,
+        "checks": checks,
+        "snapshot_age": age,
+        "snapshot_points": SNAPSHOT.points(),
+        "cold_start": cold_start,
+        "warm_up_steps": state["steps"],
+        "warm_up_attempts": state["attempts"],
+        "cache": cache_stats(),
+        "breaker": ES_BREAKER.stats(),
+        "es_pool": es_pool_stats(),
+    }
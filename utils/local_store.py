@@ -0,0 +1,348 @@
+import argparse
+import sqlite3
+import threading
+import time
+import traceback
+from datetime import datetime
+from pathlib import Path
+
+import numpy as np
+import pytz
+from elasticsearch.helpers import scan
+
+from .commits import format_commit
+from .dates import DateDecoder
+from .init_es import INDEX_NAME, TIME_ZONE, connect_es
+from .regression import verdict_fields
+from .rollup import ROLLUP_LAG_MS
+from .series import CATEGORY_FIELDS, COMMIT_FIELDS, MODEL_TYPES, VALUE_FIELDS, SeriesFrame
+
+# 本地存储：SQLite 单文件，created_at 上建索引，按时间范围读取时只扫描命中的那一段；
+# 打开 mmap 后读取直接走页缓存，多个 worker 进程共享同一份
+LOCAL_STORE_PATH = Path(__file__).resolve().parent.parent / "data" / "quality_monitor.db"
+MMAP_SIZE = 1 << 30
+SYNC_BATCH = 5000
+SYNC_INTERVAL = 60  # 秒，定期同步时的默认间隔
+MAX_FLAGS = 1000
+_INTERVAL_UNITS = {"s": 1000, "m": 60_000, "h": 3_600_000, "d": 86_400_000}
+
+LOCAL_COLUMNS = {"created_at": "INTEGER NOT NULL"}
+LOCAL_COLUMNS.update({field: "TEXT NOT NULL" for field in CATEGORY_FIELDS})
+LOCAL_COLUMNS.update({field: "REAL" for field in VALUE_FIELDS})
+for _field in VALUE_FIELDS:
+    _verdict, _score, _baseline = verdict_fields(_field)
+    LOCAL_COLUMNS.update({_verdict: "TEXT", _score: "REAL", _baseline: "REAL"})
+LOCAL_COLUMNS["ingested_at"] = "INTEGER"
+
+
+def _interval_millis(interval):
+    # "3h"、"1d" 等 ES fixed_interval 写法
+    return int(interval[:-1]) * _INTERVAL_UNITS[interval[-1]]
+
+
+def _encode(column, formatter=None):
+    lookup = {}
+    codes = np.fromiter(
+        (lookup.setdefault(label, len(lookup)) for label in column),
+        dtype=np.int32,
+        count=len(column),
+    )
+    labels = np.empty(len(lookup), dtype=object)
+    labels[:] = [formatter(label) for label in lookup] if formatter else list(lookup)
+    return codes, labels
+
+
+def _frame(rows, fields):
+    # 行依次为 created_at、CATEGORY_FIELDS、fields；按列整体转换，空值（NULL）为 NaN
+    if not rows:
+        return SeriesFrame.empty(fields)
+    columns = list(zip(*rows))
+    categories = {
+        field: _encode(column, format_commit if field in COMMIT_FIELDS else None)
+        for field, column in zip(CATEGORY_FIELDS, columns[1:])
+    }
+    values = {
+        field: np.array(column, dtype=np.float64)
+        for field, column in zip(fields, columns[1 + len(CATEGORY_FIELDS) :])
+    }
+    return SeriesFrame(np.array(columns[0], dtype=np.int64), values, categories)
+
+
+class LocalStore:
+    # 与 ES 查询同样返回 SeriesFrame 的本地后端（见 es_utils.set_backend）：
+    # scan/aggregate/flags 对应 search_data 的原始点、分桶聚合和 search_flags。
+    # 数据来自 sync() 从 ES 增量同步，或由 `python -m utils.ingest --local` 直接写入
+    def __init__(self, path=LOCAL_STORE_PATH):
+        self.path = Path(path)
+        self._local = threading.local()
+        self._dates = DateDecoder()
+        self.create()
+
+    def _conn(self):
+        # sqlite3 连接不能跨线程使用，每个线程一个
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=30)
+            # WAL 模式下同步进程写入时读者不会被阻塞
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute(f"PRAGMA mmap_size={MMAP_SIZE}")
+            self._local.conn = conn
+        return conn
+
+    def create(self):
+        columns = ", ".join(f"{name} {kind}" for name, kind in LOCAL_COLUMNS.items())
+        with self._conn() as conn:
+            conn.execute(f"CREATE TABLE IF NOT EXISTS docs (id TEXT PRIMARY KEY, {columns})")
+            conn.execute("CREATE INDEX IF NOT EXISTS docs_created_at ON docs (created_at)")
+            conn.execute(
+                "CREATE INDEX IF NOT EXISTS docs_model_created_at ON docs (model_type, created_at)"
+            )
+            conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value)")
+
+    @staticmethod
+    def _columns(fields):
+        # 字段名会拼进 SQL，只接受表中已有的列
+        unknown = [field for field in fields if field not in LOCAL_COLUMNS]
+        if unknown:
+            raise ValueError(f"unknown fields: {', '.join(unknown)}")
+        return ", ".join(("created_at",) + CATEGORY_FIELDS + tuple(fields))
+
+    def scan(self, lo, hi, fields=VALUE_FIELDS):
+        # lo/hi 为毫秒时间戳（闭区间），结果按 created_at 升序
+        fields = tuple(fields)
+        rows = (
+            self._conn()
+            .execute(
+                f"SELECT {self._columns(fields)} FROM docs "
+                "WHERE created_at BETWEEN ? AND ? ORDER BY created_at",
+                (lo, hi),
+            )
+            .fetchall()
+        )
+        return _frame(rows, fields)
+
+    def flags(self, lo, hi, field):
+        verdict, score, baseline = verdict_fields(field)
+        fields = (field, score, baseline)
+        rows = (
+            self._conn()
+            .execute(
+                f"SELECT {self._columns(fields)} FROM docs WHERE created_at BETWEEN ? AND ? "
+                f"AND {verdict} IS NOT NULL ORDER BY created_at LIMIT ?",
+                (lo, hi, MAX_FLAGS),
+            )
+            .fetchall()
+        )
+        return _frame(rows, fields)
+
+    def aggregate(self, lo, hi, interval, fields=VALUE_FIELDS):
+        # 与 search_aggregated_data 返回相同的列；桶按 TIME_ZONE 的本地时间对齐，与 ES 的
+        # date_histogram（fixed_interval + time_zone）一致，桶的时间戳为桶起点
+        fields = tuple(fields)
+        self._columns(fields)
+        stats = ", ".join(f"AVG({field}), MIN({field}), MAX({field})" for field in fields)
+        step = _interval_millis(interval)
+        offset = int(pytz.timezone(TIME_ZONE).utcoffset(datetime.now()).total_seconds() * 1000)
+        rows = (
+            self._conn()
+            .execute(
+                f"SELECT model_type, (created_at + ?) / ? * ? - ? AS bucket, COUNT(*), {stats} "
+                "FROM docs WHERE created_at BETWEEN ? AND ? "
+                "GROUP BY model_type, bucket ORDER BY bucket",
+                (offset, step, step, offset, lo, hi),
+            )
+            .fetchall()
+        )
+        rows = [row for row in rows if row[0] in MODEL_TYPES]
+        if not rows:
+            return SeriesFrame.empty(fields, aggregated=True)
+        columns = list(zip(*rows))
+        values = {"count": np.array(columns[2], dtype=np.float64)}
+        for i, field in enumerate(fields):
+            for j, name in enumerate((field, f"{field}_min", f"{field}_max")):
+                values[name] = np.array(columns[3 + 3 * i + j], dtype=np.float64)
+        labels = np.empty(len(MODEL_TYPES), dtype=object)
+        labels[:] = MODEL_TYPES
+        codes = np.array([MODEL_TYPES.index(model) for model in columns[0]], dtype=np.int32)
+        return SeriesFrame(
+            np.array(columns[1], dtype=np.int64), values, {"model_type": (codes, labels)}
+        )
+
+    def recent(self, model_type, size, fields=VALUE_FIELDS):
+        # 某个模型最近 size 条文档，按时间升序返回 (ids, {field: values})，用于恢复检测器状态
+        self._columns(fields)
+        rows = (
+            self._conn()
+            .execute(
+                f"SELECT id, {', '.join(fields)} FROM docs WHERE model_type = ? "
+                "ORDER BY created_at DESC LIMIT ?",
+                (model_type, size),
+            )
+            .fetchall()[::-1]
+        )
+        columns = list(zip(*rows)) or [()] * (len(fields) + 1)
+        return list(columns[0]), {field: list(columns[1 + i]) for i, field in enumerate(fields)}
+
+    def upsert(self, docs, ids):
+        # 与 ES 的 index 操作相同：同 id 的文档整体覆盖。created_at 可以是毫秒时间戳或日期字符串；
+        # 缺少必需字段或日期无法解析的文档跳过，返回写入的条数
+        millis = self._dates.to_millis([doc.get("created_at") for doc in docs])
+        names = list(LOCAL_COLUMNS)
+        rows = []
+        for _id, doc, created_at in zip(ids, docs, millis.tolist()):
+            if created_at < 0 or any(doc.get(field) is None for field in CATEGORY_FIELDS):
+                continue
+            rows.append((_id, created_at, *(doc.get(name) for name in names[1:])))
+        with self._conn() as conn:
+            conn.executemany(
+                f"INSERT OR REPLACE INTO docs (id, {', '.join(names)}) "
+                f"VALUES ({', '.join('?' * (len(names) + 1))})",
+                rows,
+            )
+        return len(rows)
+
+    def update(self, changes):
+        # changes: {doc_id: {字段: 值}}，例如检测器对之前批次中文档的标记
+        with self._conn() as conn:
+            for _id, doc in changes.items():
+                fields = [field for field in doc if field in LOCAL_COLUMNS]
+                if not fields:
+                    continue
+                conn.execute(
+                    f"UPDATE docs SET {', '.join(f'{field} = ?' for field in fields)} WHERE id = ?",
+                    [doc[field] for field in fields] + [_id],
+                )
+
+    def apply(self, actions, chunk_size=SYNC_BATCH):
+        # 直接消费 ingest.generate_actions 产生的 bulk 动作：index 覆盖写入，update 更新部分字段
+        written = 0
+        docs, ids, changes = [], [], {}
+
+        def flush():
+            nonlocal written
+            written += self.upsert(docs, ids)
+            self.update(changes)
+            docs.clear()
+            ids.clear()
+            changes.clear()
+
+        for action in actions:
+            if action["_op_type"] == "update":
+                changes.setdefault(action["_id"], {}).update(action["doc"])
+            else:
+                docs.append(action["_source"])
+                ids.append(action["_id"])
+            if len(docs) + len(changes) >= chunk_size:
+                flush()
+        flush()
+        return written
+
+    def checkpoint(self, index_name=INDEX_NAME):
+        row = (
+            self._conn()
+            .execute("SELECT value FROM meta WHERE key = ?", (f"checkpoint:{index_name}",))
+            .fetchone()
+        )
+        return None if row is None else row[0]
+
+    def sync(self, es, index_name=INDEX_NAME, full=False):
+        # 增量同步：取检查点（上次见到的最大 ingested_at）之后入库或更新的文档，多回看 ROLLUP_LAG_MS；
+        # 没有检查点或 full=True 时全量同步。ES 中的文档只会被覆盖不会被删除，这里也不做删除
+        checkpoint = None if full else self.checkpoint(index_name)
+        if checkpoint is None:
+            query = {"match_all": {}}
+            latest = int(time.time() * 1000)
+        else:
+            query = {"range": {"ingested_at": {"gte": checkpoint - ROLLUP_LAG_MS}}}
+            latest = checkpoint
+        hits = scan(
+            es,
+            index=index_name,
+            query={"query": query},
+            _source=list(LOCAL_COLUMNS),
+            size=SYNC_BATCH,
+        )
+        stats = {"synced": 0, "skipped": 0}
+        docs, ids = [], []
+        for hit in hits:
+            docs.append(hit["_source"])
+            ids.append(hit["_id"])
+            latest = max(latest, hit["_source"].get("ingested_at") or 0)
+            if len(docs) >= SYNC_BATCH:
+                written = self.upsert(docs, ids)
+                stats["synced"] += written
+                stats["skipped"] += len(docs) - written
+                docs, ids = [], []
+        written = self.upsert(docs, ids)
+        stats["synced"] += written
+        stats["skipped"] += len(docs) - written
+        with self._conn() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)",
+                (f"checkpoint:{index_name}", latest),
+            )
+        return dict(stats, checkpoint=latest, full=checkpoint is None)
+
+    def count(self):
+        return self._conn().execute("SELECT COUNT(*) FROM docs").fetchone()[0]
+
+    def ping(self):
+        try:
+            self._conn().execute("SELECT 1").fetchone()
+        except sqlite3.Error:
+            return False
+        return True
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Sync documents from Elasticsearch to SQLite.")
+    parser.add_argument("--path", default=str(LOCAL_STORE_PATH))
+    parser.add_argument("--index", default=INDEX_NAME)
+    parser.add_argument("--full", action="store_true", help="sync everything, ignore checkpoint")
+    parser.add_argument(
+        "--every",
+        type=float,
+        nargs="?",
+        const=SYNC_INTERVAL,
+        help="keep running and sync every N seconds",
+    )
+    args = parser.parse_args()
+
+    store = LocalStore(args.path)
+    es = None
+    full = args.full
+    try:
+        while True:
+            start = time.perf_counter()
+            try:
+                if es is None:
+                    es = connect_es()
+                stats = store.sync(es, args.index, full=full)
+            except Exception:
+                if args.every is None:
+                    raise
+                # 后台同步不因一次失败退出：检查点没有推进，下一轮重新连接后从同一位置继续
+                traceback.print_exc()
+                if es is not None:
+                    es.close()
+                    es = None
+            else:
+                print(
+                    f"Done: {stats['synced']} synced, {stats['skipped']} skipped "
+                    f"({'full' if stats['full'] else 'incremental'}) in "
+                    f"{time.perf_counter() - start:.2f}s, {store.count()} docs, "
+                    f"checkpoint {stats['checkpoint']}"
+                )
+                full = False
+            if args.every is None:
+                break
+            time.sleep(args.every)
+    finally:
+        if es is not None:
+            es.close()
+
+
+if __name__ == "__main__":
+    main()
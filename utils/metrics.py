@@ -0,0 +1,307 @@
+import bisect
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import wraps
+
+from .shared_cache import SHARED_CACHE_DIR
+
+# 每个 worker 定期把自己的指标写到 METRICS_DIR/<父进程 pid>/<pid>.json，/metrics 合并同一个
+# gunicorn master 下所有 worker 的结果；已退出的 worker 的计数保留，master 退出后整个目录被清理
+METRICS_DIR = SHARED_CACHE_DIR.with_name("xmegatron-metrics")
+METRICS_FLUSH_INTERVAL = 5  # 秒
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+BYTE_BUCKETS = tuple(1 << n for n in range(10, 28, 2))  # 1KB ~ 128MB
+COUNT_BUCKETS = (0, 1, 10, 100, 1_000, 10_000, 100_000, 1_000_000)
+
+_REGISTRY = []
+_FLUSHER = {"pid": None}
+_FLUSH_LOCK = threading.Lock()
+# 当前请求（线程或 asyncio task）内 ES 请求的累计耗时，用于从构建时间中扣除
+_ES_WALL = ContextVar("es_wall", default=None)
+
+
+class Counter:
+    kind = "counter"
+
+    def __init__(self, name, help, labels=()):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self._series = {}
+        self._lock = threading.Lock()
+        _REGISTRY.append(self)
+
+    def inc(self, amount=1, **labels):
+        _ensure_flusher()
+        key = tuple(str(labels[label]) for label in self.labels)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [0.0]
+            series[0] += amount
+
+    def snapshot(self):
+        with self._lock:
+            return {key: list(series) for key, series in self._series.items()}
+
+
+class Gauge(Counter):
+    # 合并时只累加仍在运行的 worker 的值，例如所有 worker 正在进行的请求数之和
+    kind = "gauge"
+
+    def set(self, value, **labels):
+        _ensure_flusher()
+        key = tuple(str(labels[label]) for label in self.labels)
+        with self._lock:
+            self._series[key] = [float(value)]
+
+
+class Histogram(Counter):
+    # 每个序列保存各桶（不累计）的计数、最后一个为 +Inf，以及总和；输出时再累加
+    kind = "histogram"
+
+    def __init__(self, name, help, labels=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, help, labels)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, **labels):
+        _ensure_flusher()
+        key = tuple(str(labels[label]) for label in self.labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [0.0] * (len(self.buckets) + 2)
+            series[index] += 1
+            series[-1] += value
+
+
+HTTP_SECONDS = Histogram(
+    "xmegatron_http_request_seconds",
+    "Time to handle a request, excluding compression.",
+    ("endpoint", "method", "status"),
+)
+RESPONSE_BYTES = Histogram(
+    "xmegatron_http_response_bytes",
+    "Response body size before compression.",
+    ("endpoint",),
+    BYTE_BUCKETS,
+)
+CALLBACK_SECONDS = Histogram(
+    "xmegatron_callback_seconds", "Time spent in a Dash callback.", ("output",)
+)
+CALLBACK_BYTES = Histogram(
+    "xmegatron_callback_response_bytes",
+    "Serialized size of a Dash callback response, i.e. the figures it returns.",
+    ("output",),
+    BYTE_BUCKETS,
+)
+LAYOUT_SECONDS = Histogram("xmegatron_layout_seconds", "Time to build a page layout.", ("page",))
+ES_WALL_SECONDS = Histogram(
+    "xmegatron_es_wall_seconds",
+    "Wall time of an Elasticsearch request as seen by the client; "
+    "minus xmegatron_es_took_seconds this is network and JSON decoding.",
+    ("query",),
+)
+ES_TOOK_SECONDS = Histogram(
+    "xmegatron_es_took_seconds", "Elasticsearch reported 'took' time.", ("query",)
+)
+ES_HITS = Histogram(
+    "xmegatron_es_hits", "Hits returned by one Elasticsearch request.", ("query",), COUNT_BUCKETS
+)
+ES_ERRORS = Counter("xmegatron_es_errors_total", "Failed Elasticsearch requests.", ("query",))
+ES_REJECTED = Counter(
+    "xmegatron_es_rejected_total", "Elasticsearch requests not sent because the circuit was open."
+)
+STALE_RESULTS = Counter(
+    "xmegatron_stale_results_total",
+    "Searches answered with previously fetched data because Elasticsearch failed.",
+    ("source",),
+)
+ES_POOL_SLOTS = Gauge("xmegatron_es_pool_size", "Connection slots to Elasticsearch, all workers.")
+ES_POOL_IN_FLIGHT = Gauge(
+    "xmegatron_es_pool_in_flight", "Elasticsearch requests holding a connection slot."
+)
+ES_POOL_WAIT_SECONDS = Histogram(
+    "xmegatron_es_pool_wait_seconds",
+    "Time a request waited for a free connection slot; 0 when one was free.",
+)
+ES_POOL_TIMEOUTS = Counter(
+    "xmegatron_es_pool_timeouts_total",
+    "Requests that hit their deadline while waiting for a connection slot.",
+)
+BUILD_SECONDS = Histogram(
+    "xmegatron_build_seconds",
+    "Time spent turning results into frames and figures, excluding Elasticsearch requests.",
+    ("stage",),
+)
+
+
+def observe_es(query, wall, response=None, hits=None):
+    ES_WALL_SECONDS.observe(wall, query=query)
+    took = response.get("took") if response is not None else None
+    if took is not None:
+        ES_TOOK_SECONDS.observe(took / 1000, query=query)
+    if hits is not None:
+        ES_HITS.observe(hits, query=query)
+    spent = _ES_WALL.get()
+    if spent is not None:
+        spent[0] += wall
+
+
+@contextmanager
+def build_timer(stage):
+    # 记录块内除 ES 请求之外的耗时，例如边翻页边把命中转换为 SeriesFrame
+    token = _ES_WALL.set([0.0])
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        spent = _ES_WALL.get()[0]
+        _ES_WALL.reset(token)
+        BUILD_SECONDS.observe(time.perf_counter() - start - spent, stage=stage)
+
+
+def timed(histogram, **labels):
+    def decorator(func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                histogram.observe(time.perf_counter() - start, **labels)
+
+        return wrapper
+
+    return decorator
+
+
+def snapshot():
+    return {
+        metric.name: {
+            "kind": metric.kind,
+            "help": metric.help,
+            "labels": metric.labels,
+            "buckets": getattr(metric, "buckets", None),
+            "series": [[list(key), series] for key, series in metric.snapshot().items()],
+        }
+        for metric in _REGISTRY
+    }
+
+
+def _run_dir():
+    return METRICS_DIR / str(os.getppid())
+
+
+def flush():
+    # 原子写入，/metrics 读到的要么是旧文件要么是完整的新文件
+    directory = _run_dir()
+    directory.mkdir(parents=True, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=directory, prefix=".tmp-")
+    try:
+        with os.fdopen(fd, "w") as f:
+            json.dump(snapshot(), f)
+        os.replace(tmp, directory / f"{os.getpid()}.json")
+    except BaseException:
+        os.unlink(tmp)
+        raise
+
+
+def _alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def _remove_stale_runs():
+    # 之前运行留下的目录：对应的 master 已经退出
+    for directory in METRICS_DIR.iterdir():
+        if directory.is_dir() and directory.name.isdigit() and not _alive(int(directory.name)):
+            shutil.rmtree(directory, ignore_errors=True)
+
+
+def _ensure_flusher():
+    # 在 worker 中第一次记录时启动写文件的线程；fork 之后线程不会被继承，按 pid 判断
+    if _FLUSHER["pid"] == os.getpid():
+        return
+    with _FLUSH_LOCK:
+        if _FLUSHER["pid"] == os.getpid():
+            return
+        _FLUSHER["pid"] = os.getpid()
+    threading.Thread(target=_flush_forever, name="metrics-flush", daemon=True).start()
+
+
+def _flush_forever():
+    while True:
+        time.sleep(METRICS_FLUSH_INTERVAL)
+        try:
+            flush()
+        except OSError as e:
+            print(f"Failed to write metrics: {e}")
+
+
+def _merge():
+    merged = {}
+    for path in _run_dir().glob("*.json"):
+        try:
+            metrics = json.loads(path.read_text())
+        except (OSError, ValueError):
+            continue
+        alive = _alive(int(path.stem))
+        for name, metric in metrics.items():
+            if metric["kind"] == "gauge" and not alive:
+                continue
+            target = merged.setdefault(name, dict(metric, series={}))
+            for key, series in metric["series"]:
+                current = target["series"].get(tuple(key))
+                if current is None:
+                    target["series"][tuple(key)] = series
+                else:
+                    target["series"][tuple(key)] = [a + b for a, b in zip(current, series)]
+    return merged
+
+
+def _escape(value):
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names, values, extra=()):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    pairs += [f'{name}="{value}"' for name, value in extra]
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def render():
+    # Prometheus 文本格式，包含所有 worker 的指标（先写出本进程最新的数据）
+    flush()
+    _remove_stale_runs()
+    lines = []
+    for name, metric in sorted(_merge().items()):
+        lines.append(f"# HELP {name} {metric['help']}")
+        lines.append(f"# TYPE {name} {metric['kind']}")
+        for key, series in sorted(metric["series"].items()):
+            if metric["kind"] != "histogram":
+                lines.append(f"{name}{_format_labels(metric['labels'], key)} {series[0]:.17g}")
+                continue
+            total = 0
+            bounds = [f"{bound:g}" for bound in metric["buckets"]] + ["+Inf"]
+            for bound, count in zip(bounds, series[:-1]):
+                total += count
+                labels = _format_labels(metric["labels"], key, [("le", bound)])
+                lines.append(f"{name}_bucket{labels} {total:.17g}")
+            labels = _format_labels(metric["labels"], key)
+            lines.append(f"{name}_sum{labels} {series[-1]:.17g}")
+            lines.append(f"{name}_count{labels} {total:.17g}")
+    return "\n".join(lines) + "\n"
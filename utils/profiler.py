@@ -0,0 +1,129 @@
+import cProfile
+import hmac
+import itertools
+import json
+import os
+import shutil
+import sys
+import threading
+import time
+from collections import Counter
+from datetime import datetime
+from pathlib import Path
+
+# 按需剖析：PROFILE_ALWAYS 为 True 时剖析每个 Dash 回调（layout 在 pages 的回调中执行），
+# 或者请求带上 PROFILE_HEADER 且值等于 PROFILE_TOKEN 时剖析该请求。两者都没有配置时
+# 不注册任何钩子（见 middleware.init_app），不带来任何开销
+PROFILE_ALWAYS = False
+PROFILE_HEADER = "X-Profile"
+PROFILE_TOKEN = os.environ.get("XMEGATRON_PROFILE_TOKEN")
+PROFILE_DIR = Path(__file__).resolve().parent.parent / "profiles"
+PROFILE_KEEP = 200  # 只保留最近的这么多份
+SAMPLE_INTERVAL = 0.001  # 秒，采样线程的间隔
+# 同一时刻每个进程只剖析一个请求：cProfile 在 3.12 之后不能同时启用多个，且剖析开销不应叠加
+_LOCK = threading.Lock()
+_SEQUENCE = itertools.count(1)
+
+
+def profiling_enabled():
+    return PROFILE_ALWAYS or bool(PROFILE_TOKEN)
+
+
+def requested(headers):
+    value = headers.get(PROFILE_HEADER)
+    if value is None or not PROFILE_TOKEN:
+        return False
+    return hmac.compare_digest(value.encode(), PROFILE_TOKEN.encode())
+
+
+def _frame_name(frame):
+    code = frame.f_code
+    return f"{code.co_name} ({Path(code.co_filename).name}:{code.co_firstlineno})"
+
+
+class _Sampler(threading.Thread):
+    # 定时抓取目标线程的调用栈，按 flamegraph.pl/speedscope 使用的折叠格式计数
+    def __init__(self, thread_id, interval=SAMPLE_INTERVAL):
+        super().__init__(name="profile-sampler", daemon=True)
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = Counter()
+        self._done = threading.Event()
+
+    def run(self):
+        while not self._done.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                stack.append(_frame_name(frame))
+                frame = frame.f_back
+            if stack:
+                self.stacks[";".join(reversed(stack))] += 1
+
+    def stop(self):
+        self._done.set()
+        self.join()
+
+
+class Session:
+    # 一次请求的剖析：cProfile 给出各函数的精确耗时，采样线程给出火焰图数据
+    def __init__(self):
+        self._profile = cProfile.Profile()
+        self._sampler = _Sampler(threading.get_ident())
+        self._start = None
+
+    @classmethod
+    def start(cls):
+        # 已有请求在剖析时返回 None
+        if not _LOCK.acquire(blocking=False):
+            return None
+        try:
+            session = cls()
+            session._start = time.perf_counter()
+            session._sampler.start()
+            session._profile.enable()
+        except BaseException:
+            _LOCK.release()
+            raise
+        return session
+
+    def stop(self, meta):
+        # 写出 profile.prof（pstats/snakeviz）、stacks.folded 和 meta.json，返回所在目录
+        try:
+            self._profile.disable()
+            elapsed = time.perf_counter() - self._start
+            self._sampler.stop()
+        finally:
+            _LOCK.release()
+        n = next(_SEQUENCE)
+        stamp = datetime.now().strftime("%Y%m%d-%H%M%S")
+        directory = PROFILE_DIR / f"{stamp}-{os.getpid()}-{n}"
+        directory.mkdir(parents=True, exist_ok=True)
+        self._profile.dump_stats(directory / "profile.prof")
+        with open(directory / "stacks.folded", "w") as f:
+            for stack, count in self._sampler.stacks.most_common():
+                f.write(f"{stack} {count}\n")
+        meta = dict(
+            meta,
+            elapsed=elapsed,
+            samples=sum(self._sampler.stacks.values()),
+            sample_interval=self._sampler.interval,
+        )
+        with open(directory / "meta.json", "w") as f:
+            json.dump(meta, f, indent=2, ensure_ascii=False, default=str)
+        _prune()
+        return directory
+
+    def abort(self):
+        # 请求异常结束、没有响应时只停止剖析，不写文件
+        try:
+            self._profile.disable()
+            self._sampler.stop()
+        finally:
+            _LOCK.release()
+
+
+def _prune():
+    directories = sorted(path for path in PROFILE_DIR.iterdir() if path.is_dir())
+    for path in directories[:-PROFILE_KEEP]:
+        shutil.rmtree(path, ignore_errors=True)
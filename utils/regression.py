@@ -0,0 +1,218 @@
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+from .dates import DateDecoder
+from .series import VALUE_FIELDS
+
+WINDOW = 50  # 滚动基线的长度（点数），每个点与它之前 WINDOW 个点的中位数比较
+CUSUM_K = 1.0  # 允许的漂移，单位是稳健标准差；只关心 2 倍标准差以上的变化
+CUSUM_H = 5.0  # 报警阈值；在没有变化的均匀噪声上约每 5 万个点误报一次
+MIN_REL_SHIFT = 0.005  # 相对基线的变化小于 0.5% 时不报
+SCALE_FLOOR = 1e-3  # 稳健标准差的下限（相对基线），数据几乎不变时避免除以 0
+MAD_TO_STD = 1.4826
+# acc 是前十步 loss 均值，越大越差；perf 是吞吐，越小越差
+HIGHER_IS_WORSE = {"acc": True, "perf": False}
+WARMUP = 4 * WINDOW  # 增量检测开始前，从 ES 回放每个模型最近的这么多条数据恢复状态
+_BLOCK = 1 << 16
+_CHUNK = 4096  # update() 每次处理的点数；报警后只需重算当前这一段
+
+
+def verdict_fields(field):
+    # 检测结果与数据存放在同一个文档里
+    return f"{field}_verdict", f"{field}_score", f"{field}_baseline"
+
+
+def verdict_mapping(fields=VALUE_FIELDS):
+    properties = {}
+    for field in fields:
+        verdict, score, baseline = verdict_fields(field)
+        properties[verdict] = {"type": "keyword"}
+        properties[score] = {"type": "float"}
+        properties[baseline] = {"type": "float"}
+    return properties
+
+
+def rolling_baseline(x, start, window=WINDOW):
+    # x[start:] 中每个点之前 window 个点的中位数和稳健标准差（1.4826 * MAD），历史不足的点为 NaN。
+    # 分块计算，避免一次性展开 n * window 的临时数组
+    n = len(x) - start
+    med = np.full(n, np.nan)
+    scale = np.full(n, np.nan)
+    first = max(start, window)
+    if first < len(x):
+        windows = sliding_window_view(x[:-1], window)[first - window :]
+        offset = first - start
+        for lo in range(0, len(windows), _BLOCK):
+            block = windows[lo : lo + _BLOCK]
+            m = np.median(block, axis=1)
+            med[offset + lo : offset + lo + len(block)] = m
+            mad = np.median(np.abs(block - m[:, None]), axis=1)
+            scale[offset + lo : offset + lo + len(block)] = MAD_TO_STD * mad
+    return med, np.maximum(scale, np.abs(med) * SCALE_FLOOR)
+
+
+def cusum(d, s0=0.0, h=CUSUM_H):
+    # 单侧 CUSUM：S_i = max(0, S_{i-1} + d_i)。令 C 为从 s0 开始的累加和，
+    # 则 S_i = C_i - min(0, min_{j<=i} C_j)，可以用 cumsum/minimum.accumulate 向量化。
+    # 返回第一次超过 h 的位置（没有则为 -1）以及到该位置为止的 S
+    c = s0 + np.cumsum(d)
+    s = c - np.minimum(np.minimum.accumulate(c), 0.0)
+    alarms = np.flatnonzero(s > h)
+    if len(alarms):
+        return int(alarms[0]), s[: alarms[0] + 1]
+    return -1, s
+
+
+class _Run:
+    # 一个方向上尚未报警的 CUSUM 累积：当前值、变化起点的文档及其基线，以及起点以来的值之和
+    __slots__ = ("s", "start", "baseline", "scale", "total", "count")
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.s = 0.0
+        self.start = None
+        self.baseline = self.scale = np.nan
+        self.total = 0.0
+        self.count = 0
+
+    def advance(self, s, values, ids, med, scale):
+        # 用本段的 S 更新起点：起点是 S 最后一次为 0 之后的第一个点，本段中没有 0 时沿用之前的起点
+        zeros = np.flatnonzero(s == 0)
+        if len(zeros):
+            k = zeros[-1] + 1
+        elif self.s == 0:
+            k = 0
+        else:
+            k = None
+        if k is None:
+            self.total += values.sum()
+            self.count += len(values)
+        elif k < len(values):
+            self.start, self.baseline, self.scale = ids[k], med[k], scale[k]
+            self.total, self.count = values[k:].sum(), len(values) - k
+        else:
+            self.start, self.total, self.count = None, 0.0, 0
+        self.s = float(s[-1]) if len(s) else self.s
+
+
+class _Track:
+    # 每个 (模型类型, 字段) 一份状态：最近 WINDOW 个值作为基线，以及上下两个方向的 CUSUM
+    __slots__ = ("tail", "up", "down")
+
+    def __init__(self):
+        self.tail = np.empty(0)
+        self.up = _Run()
+        self.down = _Run()
+
+
+class RegressionDetector:
+    # 在入库时增量检测：新数据按时间顺序送入 update()，只计算新点，历史只保留 O(WINDOW) 的状态。
+    # 报警时把变化起点（最可能引入问题的那次 commit）标记为 regression / improvement
+    def __init__(self, fields=VALUE_FIELDS, window=WINDOW):
+        self.fields = tuple(fields)
+        self.window = window
+        self._tracks = {}
+        self._dates = DateDecoder()
+
+    def update(self, model_type, field, values, ids):
+        # values 按时间升序；返回 [(doc_id, verdict)]，doc_id 可能是之前批次中的文档
+        track = self._tracks.setdefault((model_type, field), _Track())
+        values = np.asarray(values, dtype=np.float64)
+        flags = []
+        pos = 0
+        while pos < len(values):
+            stop = min(pos + _CHUNK, len(values))
+            chunk = values[pos:stop]
+            chunk_ids = ids[pos:stop]
+            x = np.concatenate([track.tail, chunk])
+            med, scale = rolling_baseline(x, len(track.tail), self.window)
+            z = (chunk - med) / scale
+            # 报警后基线重新积累期间没有基线，不累积证据
+            z[~np.isfinite(z)] = 0.0
+
+            up_at, up_s = cusum(z - CUSUM_K, track.up.s)
+            down_at, down_s = cusum(-z - CUSUM_K, track.down.s)
+            alarms = [
+                (at, run, s)
+                for at, run, s in ((up_at, track.up, up_s), (down_at, track.down, down_s))
+                if at >= 0
+            ]
+            if not alarms:
+                track.up.advance(up_s, chunk, chunk_ids, med, scale)
+                track.down.advance(down_s, chunk, chunk_ids, med, scale)
+                track.tail = x[-self.window :]
+                pos = stop
+                continue
+
+            at, run, s = min(alarms, key=lambda alarm: alarm[0])
+            run.advance(s, chunk[: at + 1], chunk_ids[: at + 1], med, scale)
+            flag = self._verdict(field, run)
+            if flag is not None:
+                flags.append(flag)
+            # 变化之后的点组成新的基线，两个方向都从 0 重新累积
+            tail_len = min(run.count, at + 1, self.window)
+            track.tail = chunk[at + 1 - tail_len : at + 1]
+            track.up.reset()
+            track.down.reset()
+            pos += at + 1
+        return flags
+
+    def _verdict(self, field, run):
+        if run.start is None or not run.count:
+            return None
+        shift = run.total / run.count - run.baseline
+        if abs(shift) < MIN_REL_SHIFT * abs(run.baseline):
+            return None
+        worse = (shift > 0) == HIGHER_IS_WORSE.get(field, True)
+        verdict, score, baseline = verdict_fields(field)
+        return run.start, {
+            verdict: "regression" if worse else "improvement",
+            score: round(float(shift / run.scale), 3),
+            baseline: float(run.baseline),
+        }
+
+    def annotate(self, docs, ids):
+        # 对一批文档按模型、按时间排序后检测，结果直接写入本批文档；
+        # 变化起点在之前批次中的，返回 {doc_id: 字段} 由调用方更新
+        millis = self._dates.to_millis([doc["created_at"] for doc in docs])
+        models = np.array([doc["model_type"] for doc in docs], dtype=object)
+        by_id = dict(zip(ids, docs))
+        earlier = {}
+        for model_type in dict.fromkeys(models.tolist()):
+            index = np.flatnonzero(models == model_type)
+            index = index[np.argsort(millis[index], kind="stable")]
+            model_ids = [ids[i] for i in index]
+            for field in self.fields:
+                values = np.array([docs[i][field] for i in index], dtype=np.float64)
+                for doc_id, verdict in self.update(model_type, field, values, model_ids):
+                    target = by_id.get(doc_id)
+                    if target is None:
+                        earlier.setdefault(doc_id, {}).update(verdict)
+                    else:
+                        target.update(verdict)
+        return earlier
+
+    def warm_up(self, es, index_name, model_types):
+        # 回放每个模型最近 WARMUP 条数据恢复基线和 CUSUM 状态，期间的报警不再重复写入
+        for model_type in model_types:
+            response = es.search(
+                index=index_name,
+                query={"term": {"model_type.raw": model_type}},
+                sort=[{"created_at": {"order": "desc"}}],
+                size=WARMUP,
+                _source=list(self.fields),
+                filter_path=["hits.hits._id", "hits.hits._source"],
+            )
+            hits = response.get("hits", {}).get("hits", [])[::-1]
+            self.replay(
+                model_type,
+                [hit["_id"] for hit in hits],
+                {field: [hit["_source"][field] for hit in hits] for field in self.fields},
+            )
+
+    def replay(self, model_type, ids, columns):
+        # ids 和 columns（{field: values}）按时间升序，来源可以是 ES 或本地存储
+        for field in self.fields:
+            self.update(model_type, field, columns[field], ids)
@@ -0,0 +1,148 @@
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from elastic_transport import TransportError
+from elasticsearch import ApiError
+
+# ES 连续失败这么多次后熔断，BREAKER_RESET 秒后放行一个试探请求，成功则恢复
+BREAKER_FAILURES = 5
+BREAKER_RESET = 30.0  # 秒
+LAST_GOOD_SIZE = 64
+# 当前请求（线程或 asyncio task）的截止时刻，time.monotonic() 的值；None 表示不限
+_DEADLINE = ContextVar("deadline", default=None)
+
+
+class DeadlineExceeded(Exception):
+    pass
+
+
+class CircuitOpen(Exception):
+    pass
+
+
+def set_deadline(seconds):
+    # 返回的 token 交给 reset_deadline；seconds 为 None 时不设置截止时间
+    if seconds is None:
+        return _DEADLINE.set(None)
+    return _DEADLINE.set(time.monotonic() + seconds)
+
+
+def reset_deadline(token):
+    _DEADLINE.reset(token)
+
+
+@contextmanager
+def deadline(seconds):
+    # 已有更早的截止时间时以较早的为准
+    current = _DEADLINE.get()
+    at = None if seconds is None else time.monotonic() + seconds
+    if current is not None and (at is None or current < at):
+        at = current
+    token = _DEADLINE.set(at)
+    try:
+        yield
+    finally:
+        _DEADLINE.reset(token)
+
+
+def time_left():
+    # 剩余的秒数，没有截止时间时为 None；已经超时则抛出 DeadlineExceeded
+    at = _DEADLINE.get()
+    if at is None:
+        return None
+    left = at - time.monotonic()
+    if left <= 0:
+        raise DeadlineExceeded("request deadline exceeded")
+    return left
+
+
+def is_outage(exc):
+    # 连接失败、超时和 5xx/429 说明 ES 不可用；404、400 等是请求本身的问题，
+    # 本地代码的错误（AttributeError 等）也不计入熔断
+    if isinstance(exc, (DeadlineExceeded, TimeoutError, TransportError)):
+        return True
+    if isinstance(exc, ApiError):
+        return exc.status_code >= 500 or exc.status_code == 429
+    return False
+
+
+class CircuitBreaker:
+    # closed：正常放行；open：直接失败，不占用线程等待超时；half_open：只放行一个试探请求
+    def __init__(self, name, failures=BREAKER_FAILURES, reset_after=BREAKER_RESET):
+        self.name = name
+        self.failures = failures
+        self.reset_after = reset_after
+        self._lock = threading.Lock()
+        self._state = "closed"
+        self._consecutive = 0
+        self._opened_at = None
+        self._trial = False
+        self._stats = {"opened": 0, "rejected": 0}
+
+    @property
+    def state(self):
+        return self._state
+
+    def before_call(self):
+        with self._lock:
+            if self._state == "closed":
+                return
+            if self._state == "open" and time.monotonic() - self._opened_at >= self.reset_after:
+                self._state = "half_open"
+            if self._state == "half_open" and not self._trial:
+                self._trial = True
+                return
+            self._stats["rejected"] += 1
+        raise CircuitOpen(f"{self.name} circuit is open")
+
+    def success(self):
+        with self._lock:
+            if self._state != "closed":
+                print(f"{self.name} circuit closed.")
+            self._state = "closed"
+            self._consecutive = 0
+            self._trial = False
+
+    def failure(self, exc):
+        if not is_outage(exc):
+            self.success()
+            return
+        with self._lock:
+            self._consecutive += 1
+            self._trial = False
+            if self._state == "half_open" or (
+                self._state == "closed" and self._consecutive >= self.failures
+            ):
+                self._state = "open"
+                self._opened_at = time.monotonic()
+                self._stats["opened"] += 1
+                print(f"{self.name} circuit opened after {self._consecutive} failure(s): {exc!r}")
+
+    def stats(self):
+        with self._lock:
+            return dict(self._stats, state=self._state, consecutive_failures=self._consecutive)
+
+
+class LastGood:
+    # 最近一次成功的查询结果，查询失败时作为旧数据返回
+    def __init__(self, size=LAST_GOOD_SIZE):
+        self.size = size
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+
+    def put(self, key, value):
+        with self._lock:
+            self._items[key] = value
+            self._items.move_to_end(key)
+            while len(self._items) > self.size:
+                self._items.popitem(last=False)
+
+    def get(self, key):
+        with self._lock:
+            value = self._items.get(key)
+            if value is not None:
+                self._items.move_to_end(key)
+            return value
@@ -0,0 +1,221 @@
+import argparse
+import time
+import traceback
+
+from elasticsearch import NotFoundError
+from elasticsearch.helpers import bulk
+
+from .init_es import INDEX_NAME, TIME_ZONE, connect_es
+from .series import VALUE_FIELDS
+from .shared_cache import bump_generation
+
+ROLLUP_SUFFIX = "_daily"
+ROLLUP_INDEX = INDEX_NAME + ROLLUP_SUFFIX
+CHECKPOINT_ID = "_checkpoint"
+# 入库时间与文档可见之间有延迟（refresh），每次多回看一段，重算同一天是幂等的
+ROLLUP_LAG_MS = 5 * 60 * 1000
+COMPOSITE_SIZE = 1000
+DAYS_PER_QUERY = 50
+# --every 不带参数时的更新间隔（秒）；检查点之后的数据由查询端在原始索引上补齐，间隔只影响开销
+ROLLUP_INTERVAL = 600
+INGESTED_AT_MAPPING = {"ingested_at": {"type": "date", "format": "epoch_millis"}}
+DATE_FORMAT = "EEE MMM d HH:mm:ss yyyy Z||yyyy-MM-dd HH:mm:ss||yyyy-MM-dd||epoch_millis"
+
+
+def rollup_mapping(fields=VALUE_FIELDS):
+    # 每天每种模型一个文档；sum 用于在更粗的时间粒度上重新求平均
+    properties = {
+        "day": {"type": "date", "format": DATE_FORMAT},
+        "model_type": {"type": "keyword"},
+        "count": {"type": "long"},
+        "checkpoint": {"type": "date", "format": "epoch_millis"},
+    }
+    for field in fields:
+        for stat in ("min", "max", "avg", "sum"):
+            properties[f"{field}_{stat}"] = {"type": "double"}
+    return {
+        "mappings": {"properties": properties},
+        "settings": {"number_of_shards": 1, "number_of_replicas": 0},
+    }
+
+
+def create_rollup_index(es, rollup_index=ROLLUP_INDEX):
+    if not es.indices.exists(index=rollup_index):
+        es.indices.create(index=rollup_index, body=rollup_mapping())
+        print(f"Index '{rollup_index}' created.")
+
+
+def read_checkpoint(es, rollup_index=ROLLUP_INDEX):
+    try:
+        return es.get(index=rollup_index, id=CHECKPOINT_ID)["_source"]["checkpoint"]
+    except NotFoundError:
+        return None
+
+
+def _composite(es, index_name, query, aggs):
+    # composite 聚合按 (天, 模型) 分页遍历，天按 TIME_ZONE 的自然日切分
+    body = {
+        "query": query,
+        "size": 0,
+        "aggs": {
+            "days": {
+                "composite": {
+                    "size": COMPOSITE_SIZE,
+                    "sources": [
+                        {
+                            "day": {
+                                "date_histogram": {
+                                    "field": "created_at",
+                                    "calendar_interval": "1d",
+                                    "time_zone": TIME_ZONE,
+                                }
+                            }
+                        },
+                        {"model_type": {"terms": {"field": "model_type.raw"}}},
+                    ],
+                },
+                "aggs": aggs,
+            }
+        },
+    }
+    while True:
+        response = es.search(index=index_name, body=body)
+        result = response["aggregations"]["days"]
+        yield from result["buckets"]
+        if "after_key" not in result or len(result["buckets"]) < COMPOSITE_SIZE:
+            break
+        body["aggs"]["days"]["composite"]["after"] = result["after_key"]
+
+
+def _day_aggs(fields):
+    return {field: {"stats": {"field": field}} for field in fields}
+
+
+def _rollup_doc(bucket, fields):
+    doc = {
+        "day": bucket["key"]["day"],
+        "model_type": bucket["key"]["model_type"],
+        "count": bucket["doc_count"],
+    }
+    for field in fields:
+        stats = bucket[field]
+        doc.update(
+            {
+                f"{field}_min": stats["min"],
+                f"{field}_max": stats["max"],
+                f"{field}_avg": stats["avg"],
+                f"{field}_sum": stats["sum"],
+            }
+        )
+    return doc
+
+
+def changed_days(es, index_name, since):
+    # 只看 since 之后入库的文档，找出受影响的自然日（毫秒时间戳）以及其中最大的入库时间
+    query = {"range": {"ingested_at": {"gt": since - ROLLUP_LAG_MS}}}
+    days, latest = set(), since
+    for bucket in _composite(
+        es, index_name, query, {"ingested": {"max": {"field": "ingested_at"}}}
+    ):
+        days.add(bucket["key"]["day"])
+        latest = max(latest, int(bucket["ingested"]["value"] or since))
+    return sorted(days), latest
+
+
+def update_rollup(es, index_name=INDEX_NAME, rollup_index=None, full=False):
+    # 增量更新：从检查点之后入库的文档找出受影响的天，整天重算；
+    # 没有检查点或 full=True 时全量重建
+    rollup_index = rollup_index or index_name + ROLLUP_SUFFIX
+    create_rollup_index(es, rollup_index)
+    checkpoint = None if full else read_checkpoint(es, rollup_index)
+    started = int(time.time() * 1000)
+    if checkpoint is None:
+        queries = [{"match_all": {}}]
+        latest = started
+    else:
+        days, latest = changed_days(es, index_name, checkpoint)
+        queries = [
+            {
+                "bool": {
+                    "should": [
+                        {
+                            "range": {
+                                "created_at": {
+                                    "gte": day,
+                                    "lt": day + 86_400_000,
+                                    "format": "epoch_millis",
+                                }
+                            }
+                        }
+                        for day in days[i : i + DAYS_PER_QUERY]
+                    ]
+                }
+            }
+            for i in range(0, len(days), DAYS_PER_QUERY)
+        ]
+
+    def actions():
+        for query in queries:
+            for bucket in _composite(es, index_name, query, _day_aggs(VALUE_FIELDS)):
+                doc = _rollup_doc(bucket, VALUE_FIELDS)
+                yield {
+                    "_index": rollup_index,
+                    "_id": f"{doc['model_type']}|{doc['day']}",
+                    "_source": doc,
+                }
+
+    written, _ = bulk(es, actions())
+    es.index(index=rollup_index, id=CHECKPOINT_ID, document={"checkpoint": latest})
+    es.indices.refresh(index=rollup_index)
+    bump_generation()
+    return {"rollup_docs": written, "checkpoint": latest, "full": checkpoint is None}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Update the daily rollup index.")
+    parser.add_argument("--index", default=INDEX_NAME)
+    parser.add_argument("--rollup-index", help=f"defaults to <index>{ROLLUP_SUFFIX}")
+    parser.add_argument("--full", action="store_true", help="rebuild every day from scratch")
+    parser.add_argument(
+        "--every",
+        type=float,
+        nargs="?",
+        const=ROLLUP_INTERVAL,
+        help="keep running and update every N seconds",
+    )
+    args = parser.parse_args()
+
+    es = None
+    full = args.full
+    try:
+        while True:
+            start = time.perf_counter()
+            try:
+                if es is None:
+                    es = connect_es()
+                stats = update_rollup(es, args.index, args.rollup_index, full=full)
+            except Exception:
+                if args.every is None:
+                    raise
+                # 后台运行时不因 ES 暂时不可用而退出：检查点没有推进，下一轮重新连接后补上
+                traceback.print_exc()
+                if es is not None:
+                    es.close()
+                    es = None
+            else:
+                print(
+                    f"Done: {stats['rollup_docs']} rollup docs written "
+                    f"({'full' if stats['full'] else 'incremental'}) in "
+                    f"{time.perf_counter() - start:.2f}s, checkpoint {stats['checkpoint']}"
+                )
+                full = False
+            if args.every is None:
+                break
+            time.sleep(args.every)
+    finally:
+        if es is not None:
+            es.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,162 @@
+from array import array
+from datetime import datetime
+
+import numpy as np
+import pytz
+
+MODEL_TYPES = ("Dense", "MoE")
+COMMIT_FIELDS = ("xmlir_commit", "llm_commit", "mextension_commit", "mcore_commit")
+CATEGORY_FIELDS = ("model_type", "trigger_repo") + COMMIT_FIELDS
+VALUE_FIELDS = ("acc", "perf")
+
+
+def band_fields(fields=VALUE_FIELDS):
+    # 聚合模式下每个时间桶额外携带的列
+    return tuple(f"{field}_{stat}" for field in fields for stat in ("min", "max")) + ("count",)
+
+
+class SeriesFrame:
+    # 列式结果：ts 为毫秒时间戳（升序），数值列为连续的 numpy 数组，
+    # 模型类型和 commit 等字符串列存为 (codes, categories)，每个不同的值只保存一份。
+    def __init__(self, ts, values, categories=None):
+        self.ts = ts
+        self.values = values
+        self.categories = categories or {}
+        # ES 不可用时返回的是之前缓存的结果，页面据此提示数据可能不是最新的
+        self.stale = False
+
+    @classmethod
+    def empty(cls, fields=VALUE_FIELDS, aggregated=False):
+        fields = tuple(fields) + (band_fields(fields) if aggregated else ())
+        return cls(
+            np.empty(0, dtype=np.int64),
+            {field: np.empty(0, dtype=np.float64) for field in fields},
+            {
+                field: (np.empty(0, dtype=np.int32), np.array([], dtype=object))
+                for field in CATEGORY_FIELDS
+            },
+        )
+
+    def __len__(self):
+        return len(self.ts)
+
+    def __getitem__(self, field):
+        return self.values[field]
+
+    @property
+    def aggregated(self):
+        return "count" in self.values
+
+    def as_stale(self):
+        # 共享同一份数据的浅拷贝
+        frame = SeriesFrame(self.ts, self.values, self.categories)
+        frame.stale = True
+        return frame
+
+    def take(self, index):
+        # index 为切片时 numpy 返回视图，不复制数据
+        return SeriesFrame(
+            self.ts[index],
+            {field: column[index] for field, column in self.values.items()},
+            {field: (codes[index], labels) for field, (codes, labels) in self.categories.items()},
+        )
+
+    def between(self, lo, hi):
+        start = np.searchsorted(self.ts, lo, side="left")
+        stop = np.searchsorted(self.ts, hi, side="right")
+        return self.take(slice(start, stop))
+
+    def model(self, model_type):
+        codes, labels = self.categories["model_type"]
+        matches = np.flatnonzero(labels == model_type)
+        if len(matches) == 0:
+            return self.take(slice(0, 0))
+        return self.take(codes == matches[0])
+
+    def labels(self, field):
+        codes, labels = self.categories[field]
+        return labels[codes]
+
+    def dates(self, time_zone):
+        # Plotly 按字面时间显示日期，这里直接转换成目标时区的本地时间
+        offset = pytz.timezone(time_zone).utcoffset(datetime.now()).total_seconds()
+        return (self.ts + int(offset * 1000)).astype("datetime64[ms]")
+
+    def hover_data(self, fields=("trigger_repo",) + COMMIT_FIELDS):
+        if not len(self):
+            return np.empty((0, len(fields)), dtype=object)
+        return np.column_stack([self.labels(field) for field in fields])
+
+    @classmethod
+    def concat(cls, frames):
+        frames = list(frames)
+        if not any(len(frame) for frame in frames):
+            # 全部为空时保留第一个的字段（例如聚合结果的 band 字段）
+            return frames[0] if frames else cls.empty()
+        frames = [frame for frame in frames if len(frame)]
+        if len(frames) == 1:
+            return frames[0]
+        ts = np.concatenate([frame.ts for frame in frames])
+        order = np.argsort(ts, kind="stable")
+        values = {
+            field: np.concatenate([frame.values[field] for frame in frames])[order]
+            for field in frames[0].values
+        }
+        categories = {}
+        for field in frames[0].categories:
+            # 合并各自的类别表，并把 codes 重新映射到合并后的表上
+            merged = {}
+            codes = []
+            for frame in frames:
+                frame_codes, frame_labels = frame.categories[field]
+                remap = np.array(
+                    [merged.setdefault(label, len(merged)) for label in frame_labels],
+                    dtype=np.int32,
+                )
+                codes.append(remap[frame_codes] if len(remap) else frame_codes)
+            labels = np.empty(len(merged), dtype=object)
+            labels[:] = list(merged)
+            categories[field] = (np.concatenate(codes)[order], labels)
+        return cls(ts[order], values, categories)
+
+
+class FrameBuilder:
+    # 逐条追加文档并在 build() 时一次性转为 numpy 数组；字符串列边追加边编码，
+    # formatters 只对每个不同的类别值调用一次。
+    def __init__(self, fields=VALUE_FIELDS, formatters=None):
+        self.formatters = formatters or {}
+        self._ts = array("q")
+        self._values = {field: array("d") for field in fields}
+        self._codes = {field: array("i") for field in CATEGORY_FIELDS}
+        self._lookup = {field: {} for field in CATEGORY_FIELDS}
+
+    def __len__(self):
+        return len(self._ts)
+
+    def append(self, ts, doc):
+        self._ts.append(ts)
+        for field, column in self._values.items():
+            column.append(doc[field])
+        for field, column in self._codes.items():
+            lookup = self._lookup[field]
+            label = doc[field]
+            code = lookup.get(label)
+            if code is None:
+                code = lookup[label] = len(lookup)
+            column.append(code)
+
+    def build(self):
+        categories = {}
+        for field, lookup in self._lookup.items():
+            formatter = self.formatters.get(field)
+            labels = np.empty(len(lookup), dtype=object)
+            labels[:] = [formatter(label) for label in lookup] if formatter else list(lookup)
+            categories[field] = (np.frombuffer(self._codes[field], dtype=np.int32), labels)
+        return SeriesFrame(
+            np.frombuffer(self._ts, dtype=np.int64),
+            {
+                field: np.frombuffer(column, dtype=np.float64)
+                for field, column in self._values.items()
+            },
+            categories,
+        )
@@ -0,0 +1,208 @@
+import fcntl
+import hashlib
+import json
+import mmap
+import os
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+import numpy as np
+
+from .resilience import time_left
+from .series import SeriesFrame
+
+# 同一台机器上的所有 gunicorn worker 共用一个目录；优先放在 tmpfs 上，读写都不落盘
+SHARED_CACHE_DIR = (
+    Path("/dev/shm" if os.path.isdir("/dev/shm") else tempfile.gettempdir()) / "xmegatron-cache"
+)
+SHARED_CACHE_MAX_BYTES = 1 << 30
+# 目录在进程重启、重新部署后仍然存在；入库和预聚合完成后更新该文件的修改时间（代数），
+# 之前写入的条目全部不再命中，回填的数据随即可见
+GENERATION_FILE = "generation"
+LOCK_POLL = 0.05  # 秒，有截止时间时轮询等待锁的间隔
+_ALIGN = 64
+_HEADER = np.dtype("<u8")
+
+
+def bump_generation(directory=SHARED_CACHE_DIR):
+    directory = Path(directory)
+    directory.mkdir(parents=True, exist_ok=True)
+    path = directory / GENERATION_FILE
+    path.touch()
+    os.utime(path)
+
+
+def _pad(offset):
+    return (offset + _ALIGN - 1) // _ALIGN * _ALIGN
+
+
+def write_frame(path, frame, meta=None):
+    # 文件格式：8 字节头长度 + JSON 头（各列的偏移、类型、长度，类别值和 meta）+ 按 64 字节对齐的各列数据。
+    # 先写临时文件再 os.replace，读者要么看到旧文件要么看到完整的新文件
+    arrays = [("ts", frame.ts)]
+    arrays += [(f"values/{field}", column) for field, column in frame.values.items()]
+    arrays += [(f"codes/{field}", codes) for field, (codes, _) in frame.categories.items()]
+    header = {
+        "columns": {},
+        "labels": {field: labels.tolist() for field, (_, labels) in frame.categories.items()},
+        "meta": meta or {},
+    }
+    offset = 0
+    for name, array in arrays:
+        header["columns"][name] = [offset, array.dtype.str, len(array)]
+        offset = _pad(offset + array.nbytes)
+    encoded = json.dumps(header).encode()
+    start = _pad(_HEADER.itemsize + len(encoded))
+
+    fd, tmp = tempfile.mkstemp(dir=path.parent, prefix=".tmp-")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(np.array(len(encoded), dtype=_HEADER).tobytes())
+            f.write(encoded)
+            for name, array in arrays:
+                f.seek(start + header["columns"][name][0])
+                f.write(np.ascontiguousarray(array).tobytes())
+            f.truncate(start + offset)
+        os.replace(tmp, path)
+    except BaseException:
+        os.unlink(tmp)
+        raise
+
+
+def read_frame(path):
+    # 各列直接映射到文件上（只读），多个 worker 读取同一条目时共享同一份页缓存
+    with open(path, "rb") as f:
+        buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    size = int(np.frombuffer(buffer, dtype=_HEADER, count=1)[0])
+    header = json.loads(buffer[_HEADER.itemsize : _HEADER.itemsize + size])
+    start = _pad(_HEADER.itemsize + size)
+
+    def column(name):
+        offset, dtype, length = header["columns"][name]
+        return np.frombuffer(buffer, dtype=dtype, count=length, offset=start + offset)
+
+    categories = {}
+    for field, labels in header["labels"].items():
+        array = np.empty(len(labels), dtype=object)
+        array[:] = labels
+        categories[field] = (column(f"codes/{field}"), array)
+    values = {
+        name.split("/", 1)[1]: column(name)
+        for name in header["columns"]
+        if name.startswith("values/")
+    }
+    return SeriesFrame(column("ts"), values, categories), header["meta"]
+
+
+class SharedFrameCache:
+    # 跨进程共享的 SeriesFrame 缓存：每个 key 一个文件，用同名 .lock 文件上的 flock 保证
+    # 同一时刻只有一个 worker（或线程）刷新某个 key，其他 worker 直接读取它写入的结果
+    def __init__(self, directory=SHARED_CACHE_DIR, max_bytes=SHARED_CACHE_MAX_BYTES):
+        self.directory = Path(directory)
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "stale_hits": 0, "waits": 0, "fetches": 0, "evictions": 0}
+
+    def get(self, key, fetch, ttl=None):
+        # fetch() 返回 (frame, meta)；ttl 为 None 时条目不过期，只会因为容量被淘汰。
+        # 另一个 worker 正在刷新时，有旧数据就先返回旧数据，没有则等待它完成
+        path = self._path(key)
+        entry = self._load(path, ttl)
+        if entry is not None:
+            self._count("hits")
+            return entry
+        with open(path.with_suffix(".lock"), "a+") as lock:
+            try:
+                fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                stale = self._load(path, None)
+                if stale is not None:
+                    self._count("stale_hits")
+                    return stale
+                self._count("waits")
+                self._wait(lock)
+            # 拿到锁时别的 worker 可能刚刚写完
+            entry = self._load(path, ttl)
+            if entry is not None:
+                self._count("hits")
+                return entry
+            frame, meta = fetch()
+            write_frame(path, frame, meta)
+            self._count("fetches")
+        self._evict()
+        return read_frame(path)
+
+    @staticmethod
+    def _wait(lock):
+        # 请求有截止时间时不无限等待另一个 worker 的慢查询，超时抛出 DeadlineExceeded
+        if time_left() is None:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            return
+        while True:
+            try:
+                fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                return
+            except BlockingIOError:
+                time.sleep(min(LOCK_POLL, time_left()))
+
+    def stats(self):
+        with self._lock:
+            return dict(self._stats)
+
+    def generation(self):
+        try:
+            return (self.directory / GENERATION_FILE).stat().st_mtime_ns
+        except FileNotFoundError:
+            return 0
+
+    def clear(self):
+        for path in self.directory.glob("*.frame"):
+            path.unlink(missing_ok=True)
+
+    def _path(self, key):
+        self.directory.mkdir(parents=True, exist_ok=True)
+        digest = hashlib.sha1(repr((self.generation(), key)).encode()).hexdigest()
+        return self.directory / f"{digest}.frame"
+
+    def _load(self, path, ttl):
+        try:
+            if ttl is not None and time.time() - path.stat().st_mtime > ttl:
+                return None
+            return read_frame(path)
+        except (FileNotFoundError, ValueError):
+            # 不存在，或者是损坏的文件（例如进程在 os.replace 之前被杀）
+            return None
+
+    def _count(self, name):
+        with self._lock:
+            self._stats[name] += 1
+
+    def _evict(self):
+        # 总大小超过 max_bytes 时按写入时间从旧到新删除；正在被映射的文件删除后仍然可读
+        entries = []
+        for path in self.directory.glob("*.frame"):
+            try:
+                stat = path.stat()
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            path.unlink(missing_ok=True)
+            self._remove_lock(path.with_suffix(".lock"))
+            total -= size
+            self._count("evictions")
+
+    @staticmethod
+    def _remove_lock(path):
+        # 只删除没有人持有的锁文件
+        try:
+            with open(path, "a+") as lock:
+                fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                path.unlink(missing_ok=True)
+        except (BlockingIOError, FileNotFoundError):
+            pass
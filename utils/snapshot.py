@@ -0,0 +1,170 @@
+import threading
+import time
+import traceback
+from datetime import datetime, timedelta
+
+import pytz
+
+from .es_utils import (
+    DATE_FMT,
+    INDEX_NAME,
+    SHARED_CACHE,
+    TIME_ZONE,
+    _to_millis,
+    search_data,
+    search_flags,
+)
+from .resilience import deadline
+from .series import VALUE_FIELDS
+
+# 比日期选择器默认的 30 天更宽：页面加载时整段发给浏览器，范围落在其中时直接在浏览器端过滤；
+# 不超过 RAW_SPAN_LIMIT，保证快照里是原始点
+DEFAULT_WINDOW_DAYS = 60
+SNAPSHOT_INTERVAL = 60  # 秒
+# 快照超过这么多个刷新周期没有更新，视为过期：页面提示数据不是最新的，就绪检查失败
+SNAPSHOT_STALE_AFTER = 3
+# 一次刷新最多等待 ES 的时间，超时后保留上一次的快照
+SNAPSHOT_DEADLINE = 30  # 秒
+# 快照同时保存这些字段的变化点标记，页面 layout 不再为它们查询 ES
+SNAPSHOT_FLAG_FIELDS = ("acc", "perf")
+
+
+class Snapshot:
+    # 后台线程定期刷新最近 DEFAULT_WINDOW_DAYS 天的数据，页面 layout 和落在窗口内的查询直接读内存
+    def __init__(self, index_name=INDEX_NAME, days=DEFAULT_WINDOW_DAYS, interval=SNAPSHOT_INTERVAL):
+        self.index_name = index_name
+        self.days = days
+        self.interval = interval
+        self._data = None
+        self._window = None
+        self._flags = {}
+        self._refreshed_at = None
+        self._lock = threading.Lock()
+        self._load_lock = threading.Lock()
+        self._thread = None
+        self._stop = threading.Event()
+
+    def start(self):
+        with self._lock:
+            if self._thread is not None:
+                return
+            self._thread = threading.Thread(target=self._run, name="es-snapshot", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def refresh(self):
+        # 所有 worker 共用一份快照：同一时刻只有一个 worker 查询 ES，其余的读取它写入的结果
+        def fetch():
+            now = datetime.now(pytz.timezone(TIME_ZONE))
+            start = now - timedelta(days=self.days)
+            with deadline(SNAPSHOT_DEADLINE):
+                data = search_data(
+                    start_date=start.strftime(DATE_FMT),
+                    end_date=now.strftime(DATE_FMT),
+                    index_name=self.index_name,
+                )
+            if data.stale:
+                # 查询失败时得到的是缓存中的旧数据，不作为新的快照写入共享缓存
+                raise RuntimeError("snapshot refresh failed, keeping the previous snapshot")
+            window = [int(start.timestamp() * 1000), int(now.timestamp() * 1000)]
+            return data, {"window": window}
+
+        key = ("snapshot", self.index_name, self.days)
+        data, meta = SHARED_CACHE.get(key, fetch, ttl=self.interval)
+        with self._lock:
+            self._data = data
+            self._window = tuple(meta["window"])
+            # 快照可能是其他 worker 写入的，按数据本身的时刻计算年龄
+            self._refreshed_at = meta["window"][1] / 1000
+        self._refresh_flags(self._window)
+
+    def _refresh_flags(self, window):
+        # 与数据使用同一个窗口；某个字段查询失败时保留它上一次的结果
+        for field in SNAPSHOT_FLAG_FIELDS:
+
+            def fetch(field=field):
+                with deadline(SNAPSHOT_DEADLINE):
+                    flags = search_flags(*window, field, index_name=self.index_name)
+                if flags.stale:
+                    raise RuntimeError(f"failed to refresh {field} flags")
+                return flags, {}
+
+            key = ("snapshot-flags", self.index_name, self.days, field, *window)
+            try:
+                flags, _ = SHARED_CACHE.get(key, fetch, ttl=self.interval)
+            except Exception:
+                traceback.print_exc()
+                continue
+            with self._lock:
+                self._flags[field] = flags
+
+    def get(self):
+        self.start()
+        if self._data is None:
+            # 进程内第一次访问时同步加载一次，之后只读内存
+            with self._load_lock:
+                if self._data is None:
+                    self.refresh()
+        return self._data
+
+    def flags(self, field):
+        # 快照窗口内 field 的变化点标记，尚未加载时为 None
+        self.get()
+        return self._flags.get(field)
+
+    def window(self):
+        # 快照覆盖的时间范围（毫秒时间戳）
+        return self._window
+
+    def covers(self, start_date, end_date):
+        window = self._window
+        if window is None:
+            return False
+        start, end = _to_millis(start_date), _to_millis(end_date, upper=True)
+        if start is None or end is None:
+            return False
+        # 快照本身最多落后 interval 秒，结束时间稍晚于快照时刻（例如“现在”）也算覆盖
+        return window[0] <= start <= end <= window[1] + self.interval * 1000
+
+    def points(self):
+        data = self._data
+        return 0 if data is None else len(data)
+
+    def age(self):
+        if self._refreshed_at is None:
+            return None
+        return time.time() - self._refreshed_at
+
+    def stale(self):
+        age = self.age()
+        return age is not None and age >= self.interval * SNAPSHOT_STALE_AFTER
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.refresh()
+            except Exception:
+                # 刷新失败时保留上一次的数据，等待下一个周期重试
+                traceback.print_exc()
+
+
+SNAPSHOT = Snapshot()
+
+
+def load_series(start_date=None, end_date=None, fields=VALUE_FIELDS):
+    # 快照同时包含 acc 和 perf，两个页面共用一份；落在快照窗口内的范围直接切片
+    if start_date is None and end_date is None:
+        data = SNAPSHOT.get()
+    elif SNAPSHOT.covers(start_date, end_date):
+        data = SNAPSHOT.get().between(_to_millis(start_date), _to_millis(end_date, upper=True))
+    else:
+        return search_data(
+            start_date=start_date,
+            end_date=end_date,
+            fields=fields,
+            concurrent=True,
+        )
+    # 刷新持续失败（ES 不可用）时快照停留在最后一次成功的时刻
+    return data.as_stale() if SNAPSHOT.stale() else data